@@ -0,0 +1,73 @@
+"""
+Cost of the Compare page as the number of compared groups grows. The
+aggregates the page shows (KPIs, attacks and casualties per year, top attack
+types, target types and countries) computed in one grouped pass over the
+selected groups' events (compare_facts.py on data_store.GetGroupsFrame),
+against the single group path run once per group (GetGroupFrame, ComputeKPIs,
+TypeFacts and the per year / per country groupbys). Then the whole page
+(figures included) against building every compared group's Overview page,
+what looking at the groups one at a time costs.
+
+usage: python bench_compare.py <folder with the ETL output> [repeats, default 5]
+"""
+import sys
+import os
+import time
+
+#data_store.py opens its files relative to the working directory
+data_dir = os.path.abspath(sys.argv[1])
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DashboardCode'))
+os.chdir(data_dir)
+import app
+import data_store
+import compare_facts
+from kpi import ComputeKPIs
+from type_facts import TypeFacts
+
+def GroupedAggregates(groups):
+    groups_df = data_store.GetGroupsFrame(groups)
+    compare_facts.GroupedKPIs(groups_df, groups)
+    compare_facts.YearCounts(groups_df, groups)
+    compare_facts.TopTypes(groups_df, groups, 'AttackType')
+    compare_facts.TopTypes(groups_df, groups, 'TargetType')
+    compare_facts.TopPlaces(groups_df, groups, 'Country')
+
+def PerGroupAggregates(groups):
+    for group in groups:
+        group_df = data_store.GetGroupFrame(group)
+        ComputeKPIs(group_df)
+        group_df.groupby('Year').agg(Attacks=('Year', 'size'), Casualties=('Casualties', 'sum'))
+        facts = TypeFacts(group_df)
+        facts.Top('AttackType', exclude=['Unknown', 'Other'])
+        facts.Top('TargetType', exclude=['Unknown', 'Other'])
+        group_df['Country'][group_df['Country'] != 'Unknown'].value_counts().head(5)
+
+def ComparePage(groups):
+    app.BuildCompareLayout(tuple(groups))
+
+def OverviewPages(groups):
+    #from the events like the Compare page, not the rollups
+    for group in groups:
+        group_df = data_store.GetGroupFrame(group)
+        app.BuildGetOverviewLayout(group_df, app.template, None, TypeFacts(group_df), ComputeKPIs(group_df))
+
+def BestMs(func, groups):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(groups)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+if __name__ == "__main__":
+    #biggest groups first, every step adds more events than the last
+    by_size = sorted(app.group_names, key=lambda group: -len(data_store.GetGroupFrame(group)))
+    counts = sorted({n for n in [1, 2, 4, 8, 16, 32, len(by_size)] if n <= len(by_size)})
+    print("{:>7}{:>10}{:>14}{:>14}{:>14}{:>16}".format('groups', 'events', 'grouped ms', 'per group ms', 'page ms', 'overviews ms'))
+    for n in counts:
+        groups = by_size[:n]
+        n_events = sum(len(data_store.GetGroupFrame(group)) for group in groups)
+        print("{:>7}{:>10}{:>14.1f}{:>14.1f}{:>14.1f}{:>16.1f}".format(
+            n, n_events, BestMs(GroupedAggregates, groups), BestMs(PerGroupAggregates, groups),
+            BestMs(ComparePage, groups), BestMs(OverviewPages, groups)))
@@ -0,0 +1,57 @@
+"""
+Dashboard data path with python object strings (before) against Arrow-backed
+dtypes (after): per request load time and memory of the group frame, and the
+time to build each page from it. Run it against the ETL output the dashboard
+reads.
+
+usage: python bench_dtypes.py <folder with the ETL output> [repeats]
+"""
+import sys
+import os
+import time
+import statistics
+
+#data_store.py / app.py open their files relative to the working directory
+data_dir = os.path.abspath(sys.argv[1])
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DashboardCode'))
+os.chdir(data_dir)
+import data_store
+import app
+
+PAGES = [('overview', app.BuildGetOverviewLayout),
+         ('attackmethod', app.BuildGetAttackLayout),
+         ('geo', app.BuildGetGeoLayout)]
+
+def Best(func, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def RunMode(arrow_strings):
+    '''
+    {metric: median over groups}, load/build times in ms, frame memory in MB.
+    '''
+    data_store.arrow_strings = arrow_strings
+    metrics = {'load ms': [], 'frame MB': []}
+    metrics.update({page + ' ms': [] for page, _ in PAGES})
+    for group in data_store.GetGroupNames():
+        metrics['load ms'].append(Best(lambda: data_store.GetGroupFrame(group), repeats) * 1e3)
+        group_df = data_store.GetGroupFrame(group)
+        metrics['frame MB'].append(group_df.memory_usage(index=True, deep=True).sum() / 1e6)
+        rollups = data_store.GetGroupRollups(group)
+        for page, build in PAGES:
+            metrics[page + ' ms'].append(Best(lambda: build(group_df, app.template, rollups), repeats) * 1e3)
+    return {name: statistics.median(vals) for name, vals in metrics.items()}
+
+if __name__ == "__main__":
+    before = RunMode(False)
+    after = RunMode(True)
+    print("{} groups, medians per group".format(len(data_store.GetGroupNames())))
+    print("{:<18}{:>12}{:>12}{:>10}".format('metric', 'objects', 'arrow', 'ratio'))
+    for name in before:
+        print("{:<18}{:>12.2f}{:>12.2f}{:>10.2f}".format(name, before[name], after[name], after[name] / before[name]))
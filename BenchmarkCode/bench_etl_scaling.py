@@ -0,0 +1,109 @@
+"""
+Runs the ETL on synthetic GTD data (gen_synthetic_gtd.py) at several multiples
+of the real release's size and reports throughput and peak memory per stage.
+Each scale runs in its own process so peak RSS isn't carried over between them.
+
+The synthetic data is read from parquet, the workbook read is left out: excel
+caps a sheet at ~1M rows and the readers have their own benchmark. Pass
+reader=stream (or excel) to read a generated workbook through ReadRename
+instead, for scales that fit.
+
+usage: python bench_etl_scaling.py [scales, default 0.1,1,10] [work dir] [reader=parquet|stream|excel]
+writes <work dir>/etl_scaling_report.json
+"""
+import sys
+import os
+import json
+import time
+import shutil
+import subprocess
+import pandas as pd
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+etl_dir = os.path.join(bench_dir, '..', 'ETLCode')
+sys.path.insert(0, etl_dir)
+import gen_synthetic_gtd
+
+def SyntheticInput(n_events, work_dir, reader):
+    '''
+    Generated input for n_events, reused between runs (same seed, same data).
+    '''
+    ext = 'parquet' if reader == 'parquet' else 'xlsx'
+    fpath = os.path.join(work_dir, 'gtd_synthetic_{}.{}'.format(n_events, ext))
+    if not os.path.exists(fpath):
+        start = time.perf_counter()
+        gen_synthetic_gtd.WriteSynthetic(gen_synthetic_gtd.GenerateGTD(n_events), fpath)
+        print("generated {} events in {:.1f}s".format(n_events, time.perf_counter() - start))
+    return fpath
+
+def RunScale(n_events, work_dir, reader):
+    '''
+    The ETL main block's full path on synthetic input, outputs to a scratch folder.
+    Returns the stage report as a dict.
+    '''
+    in_fpath = SyntheticInput(n_events, work_dir, reader)
+    out_dir = os.path.join(work_dir, 'out_{}'.format(n_events))
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+    import ETL #changes directory to ETLCode, paths here are absolute
+    read_cols_fpath = os.path.join(etl_dir, 'ReadCols.xlsx')
+    exclude_groups_fpath = os.path.join(etl_dir, 'exclude_group_names.xlsx')
+
+    report = ETL.StageReport()
+    if reader == 'parquet':
+        rd_rename_cols_dct = ETL.ReadColsMapping(read_cols_fpath)
+        df = report.Run('ReadParquet', lambda: pd.read_parquet(in_fpath, columns=list(rd_rename_cols_dct.keys()))
+                        .rename(columns=rd_rename_cols_dct))
+    else:
+        df = report.Run('ReadRename', ETL.ReadRename, in_fpath, read_cols_fpath, None, reader)
+    df = report.Run('BuildColumns', ETL.BuildColumns, df)
+    df = report.Run('LongifyByGroup', ETL.LongifyByGroup, df)
+    df = report.Run('FilterToApplicableGroups', ETL.FilterToApplicableGroups, df, exclude_groups_fpath, 15, None)
+    df = report.Run('SetDatatypesAndSort', ETL.SetDatatypesAndSort, df)
+    rollups = report.Run('BuildRollups', ETL.BuildRollups, df)
+    report.Run('WriteParquet', lambda d: d.to_parquet(os.path.join(out_dir, 'gtd_clean_dataset_pqt.parquet'), index=False), df)
+    report.Run('WriteArrowIPC', ETL.WriteArrowIPC, df, os.path.join(out_dir, 'gtd_clean_dataset.arrow'))
+    report.Run('WriteGroupPartitionedParquet', ETL.WriteGroupPartitionedParquet, df, os.path.join(out_dir, 'gtd_clean_dataset_by_group'))
+    report.Run('WriteRollups', ETL.WriteRollups, rollups, os.path.join(out_dir, 'gtd_rollups'))
+    report.Run('WriteCsv', lambda d: d.to_csv(os.path.join(out_dir, 'gtd_clean_dataset_csv.csv'), index=False), df)
+    result = report.ToDict()
+    result['events'] = n_events
+    result['reader'] = reader
+    return result
+
+def Summarize(result):
+    events = result['events']
+    print("\n{} events ({:.2g}x), {:.1f}s in stages, {:,.0f} events/s, peak rss {:.0f} MB".format(
+        events, events / gen_synthetic_gtd.GTD_EVENTS, result['stages_wall_s'],
+        events / result['stages_wall_s'], max(s['peak_rss_mb'] or 0 for s in result['stages'])))
+    print("  {:<30}{:>10}{:>16}{:>14}".format('stage', 'wall s', 'rows in/s', 'peak MB'))
+    for stage in result['stages']:
+        rows = stage['rows_in'] if stage['rows_in'] is not None else stage['rows_out']
+        rate = rows / stage['wall_s'] if rows and stage['wall_s'] > 0 else float('nan')
+        print("  {:<30}{:>10.2f}{:>16,.0f}{:>14.0f}".format(stage['stage'], stage['wall_s'], rate, stage['peak_rss_mb'] or 0))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--one': #child: --one <events> <work dir> <reader> <result json>
+        result = RunScale(int(sys.argv[2]), sys.argv[3], sys.argv[4])
+        with open(sys.argv[5], 'w') as f:
+            json.dump(result, f)
+        sys.exit(0)
+
+    scales = [float(x) for x in (sys.argv[1] if len(sys.argv) > 1 else '0.1,1,10').split(',')]
+    work_dir = os.path.abspath(sys.argv[2] if len(sys.argv) > 2 else 'etl_scaling_work')
+    reader = sys.argv[3].split('=')[-1] if len(sys.argv) > 3 else 'parquet'
+    os.makedirs(work_dir, exist_ok=True)
+
+    results = []
+    for scale in scales:
+        n_events = int(round(scale * gen_synthetic_gtd.GTD_EVENTS))
+        result_fpath = os.path.join(work_dir, 'etl_scaling_{}.json'.format(n_events))
+        subprocess.run([sys.executable] + ['-W' + opt for opt in sys.warnoptions] + [os.path.abspath(__file__), '--one', str(n_events), work_dir, reader, result_fpath],
+                       check=True, stdout=subprocess.DEVNULL)
+        with open(result_fpath) as f:
+            results.append(json.load(f))
+        Summarize(results[-1])
+
+    with open(os.path.join(work_dir, 'etl_scaling_report.json'), 'w') as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,70 @@
+"""
+Header indicator numbers computed the way the indicators used to, each one
+scanning the group's frame on its own (before), against kpi.ComputeKPIs doing
+them together from the column arrays (after), on the largest groups. Also
+checks both give the same numbers.
+
+usage: python bench_kpis.py <folder with the ETL output> [number of groups, default 5] [repeats]
+"""
+import sys
+import os
+import time
+import math
+
+#data_store.py opens its files relative to the working directory
+data_dir = os.path.abspath(sys.argv[1])
+n_groups = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DashboardCode'))
+os.chdir(data_dir)
+import data_store
+import kpi
+
+def SeparateKPIs(df):
+    '''
+    The expressions the indicator functions evaluated before kpi.py, one scan each.
+    '''
+    years_active = df['Year'].max() - df['Year'].min()
+    claimed_df = df[df['GroupClaimed'] >= 0]
+    kpis = {
+        'attacks': len(df),
+        'years_active': years_active if years_active != 0 else 1,
+        'killed': df['NVictimsKilled'].sum(skipna=True),
+        'wounded': df['NVictimsWounded'].sum(skipna=True),
+        'success_rate': (df['AttackSuccess'].sum() / len(df)) * 100,
+        'suicide_rate': (df['SuicideAttack'].sum() / len(df)) * 100,
+        'attacks_per_year': round(df['Year'].value_counts().reset_index()['count'].mean(), 1),
+        'claimed_rate': round((claimed_df['GroupClaimed'].sum() / len(claimed_df)) * 100, 1),
+        'killed_per_attack': round(df['NVictimsKilled'].mean(), 1),
+        'wounded_per_attack': round(df['NVictimsWounded'].mean(), 1),
+    }
+    for name, col in kpi.PLACE_COLUMNS.items():
+        kpis[name] = df[df[col] != 'Unknown'][col].nunique()
+    return kpis
+
+def Best(func):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def Same(a, b):
+    return all(a[k] == b[k] or (isinstance(a[k], float) and math.isnan(a[k]) and math.isnan(b[k])) for k in a)
+
+if __name__ == "__main__":
+    frames = {group: data_store.GetGroupFrame(group) for group in data_store.GetGroupNames()}
+    largest = sorted(frames, key=lambda group: len(frames[group]), reverse=True)[:n_groups]
+    print("{:<50}{:>9}{:>14}{:>13}{:>9}{:>14}".format('group', 'events', 'separate ms', 'fused ms', 'speedup', 'memoized us'))
+    for group in largest:
+        df = frames[group]
+        before = Best(lambda: SeparateKPIs(df))
+        after = Best(lambda: kpi.ComputeKPIs(df))
+        data_store.GetGroupKPIs(group)
+        memoized = Best(lambda: data_store.GetGroupKPIs(group))
+        if not Same(SeparateKPIs(df), kpi.ComputeKPIs(df)):
+            print("  different numbers for", group)
+        print("{:<50}{:>9}{:>14.3f}{:>13.3f}{:>9.1f}{:>14.2f}".format(
+            group[:48], len(df), before * 1e3, after * 1e3, before / after, memoized * 1e6))
@@ -0,0 +1,63 @@
+"""
+Compares LongifyByGroup against LongifyByGroupLegacy: wall time and peak
+traced memory, and checks the two outputs are identical.
+
+usage: python bench_longify.py <raw gtd .xlsx or ingest cache .parquet> [repeats]
+"""
+import sys
+import os
+import time
+import tracemalloc
+import pandas as pd
+
+#ETL.py changes directory on import, so resolve our input first
+in_fpath = os.path.abspath(sys.argv[1])
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ETLCode'))
+import ETL
+
+def LoadWide(fpath):
+    if fpath.endswith('.parquet'):
+        df = pd.read_parquet(fpath)
+    else:
+        df = ETL.ReadRename(fpath, 'ReadCols.xlsx', 'cache')
+    return ETL.BuildColumns(df)
+
+def TimeIt(func, df, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(df)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def PeakMemory(func, df):
+    '''
+    Peak bytes allocated while func runs, on top of what was already allocated.
+    '''
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    func(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - base
+
+if __name__ == "__main__":
+    wide_df = LoadWide(in_fpath)
+    wide_mb = wide_df.memory_usage(deep=True).sum() / 1e6
+    print("wide frame: {} rows, {:.1f} MB".format(len(wide_df), wide_mb))
+
+    new_df = ETL.LongifyByGroup(wide_df)
+    old_df = ETL.LongifyByGroupLegacy(wide_df)
+    pd.testing.assert_frame_equal(new_df, old_df)
+    print("outputs identical: {} rows".format(len(new_df)))
+    del new_df, old_df
+
+    print("{:<22}{:>12}{:>16}{:>14}".format('impl', 'best s', 'peak MB', 'peak / wide'))
+    for name, func in [('LongifyByGroupLegacy', ETL.LongifyByGroupLegacy),
+                       ('LongifyByGroup', ETL.LongifyByGroup)]:
+        wall = TimeIt(func, wide_df, repeats)
+        peak_mb = PeakMemory(func, wide_df) / 1e6
+        print("{:<22}{:>12.3f}{:>16.1f}{:>14.2f}".format(name, wall, peak_mb, peak_mb / wide_mb))
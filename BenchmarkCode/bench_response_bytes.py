@@ -0,0 +1,87 @@
+"""
+Bytes the browser receives to show each page of every group: the page
+callback and the callbacks it sets off (the active area chart tab and the
+treemap on Attack Profile, the map's first year and the treemap on
+Geographical). Measured with the app's Flask test client with full figures
+(slim_figures off) and slimmed ones, each uncompressed, gzipped and
+brotli compressed (if the brotli package is installed). Slimmed pages also
+need /figure-templates.js once per visit, reported on its own.
+
+usage: python bench_response_bytes.py <folder with the ETL output> [number of groups, default all]
+"""
+import sys
+import os
+
+#data_store.py opens its files relative to the working directory
+data_dir = os.path.abspath(sys.argv[1])
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DashboardCode'))
+os.chdir(data_dir)
+import app
+import slim_responses
+
+pages = ['/overview', '/attackmethod', '/geo']
+encodings = ['identity', 'gzip'] + (['br'] if slim_responses.brotli is not None else [])
+
+def Callback(output, output_id, inputs, state=()):
+    '''
+    Body of a callback request for output (its callback_map key) of
+    (id, property, value) inputs and state, like dash-renderer sends.
+    '''
+    return {'output': output, 'outputs': {'id': output_id, 'property': output.rsplit('.', 1)[1]}, 'changedPropIds': [],
+            'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+            'state': [{'id': i, 'property': p, 'value': v} for i, p, v in state]}
+
+def PageCallbacks(group, pathname):
+    '''
+    Callback requests the browser sends to show the page.
+    '''
+    #all of the group's years
+    group_state = [('group-dropdown', 'value', group), ('year-range', 'value', None)]
+    requests = [Callback('page-content.children', 'page-content', [('url', 'pathname', pathname)] + group_state)]
+    if pathname == '/attackmethod':
+        requests.append(Callback('at-area-graph.figure', 'at-area-graph', [('at-area-tabs', 'active_tab', 'Attack')], group_state))
+    if pathname == '/geo':
+        years = app.geo_map_table(group)['Year']
+        first = int(years.min()) if len(years) else 0
+        requests.append(Callback('geo-map-graph.figure', 'geo-map-graph', [('geo-map-year', 'value', first)], group_state))
+    for name in {'/attackmethod': ['at_TreeMap'], '/geo': ['geo_Treemap']}.get(pathname, []):
+        graph_id = {'type': 'lazy-graph', 'name': name}
+        requests.append(Callback('{"name":["MATCH"],"type":"lazy-graph"}.figure', graph_id, [(graph_id, 'id', graph_id)], group_state))
+    return requests
+
+def PageBytes(client, group, pathname, encoding):
+    total = 0
+    for request in PageCallbacks(group, pathname):
+        resp = client.post('/_dash-update-component', json=request, headers={'Accept-Encoding': encoding})
+        if resp.status_code != 200:
+            raise RuntimeError('{} {} {}: {}'.format(group, pathname, request['output'], resp.status_code))
+        total += len(resp.get_data())
+    return total
+
+def MeasurePages(groups, slim):
+    '''
+    {(page, encoding): mean bytes over the groups}
+    '''
+    app.slim_figures = slim
+    app.layout_cache.Clear()
+    app.figure_cache.Clear()
+    client = app.app.server.test_client()
+    result = {}
+    for pathname in pages:
+        for encoding in encodings:
+            result[pathname, encoding] = sum(PageBytes(client, group, pathname, encoding) for group in groups) / len(groups)
+    return result
+
+if __name__ == "__main__":
+    groups = app.group_names[:int(sys.argv[2])] if len(sys.argv) > 2 else app.group_names
+    print("{} groups, mean KB per page".format(len(groups)))
+    measured = {'full': MeasurePages(groups, False), 'slim': MeasurePages(groups, True)}
+    header = ''.join('{:>15}'.format('{} {}'.format(figures, encoding)) for figures in measured for encoding in encodings)
+    print('{:<14}'.format('page') + header)
+    for pathname in pages:
+        print('{:<14}'.format(pathname) + ''.join('{:>15.1f}'.format(measured[figures][pathname, encoding] / 1e3)
+                                                   for figures in measured for encoding in encodings))
+    client = app.app.server.test_client()
+    templates = {encoding: len(client.get('/figure-templates.js', headers={'Accept-Encoding': encoding}).get_data())
+                 for encoding in encodings}
+    print("/figure-templates.js, once per visit: " + ', '.join('{} {:.1f} KB'.format(encoding, n / 1e3) for encoding, n in templates.items()))
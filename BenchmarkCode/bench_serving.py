@@ -0,0 +1,110 @@
+"""
+Serves the dashboard with gunicorn (DashboardCode/gunicorn.conf.py) at several
+worker counts and reports callback throughput and memory. Every group's pages
+are requested once by concurrent clients (cold: the workers build them) and
+then again (warm: served from the workers' layout caches).
+
+Memory is the proportional set size (PSS) of the master and its workers: a
+page the processes share is counted once in total, unlike adding up their
+RSS, which counts it in every process that maps it.
+
+usage: python bench_serving.py <folder with the ETL output> [worker counts, default 1,2,4] [clients per worker, default 2]
+"""
+import sys
+import os
+import json
+import time
+import socket
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+dashboard_dir = os.path.abspath(os.path.join(bench_dir, '..', 'DashboardCode'))
+pages = ['/overview', '/attackmethod', '/geo']
+
+def FreePort():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def Post(port, path, body):
+    req = urllib.request.Request('http://127.0.0.1:{}{}'.format(port, path), data=json.dumps(body).encode('utf-8'),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=300) as resp:
+        return resp.read()
+
+def PageRequest(port, group, pathname):
+    return Post(port, '/_dash-update-component', {
+        'output': 'page-content.children', 'outputs': {'id': 'page-content', 'property': 'children'},
+        'inputs': [{'id': 'url', 'property': 'pathname', 'value': pathname},
+                   {'id': 'group-dropdown', 'property': 'value', 'value': group},
+                   {'id': 'year-range', 'property': 'value', 'value': None}], #all of the group's years
+        'changedPropIds': []})
+
+def GroupNames(port):
+    with urllib.request.urlopen('http://127.0.0.1:{}/_dash-layout'.format(port), timeout=60) as resp:
+        layout = json.loads(resp.read())
+    dropdown = layout['props']['children'][1]['props']['children'][0]
+    return [option['value'] for option in dropdown['props']['options']]
+
+def ProcessMemoryMB(pid):
+    '''
+    (PSS, RSS) of a process in MB, from /proc/<pid>/smaps_rollup.
+    '''
+    values = {}
+    with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Pss:', 'Rss:'):
+                values[parts[0]] = int(parts[1]) / 1024
+    return values['Pss:'], values['Rss:']
+
+def ServerPids(master_pid):
+    children = subprocess.run(['pgrep', '-P', str(master_pid)], capture_output=True, text=True).stdout.split()
+    return [master_pid] + [int(pid) for pid in children]
+
+def RunWorkers(data_dir, n_workers, clients_per_worker):
+    port = FreePort()
+    env = dict(os.environ, DASHBOARD_WORKERS=str(n_workers), DASHBOARD_PORT=str(port), DASHBOARD_MAX_REQUESTS='0')
+    server = subprocess.Popen(['gunicorn', '-c', os.path.join(dashboard_dir, 'gunicorn.conf.py'),
+                               '--chdir', data_dir, '--pythonpath', dashboard_dir, 'wsgi:server'],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        start = time.perf_counter()
+        while True:
+            try:
+                groups = GroupNames(port)
+                break
+            except OSError:
+                if server.poll() is not None or time.perf_counter() - start > 300:
+                    raise RuntimeError("gunicorn didn't come up")
+                time.sleep(0.5)
+        while len(ServerPids(server.pid)) < n_workers + 1:
+            time.sleep(0.2)
+        startup = time.perf_counter() - start
+        requests = [(group, pathname) for group in groups for pathname in pages]
+        result = {'workers': n_workers, 'startup_s': startup, 'requests': len(requests)}
+        with ThreadPoolExecutor(n_workers * clients_per_worker) as pool:
+            for name in ('cold', 'warm'):
+                start = time.perf_counter()
+                list(pool.map(lambda request: PageRequest(port, *request), requests))
+                result[name + '_req_per_s'] = len(requests) / (time.perf_counter() - start)
+        memory = [ProcessMemoryMB(pid) for pid in ServerPids(server.pid)]
+        result['pss_mb'] = sum(pss for pss, rss in memory)
+        result['rss_sum_mb'] = sum(rss for pss, rss in memory)
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    data_dir = os.path.abspath(sys.argv[1])
+    worker_counts = [int(n) for n in (sys.argv[2] if len(sys.argv) > 2 else '1,2,4').split(',')]
+    clients_per_worker = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    print("{} cores".format(os.cpu_count()))
+    print("{:>8}{:>11}{:>15}{:>15}{:>10}{:>14}".format('workers', 'startup s', 'cold req/s', 'warm req/s', 'PSS MB', 'sum RSS MB'))
+    for n_workers in worker_counts:
+        r = RunWorkers(data_dir, n_workers, clients_per_worker)
+        print("{:>8}{:>11.1f}{:>15.1f}{:>15.1f}{:>10.0f}{:>14.0f}".format(
+            r['workers'], r['startup_s'], r['cold_req_per_s'], r['warm_req_per_s'], r['pss_mb'], r['rss_sum_mb']))
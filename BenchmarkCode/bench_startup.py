@@ -0,0 +1,82 @@
+"""
+Cold start of the dashboard. Imports app.py in fresh processes, loading only
+the columns the pages read (the default) and every column
+(DASHBOARD_ALL_COLUMNS=1), and reports the startup_seconds app.py measures
+(imports, data, app) and the whole import. Then, if gunicorn is installed,
+the time from starting gunicorn.conf.py's server until it answers the page,
+what a new container replica takes to be ready.
+
+usage: python bench_startup.py <folder with the ETL output> [runs, default 5]
+"""
+import sys
+import os
+import time
+import json
+import socket
+import statistics
+import subprocess
+import urllib.request
+
+data_dir = os.path.abspath(sys.argv[1])
+runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+dashboard_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DashboardCode'))
+
+#run in the data folder, data_store.py opens its files relative to the working directory
+IMPORT_SCRIPT = '''
+import time, sys, json, contextlib, io
+start = time.perf_counter()
+sys.path.insert(0, {!r})
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+print(json.dumps(dict(app.startup_seconds, total=time.perf_counter() - start, columns=app.data_store.ipc_table.num_columns
+                      if app.data_store.ipc_table is not None else None)))
+'''.format(dashboard_dir)
+
+def ColdImport(all_columns):
+    env = dict(os.environ, DASHBOARD_ALL_COLUMNS='1' if all_columns else '0')
+    out = subprocess.run([sys.executable, '-W', 'ignore', '-c', IMPORT_SCRIPT], cwd=data_dir, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def FreePort():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def GunicornReadySeconds():
+    '''
+    Seconds from starting gunicorn (one worker) until GET / answers 200.
+    '''
+    port = FreePort()
+    env = dict(os.environ, DASHBOARD_PORT=str(port), DASHBOARD_WORKERS='1', PYTHONPATH=dashboard_dir)
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(dashboard_dir, 'gunicorn.conf.py'),
+                               '--access-logfile', '/dev/null', 'wsgi:server'],
+                              cwd=data_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < 60:
+            try:
+                if urllib.request.urlopen('http://127.0.0.1:{}/'.format(port), timeout=1).status == 200:
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError('gunicorn did not answer within 60 s')
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    print("{:<14}{:>9}{:>11}{:>9}{:>9}{:>10}".format('columns', 'loaded', 'imports s', 'data s', 'app s', 'total s'))
+    for all_columns in [False, True]:
+        results = [ColdImport(all_columns) for _ in range(runs)]
+        medians = {key: statistics.median(result[key] for result in results) for key in ['imports', 'data', 'app', 'total']}
+        print("{:<14}{:>9}{:>11.3f}{:>9.3f}{:>9.3f}{:>10.3f}".format(
+            'all' if all_columns else 'pages read', str(results[0]['columns'] or '-'),
+            medians['imports'], medians['data'], medians['app'], medians['total']))
+    try:
+        import gunicorn
+    except ImportError:
+        print("gunicorn isn't installed, no time to ready")
+    else:
+        print("gunicorn ready (first page answered), median of {} starts: {:.2f} s".format(
+            runs, statistics.median(GunicornReadySeconds() for _ in range(runs))))
@@ -0,0 +1,71 @@
+"""
+Year range filtering on the largest groups. Slicing a window of years out of
+a group: binary search in the group's Year-sorted block (data_store.YearRows)
+against a boolean mask over all of the group's rows, which is what filtering
+did before. Then the time to build every page and lazy figure of the window
+from scratch, which should follow the number of events in it rather than
+the group's.
+
+usage: python bench_year_range.py <folder with the ETL output> [number of groups, default 3] [repeats, default 50]
+"""
+import sys
+import os
+import time
+
+#data_store.py opens its files relative to the working directory
+data_dir = os.path.abspath(sys.argv[1])
+n_groups = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DashboardCode'))
+os.chdir(data_dir)
+import app
+import data_store
+
+def MaskedFrame(group, year_range):
+    '''
+    The window the way it was filtered before: the group's rows, then a mask on Year.
+    '''
+    group_df = data_store.GetGroupFrame(group)
+    return group_df[group_df['Year'].between(year_range[0], year_range[1])]
+
+def BestMs(func, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+def BuildWindowMs(group, years):
+    '''
+    Every page and lazy figure of the window, with nothing cached.
+    '''
+    data_store.GetGroupTypeFacts.cache_clear()
+    data_store.GetGroupGeoFacts.cache_clear()
+    data_store.GetGroupKPIs.cache_clear()
+    start = time.perf_counter()
+    for pathname in app.page_builders:
+        app.BuildPageLayout(pathname, group, years)
+    for name in app.lazy_figure_names():
+        app.BuildLazyFigure(name, group, years)
+    return (time.perf_counter() - start) * 1e3
+
+if __name__ == "__main__":
+    if data_store.event_years is None:
+        print("the groups' rows aren't sorted by Year (ETL output from before it sorted by Year), nothing to compare")
+        sys.exit(1)
+    groups = sorted(app.group_names, key=lambda group: -len(data_store.GetGroupFrame(group)))[:n_groups]
+    print("{:<40}{:>12}{:>9}{:>13}{:>11}{:>14}".format('group, years', 'events', 'window', 'search ms', 'mask ms', 'pages ms'))
+    for group in groups:
+        first, last = data_store.GetGroupYears(group)
+        for span in [1, 5, 10, 20, last - first + 1]:
+            if span > last - first + 1:
+                continue
+            years = (last - span + 1, last)
+            n_window = len(data_store.GetGroupFrame(group, years))
+            search_ms = BestMs(lambda: data_store.GetGroupFrame(group, years), repeats)
+            mask_ms = BestMs(lambda: MaskedFrame(group, years), repeats)
+            #the whole history is served from the rollups, built without a year range like the app does
+            pages_ms = BuildWindowMs(group, years if span < last - first + 1 else None)
+            print("{:<40}{:>12}{:>9}{:>13.2f}{:>11.2f}{:>14.0f}".format(
+                '{}, {}-{}'.format(group[:28], *years), len(data_store.GetGroupFrame(group)), n_window, search_ms, mask_ms, pages_ms))
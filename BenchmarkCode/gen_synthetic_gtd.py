@@ -0,0 +1,256 @@
+"""
+Synthetic GTD shaped data, for benchmarking the ETL and the dashboard without
+the licensed workbook. Columns and names are the GTD's (everything ReadCols.xlsx
+reads plus the coded columns next to them), label sets are the codebook's, and
+the shape roughly follows the 0522 release: ~3,500 named groups with a long
+tail and 'Unknown' on ~45% of events, ~1% of events with a second group, 200+
+countries, cities scaling with the row count, and the release's null rates for
+the Group2/3 and type 2/3 columns. Values are random, the counts are not real.
+
+usage: python gen_synthetic_gtd.py <events> <out .xlsx|.parquet> [seed]
+"""
+import sys
+import numpy as np
+import pandas as pd
+
+GTD_EVENTS = 209706 #rows in the 0522 release, "1x" for the benchmarks
+EXCEL_MAX_ROWS = 1048575 #plus the header row
+
+N_GROUPS = 3500
+UNKNOWN_GROUP_SHARE = 0.45
+N_COUNTRIES = 205
+N_PROVSTATES = 2800
+
+REGIONS = ['North America', 'Central America & Caribbean', 'South America', 'East Asia',
+           'Southeast Asia', 'South Asia', 'Central Asia', 'Western Europe', 'Eastern Europe',
+           'Middle East & North Africa', 'Sub-Saharan Africa', 'Australasia & Oceania']
+ATTACK_TYPES = ['Assassination', 'Armed Assault', 'Bombing/Explosion', 'Hijacking',
+                'Hostage Taking (Barricade Incident)', 'Hostage Taking (Kidnapping)',
+                'Facility/Infrastructure Attack', 'Unarmed Assault', 'Unknown']
+ATTACK_TYPE_P = [0.10, 0.24, 0.48, 0.004, 0.006, 0.065, 0.058, 0.006, 0.041]
+TARGET_TYPES = ['Business', 'Government (General)', 'Police', 'Military', 'Abortion Related',
+                'Airports & Aircraft', 'Government (Diplomatic)', 'Educational Institution',
+                'Food or Water Supply', 'Journalists & Media', 'Maritime', 'NGO', 'Other',
+                'Private Citizens & Property', 'Religious Figures/Institutions', 'Telecommunication',
+                'Terrorists/Non-State Militia', 'Tourists', 'Transportation', 'Unknown', 'Utilities',
+                'Violent Political Party']
+TARGET_TYPE_P = [0.11, 0.12, 0.14, 0.16, 0.001, 0.007, 0.017, 0.021, 0.002, 0.016, 0.002,
+                 0.005, 0.001, 0.24, 0.024, 0.007, 0.017, 0.002, 0.038, 0.033, 0.033, 0.008]
+WEAPON_TYPES = ['Biological', 'Chemical', 'Radiological', 'Nuclear', 'Firearms', 'Explosives',
+                'Fake Weapons', 'Incendiary', 'Melee',
+                'Vehicle (not to include vehicle-borne explosives, i.e., car or truck bombs)',
+                'Sabotage Equipment', 'Other', 'Unknown']
+WEAPON_TYPE_P = [0.0002, 0.0016, 0.0001, 0.0001, 0.33, 0.50, 0.0002, 0.06, 0.02, 0.0007,
+                 0.0007, 0.0006, 0.0858]
+WEAPON_SUBTYPES = ['Automatic or Semi-Automatic Rifle', 'Handgun', 'Unknown Gun Type',
+                   'Unknown Explosive Type', 'Vehicle', 'Grenade', 'Landmine', 'Arson/Fire',
+                   'Knife or Other Sharp Object', 'Projectile (rockets, mortars, RPGs, etc.)']
+CLAIM_MODES = ['Letter', 'Call (pre-incident)', 'Call (post-incident)', 'E-mail', 'Note',
+               'Video', 'Posted to website, blog, etc.', 'Personal claim', 'Other', 'Unknown']
+PROP_EXTENTS = ['Catastrophic (likely >= $1 billion)', 'Major (likely >= $1 million but < $1 billion)',
+                'Minor (likely < $1 million)', 'Unknown']
+HOSTAGE_OUTCOMES = ['Attempted Rescue', 'Hostage(s) released by perpetrators',
+                    'Hostage(s) killed (not during rescue attempt)', 'Successful Rescue',
+                    'Hostage(s) escaped (not during rescue attempt)', 'Combination', 'Unknown']
+
+#share of events where the column is empty, roughly the 0522 release
+NULL_RATES = {
+    'provstate': 0.002, 'city': 0.002, 'latitude': 0.025, 'location': 0.70, 'summary': 0.35,
+    'attacktype2': 0.965, 'attacktype3': 0.998,
+    'targtype2': 0.94, 'targtype3': 0.994, 'targsubtype1': 0.06,
+    'target1': 0.003, 'natlty1': 0.009,
+    'weaptype2': 0.93, 'weaptype3': 0.99, 'weapsubtype1': 0.11,
+    'gname2': 0.989, 'gname3': 0.998, 'gsubname': 0.97,
+    'claimed': 0.35, 'claimmode': 0.89,
+    'motive': 0.72, 'nkill': 0.06, 'nwound': 0.09, 'nkillter': 0.36, 'nwoundte': 0.38,
+    'propextent': 0.65, 'propvalue': 0.79, 'nhostkid': 0.92, 'ransomamt': 0.99,
+    'ransompaid': 0.995, 'hostkidoutcome': 0.94,
+}
+
+def Zipf(rng, n_values, size, s=1.1):
+    '''
+    Indices 0..n_values-1, index k drawn with weight 1/(k+1)^s: a few values
+    take most rows, then a long tail, like groups, countries and cities.
+    '''
+    weights = 1.0 / np.arange(1, n_values + 1) ** s
+    return rng.choice(n_values, size=size, p=weights / weights.sum())
+
+def Labels(rng, labels, size, p=None, null_rate=0.0):
+    '''
+    Object array of labels (None where empty) and the 1 based codes next to
+    them (NaN where empty), like the GTD's <col> / <col>_txt pairs.
+    '''
+    if p is not None: #shares are rounded, make them sum to 1
+        p = np.asarray(p) / np.sum(p)
+    idx = rng.choice(len(labels), size=size, p=p)
+    txt = np.asarray(labels, dtype=object)[idx]
+    code = (idx + 1).astype(float)
+    if null_rate:
+        empty = rng.random(size) < null_rate
+        txt[empty] = None
+        code[empty] = np.nan
+    return txt, code
+
+def Blank(rng, values, null_rate):
+    '''
+    Copy of values with null_rate of them emptied, None for labels, NaN for numbers.
+    '''
+    is_label = values.dtype.kind in 'OU'
+    values = np.array(values, dtype=object if is_label else float)
+    values[rng.random(len(values)) < null_rate] = None if is_label else np.nan
+    return values
+
+def Casualties(rng, size, null_rate):
+    #mostly 0-2, long tail, like nkill/nwound
+    return Blank(rng, rng.negative_binomial(0.4, 0.17, size).astype(float), null_rate)
+
+def GenerateGTD(n_events, seed=0):
+    '''
+    DataFrame with GTD column names and n_events rows.
+    '''
+    rng = np.random.default_rng(seed)
+    n = n_events
+    n_cities = int(np.clip(n // 5, 200, 40000))
+
+    #geography: cities sit in a provstate, provstates in a country, countries in a region
+    country_region = rng.integers(0, len(REGIONS), N_COUNTRIES)
+    province_country = np.sort(Zipf(rng, N_COUNTRIES, N_PROVSTATES, s=0.8))
+    city_province = np.sort(Zipf(rng, N_PROVSTATES, n_cities, s=0.6))
+    city_country = province_country[city_province]
+    country_first_city = np.searchsorted(city_country, np.arange(N_COUNTRIES))
+    country_n_cities = np.bincount(city_country, minlength=N_COUNTRIES)
+    country_lat = rng.uniform(-45, 65, N_COUNTRIES)
+    country_lon = rng.uniform(-120, 150, N_COUNTRIES)
+
+    #groups: 'Unknown' on a big share, named groups Zipf distributed, each with a home country
+    group_names = np.array(['Unknown'] + ['Synthetic Group {:04d}'.format(i) for i in range(1, N_GROUPS + 1)], dtype=object)
+    group_home = Zipf(rng, N_COUNTRIES, N_GROUPS + 1, s=0.9)
+    def DrawGroups(size):
+        grp = Zipf(rng, N_GROUPS, size, s=1.1) + 1
+        grp[rng.random(size) < UNKNOWN_GROUP_SHARE] = 0
+        return grp
+    grp1 = DrawGroups(n)
+    grp2 = np.where(rng.random(n) < NULL_RATES['gname2'], -1, DrawGroups(n))
+    grp3 = np.where((grp2 < 0) | (rng.random(n) < 0.82), -1, DrawGroups(n))
+
+    #events mostly happen in their group's home country, unknown groups anywhere
+    at_home = (grp1 > 0) & (rng.random(n) < 0.85)
+    country = np.where(at_home, group_home[grp1], Zipf(rng, N_COUNTRIES, n, s=1.0))
+    city = country_first_city[country] + (rng.random(n) * np.maximum(country_n_cities[country], 1)).astype(int)
+    has_city = country_n_cities[country] > 0
+    city = np.where(has_city, np.minimum(city, n_cities - 1), -1)
+
+    year = np.clip(np.round(1970 + 50 * rng.beta(2.2, 1.0, n)), 1970, 2020).astype(np.int64)
+
+    d = {}
+    #year prefixed like the GTD's, the running number keeps them unique
+    d['eventid'] = year * 10000000000 + np.arange(n, dtype=np.int64)
+    d['iyear'] = year
+    d['imonth'] = np.where(rng.random(n) < 0.001, 0, rng.integers(1, 13, n))
+    d['iday'] = np.where(rng.random(n) < 0.004, 0, rng.integers(1, 29, n))
+    d['extended'] = (rng.random(n) < 0.045).astype(np.int64)
+    d['country'] = (country + 4).astype(np.int64)
+    d['country_txt'] = np.array(['Country {:03d}'.format(i) for i in range(N_COUNTRIES)], dtype=object)[country]
+    d['region'] = (country_region[country] + 1).astype(np.int64)
+    d['region_txt'] = np.asarray(REGIONS, dtype=object)[country_region[country]]
+    province_names = np.array(['Province {:04d}'.format(i) for i in range(N_PROVSTATES)], dtype=object)
+    d['provstate'] = Blank(rng, np.where(has_city, province_names[city_province[np.maximum(city, 0)]], 'Unknown'),
+                           NULL_RATES['provstate'])
+    city_names = np.array(['City {:05d}'.format(i) for i in range(n_cities)], dtype=object)
+    city_txt = np.where(has_city & (rng.random(n) > 0.05), city_names[np.maximum(city, 0)], 'Unknown')
+    d['city'] = Blank(rng, city_txt, NULL_RATES['city'])
+    no_coords = rng.random(n) < NULL_RATES['latitude']
+    d['latitude'] = np.where(no_coords, np.nan, country_lat[country] + rng.normal(0, 2, n))
+    d['longitude'] = np.where(no_coords, np.nan, country_lon[country] + rng.normal(0, 2, n))
+    d['specificity'] = rng.choice([1, 2, 3, 4, 5], n, p=[0.68, 0.1, 0.13, 0.08, 0.01]).astype(float)
+    d['vicinity'] = (rng.random(n) < 0.07).astype(np.int64)
+    d['location'] = Blank(rng, np.array(['The attack took place near location {}.'.format(i) for i in range(500)],
+                                        dtype=object)[rng.integers(0, 500, n)], NULL_RATES['location'])
+    d['summary'] = Blank(rng, np.array(['{}: Synthetic summary of an incident, number {}.'.format(2000 + i % 20, i)
+                                        for i in range(2000)], dtype=object)[rng.integers(0, 2000, n)],
+                         NULL_RATES['summary'])
+    for crit in ['crit1', 'crit2', 'crit3']:
+        d[crit] = (rng.random(n) > 0.02).astype(np.int64)
+    d['doubtterr'] = rng.choice([-9, 0, 1], n, p=[0.05, 0.78, 0.17]).astype(float)
+    d['multiple'] = (rng.random(n) < 0.13).astype(float)
+    d['success'] = (rng.random(n) < 0.89).astype(np.int64)
+    d['suicide'] = (rng.random(n) < 0.036).astype(np.int64)
+
+    for k in (1, 2, 3):
+        null_rate = NULL_RATES.get('attacktype{}'.format(k), 0.0)
+        d['attacktype{}_txt'.format(k)], d['attacktype{}'.format(k)] = Labels(rng, ATTACK_TYPES, n, ATTACK_TYPE_P, null_rate)
+    for k in (1, 2, 3):
+        null_rate = NULL_RATES.get('targtype{}'.format(k), 0.0)
+        d['targtype{}_txt'.format(k)], d['targtype{}'.format(k)] = Labels(rng, TARGET_TYPES, n, TARGET_TYPE_P, null_rate)
+        empty = pd.isna(d['targtype{}_txt'.format(k)])
+        sub_txt, _ = Labels(rng, ['Subtype {}'.format(i) for i in range(110)], n,
+                            null_rate=NULL_RATES['targsubtype1'] if k == 1 else 0.0)
+        d['targsubtype{}_txt'.format(k)] = np.where(empty, None, sub_txt)
+        target = Blank(rng, np.array(['Target {}'.format(i) for i in range(5000)], dtype=object)[Zipf(rng, 5000, n)],
+                       NULL_RATES['target1'] if k == 1 else 0.0)
+        d['target{}'.format(k)] = np.where(empty, None, target)
+        natlty = Blank(rng, d['country_txt'].copy(), NULL_RATES['natlty1'] if k == 1 else 0.0)
+        d['natlty{}_txt'.format(k)] = np.where(empty, None, natlty)
+
+    has_grp = {1: np.ones(n, dtype=bool), 2: grp2 >= 0, 3: grp3 >= 0}
+    for k, grp in zip((1, 2, 3), (grp1, grp2, grp3)):
+        suffix = '' if k == 1 else str(k)
+        d['gname' + suffix] = np.where(has_grp[k], group_names[np.maximum(grp, 0)], None)
+        sub = Blank(rng, np.array(['Faction {}'.format(i) for i in range(600)], dtype=object)[rng.integers(0, 600, n)],
+                    NULL_RATES['gsubname'] if k == 1 else 0.99)
+        d['gsubname' + suffix] = np.where(has_grp[k], sub, None)
+    d['motive'] = Blank(rng, np.array(['Synthetic motive {}.'.format(i) for i in range(300)], dtype=object)[rng.integers(0, 300, n)],
+                        NULL_RATES['motive'])
+    d['guncertain1'] = (rng.random(n) < 0.08).astype(float)
+    d['guncertain2'] = np.where(has_grp[2], (rng.random(n) < 0.18).astype(float), np.nan)
+    d['guncertain3'] = np.where(has_grp[3], (rng.random(n) < 0.2).astype(float), np.nan)
+    d['individual'] = (rng.random(n) < 0.003).astype(np.int64)
+    d['nperps'] = np.where(rng.random(n) < 0.7, -99.0, rng.integers(1, 20, n).astype(float))
+    d['nperpcap'] = np.where(rng.random(n) < 0.4, -99.0, rng.choice([0, 1, 2], n, p=[0.9, 0.07, 0.03]).astype(float))
+    for k in (1, 2, 3):
+        suffix = 'ed' if k == 1 else str(k)
+        claimed = Blank(rng, rng.choice([-9, 0, 1], n, p=[0.01, 0.9, 0.09]).astype(float),
+                        NULL_RATES['claimed'] if k == 1 else 0.0)
+        d['claim' + suffix] = np.where(has_grp[k], claimed, np.nan)
+        mode, _ = Labels(rng, CLAIM_MODES, n, null_rate=NULL_RATES['claimmode'] if k == 1 else 0.97)
+        d['claimmode{}_txt'.format('' if k == 1 else k)] = np.where(has_grp[k], mode, None)
+    for k in (1, 2, 3):
+        null_rate = NULL_RATES.get('weaptype{}'.format(k), 0.0)
+        d['weaptype{}_txt'.format(k)], d['weaptype{}'.format(k)] = Labels(rng, WEAPON_TYPES, n, WEAPON_TYPE_P, null_rate)
+        sub_txt, _ = Labels(rng, WEAPON_SUBTYPES, n, null_rate=NULL_RATES['weapsubtype1'])
+        d['weapsubtype{}_txt'.format(k)] = np.where(pd.isna(d['weaptype{}_txt'.format(k)]), None, sub_txt)
+    d['nkill'] = Casualties(rng, n, NULL_RATES['nkill'])
+    d['nkillter'] = Casualties(rng, n, NULL_RATES['nkillter']) / 4
+    d['nwound'] = Casualties(rng, n, NULL_RATES['nwound']) * 1.5
+    d['nwoundte'] = Casualties(rng, n, NULL_RATES['nwoundte']) / 8
+    d['property'] = rng.choice([-9, 0, 1], n, p=[0.1, 0.4, 0.5]).astype(np.int64)
+    d['propextent_txt'], _ = Labels(rng, PROP_EXTENTS, n, [0.0005, 0.01, 0.55, 0.4395], NULL_RATES['propextent'])
+    d['propvalue'] = Blank(rng, np.round(rng.lognormal(8, 2.5, n), 0), NULL_RATES['propvalue'])
+    d['ishostkid'] = rng.choice([-9, 0, 1], n, p=[0.001, 0.925, 0.074]).astype(float)
+    d['nhostkid'] = Blank(rng, rng.integers(1, 30, n).astype(float), NULL_RATES['nhostkid'])
+    d['ransom'] = Blank(rng, rng.choice([-9, 0, 1], n, p=[0.01, 0.97, 0.02]).astype(float), 0.57)
+    d['ransomamt'] = Blank(rng, np.round(rng.lognormal(11, 2, n), 0), NULL_RATES['ransomamt'])
+    d['ransompaid'] = Blank(rng, np.round(rng.lognormal(9, 2, n), 0), NULL_RATES['ransompaid'])
+    d['hostkidoutcome_txt'], _ = Labels(rng, HOSTAGE_OUTCOMES, n, [0.005, 0.3, 0.07, 0.06, 0.015, 0.01, 0.54],
+                                        NULL_RATES['hostkidoutcome'])
+    for intl in ['INT_LOG', 'INT_IDEO', 'INT_MISC', 'INT_ANY']:
+        d[intl] = rng.choice([-9, 0, 1], n, p=[0.5, 0.35, 0.15]).astype(np.int64)
+    return pd.DataFrame(d)
+
+def WriteSynthetic(df, out_fpath):
+    '''
+    .xlsx like the real release (capped at excel's row limit), anything else as parquet.
+    '''
+    if out_fpath.endswith('.xlsx'):
+        if len(df) > EXCEL_MAX_ROWS:
+            raise ValueError("{} rows don't fit in a worksheet (max {}), write a .parquet instead".format(len(df), EXCEL_MAX_ROWS))
+        df.to_excel(out_fpath, index=False)
+    else:
+        df.to_parquet(out_fpath, index=False)
+
+if __name__ == "__main__":
+    n_events = int(float(sys.argv[1]))
+    out_fpath = sys.argv[2]
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    WriteSynthetic(GenerateGTD(n_events, seed), out_fpath)
+    print("wrote {} events to {}".format(n_events, out_fpath))
@@ -1,16 +1,53 @@
+import time
+#when app.py started, its imports, data load and layout are timed from here (startup_seconds)
+startup_start = time.perf_counter()
 import dash
+import flask
+import functools
+import importlib
+import logging
 import dash_bootstrap_components as dbc
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State, MATCH
 import pandas as pd
-import plotly.express as px
-import plotly.io as pio
 from dash_bootstrap_templates import load_figure_template
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import plotly.subplots as sp
-import colorsys
+from plotly.colors import qualitative
 import numpy as np
+import data_store
+from type_facts import TypeFacts
+from geo_facts import GeoFacts, LabelWithCountry
+from kpi import ComputeKPIs
+import compare_facts
+from layout_cache import LayoutCache
+from figure_store import FigureStore
+import metrics
+from slim_responses import SlimFigure, SlimLayout, TemplatesScript, CompressResponse
+
+class LazyModule:
+    '''
+    Stands in for a module that is imported the first time one of its
+    attributes is used.
+    '''
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            #import_module takes the import lock, two first uses on different threads import it once
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+#only needed to draw figures, imported by the first figure built instead of at startup
+px = LazyModule('plotly.express')
+sp = LazyModule('plotly.subplots')
+imports_seconds = time.perf_counter() - startup_start - data_store.load_seconds
+
+#startup and prewarm messages. Neither gunicorn nor the development server set up the root logger,
+#basicConfig sends them to stderr unless whatever runs the app already has
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
 
 
 ######################################Build and define some custom colors
@@ -26,22 +63,32 @@ color_scale = [
 
 ######################################################################################## Build our app  
 dbc_css = ("https://cdn.jsdelivr.net/gh/AnnMarieW/dash-bootstrap-templates/dbc.min.css")
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.DARKLY, dbc_css])
+#page content is built in callbacks, so callbacks refer to ids not in the initial layout.
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.DARKLY, dbc_css], suppress_callback_exceptions=True)
+#the figure templates script goes before assets/figure_templates.js, which uses it (slim_figures). It is
+#served under the app's path prefix (DASH_URL_BASE_PATHNAME, DASH_REQUESTS_PATHNAME_PREFIX) like Dash's own routes
+templates_script_name = 'figure-templates.js'
+app.config.external_scripts.append(app.get_relative_path('/' + templates_script_name))
 template = "darkly" #"cyborg"
 load_figure_template(template)
 
-############################################################################# Loading data and making Group index for performance                   
-raw_df = pd.read_parquet("gtd_clean_dataset_pqt.parquet")
-raw_df.set_index('Group', inplace=True)
+############################################################################# Loading data, see data_store.py
+group_names = data_store.GetGroupNames()
+
+########################################################################## Request metrics, see metrics.py
+metrics.dataset_load_seconds.set(data_store.load_seconds)
+#@figure_timer on a figure builder times every call of it
+figure_timer = metrics.Timed(metrics.figure_build_seconds, 'figure')
 
 #################################################################################### build overview
 ov_ind_margin = 0
-def ov_years_active_indicator(df):
-    min_year = df['Year'].min()
-    max_year = df['Year'].max()
-    years_active = max_year - min_year
-    if years_active == 0:
-        years_active = 1
+def group_kpis(df, kpis=None):
+    #the indicators read their number from the group's KPIs (kpi.py), computed here when not passed in
+    return kpis if kpis is not None else ComputeKPIs(df)
+
+@figure_timer
+def ov_years_active_indicator(df, kpis=None):
+    years_active = group_kpis(df, kpis)['years_active']
     fig = go.Figure()
     fig.add_trace(go.Indicator(
         mode="number",
@@ -51,8 +98,9 @@ def ov_years_active_indicator(df):
     ))
     return fig
 
-def ov_num_attacks_indicator(df):
-    num_attacks = len(df)
+@figure_timer
+def ov_num_attacks_indicator(df, kpis=None):
+    num_attacks = group_kpis(df, kpis)['attacks']
     fig = go.Figure()
     fig.add_trace(go.Indicator(
         mode="number",
@@ -63,8 +111,9 @@ def ov_num_attacks_indicator(df):
 
     return fig
 
-def ov_victims_wounded_indicator(df):
-    total_wounded = df['NVictimsWounded'].sum(skipna=True)
+@figure_timer
+def ov_victims_wounded_indicator(df, kpis=None):
+    total_wounded = group_kpis(df, kpis)['wounded']
     fig = go.Figure()
     fig.add_trace(go.Indicator(
         mode="number",
@@ -74,19 +123,11 @@ def ov_victims_wounded_indicator(df):
     ))
     return fig
 
-def ov_countries_affected_indicator(df,in_str='Countries'):
-    col,_title = '',''
-    if(in_str == 'Countries'): 
-        col = "Country"
-        _title='Countries'
-    if(in_str == 'Regions'): 
-        col = "SubRegion"
-        _title='Regions'
-    if(in_str == 'Cities'): 
-        col = "City"
-        _title='Cities'
-    df = df[df[col] != 'Unknown']
-    num_countries_affected = df[col].nunique()
+@figure_timer
+def ov_countries_affected_indicator(df,in_str='Countries',kpis=None):
+    #places other than 'Unknown', in_str is Countries, Regions or Cities
+    _title = in_str
+    num_countries_affected = group_kpis(df, kpis)[in_str]
     fig = go.Figure()
     fig.add_trace(go.Indicator(
         mode="number",
@@ -97,8 +138,9 @@ def ov_countries_affected_indicator(df,in_str='Countries'):
 
     return fig
 
-def ov_victims_killed_indicator(df):
-    total_victims_killed = df['NVictimsKilled'].sum(skipna=True)
+@figure_timer
+def ov_victims_killed_indicator(df, kpis=None):
+    total_victims_killed = group_kpis(df, kpis)['killed']
     fig = go.Figure()
     fig.add_trace(go.Indicator(
         mode="number",
@@ -110,10 +152,15 @@ def ov_victims_killed_indicator(df):
     return fig
 
 
-def ov_kill_wounded(df, template):
-    #Todo can do this with one dataset
-    df_summed = df.groupby('Year').agg({'NVictimsWounded': 'sum', 'NVictimsKilled': 'sum'}).reset_index()
-    df_attacks = df.groupby('Year').size().reset_index(name='Attacks')
+@figure_timer
+def ov_kill_wounded(df, template, rollups=None):
+    if rollups is not None:
+        df_summed = rollups['group_year'][['Year', 'NVictimsWounded', 'NVictimsKilled']]
+        df_attacks = rollups['group_year'][['Year', 'Attacks']]
+    else:
+        #Todo can do this with one dataset
+        df_summed = df.groupby('Year').agg({'NVictimsWounded': 'sum', 'NVictimsKilled': 'sum'}).reset_index()
+        df_attacks = df.groupby('Year').size().reset_index(name='Attacks')
 
     fig_line = px.line(df_summed, x='Year', y=['NVictimsWounded', 'NVictimsKilled'],
                        labels={'value': 'Number of Victims', 'variable': 'Type'},
@@ -137,12 +184,20 @@ def ov_kill_wounded(df, template):
     subplot.update_layout(template=template, margin={"r": 5, "t": 20, "l": 5, "b": 5})
     return subplot
 
-def line_polar_attack_types(df,template):
-    df_melted = pd.melt(df, value_vars=['AttackType1', 'AttackType2', 'AttackType3'],
-                        var_name='AttackType', value_name='AttackTypeValue')
-
-    df_melted = df_melted.dropna(subset=['AttackTypeValue'])
-    grp = df_melted.groupby("AttackTypeValue").size().reset_index(name="frequency")
+def type_counts(df, type_col, rollups=None, facts=None):
+    #per type value slot counts and casualty sums, always TypeFacts.Counts of the group's events: the ETL's
+    #group_<type> rollups are those rows precomputed, facts the group's TypeFacts when the caller has them
+    #(tests/test_type_counts.py checks every type figure comes out the same from each)
+    if rollups is not None:
+        return rollups['group_' + type_col.lower()]
+    if facts is None:
+        facts = TypeFacts(df)
+    return facts.Counts(type_col)
+
+@figure_timer
+def line_polar_attack_types(df,template,rollups=None,facts=None):
+    grp = type_counts(df, 'AttackType', rollups, facts)[['AttackType', 'Attacks']].rename(
+        columns={'AttackType': 'AttackTypeValue', 'Attacks': 'frequency'})
 
     grp  = grp[grp['AttackTypeValue'] != 'Unknown']
 
@@ -159,8 +214,9 @@ def line_polar_attack_types(df,template):
                       )
     return fig
 
-def ov_attack_success_gauge(df, template):
-    success_rate = (df['AttackSuccess'].sum() / len(df)) * 100
+@figure_timer
+def ov_attack_success_gauge(df, template, kpis=None):
+    success_rate = group_kpis(df, kpis)['success_rate']
 
     fig = go.Figure(go.Indicator(
         mode="gauge+number",
@@ -178,12 +234,10 @@ def ov_attack_success_gauge(df, template):
 
     return fig
 
-def ov_targetTypeBar(df,template):
-    df_melted = pd.melt(df, value_vars=['TargetType1', 'TargetType2', 'TargetType3'],
-                        var_name='TargTypeCol', value_name='TargTypeValue')
-
-    df_melted = df_melted.dropna(subset=['TargTypeValue'])
-    grp = df_melted.groupby("TargTypeValue").size().reset_index(name="Frequency")
+@figure_timer
+def ov_targetTypeBar(df,template,rollups=None,facts=None):
+    grp = type_counts(df, 'TargetType', rollups, facts)[['TargetType', 'Attacks']].rename(
+        columns={'TargetType': 'TargTypeValue', 'Attacks': 'Frequency'})
     top_targets = grp.sort_values(by='Frequency', ascending=False).head(5)
     fig = px.bar(top_targets, x='Frequency', y='TargTypeValue',
                  title='Top 5 Target Types',color_discrete_sequence=[t_green],
@@ -193,26 +247,34 @@ def ov_targetTypeBar(df,template):
                       )
     return fig
 
-def ov_attacks_by_country_choropleth(df, template):
-    attacks_df = df.groupby("Country").size().reset_index(name="attacks")
-    attacks_df = attacks_df[attacks_df['attacks'] > 0]
-
-    victims_df = df.groupby("Country").agg({
-        'NVictimsKilled': 'sum',
-        'NVictimsWounded': 'sum'
-    }).reset_index()
-
-    grouped_df = attacks_df.merge(victims_df, on='Country', how='left')
-
+@figure_timer
+def ov_attacks_by_country_choropleth(df, template, rollups=None):
+    if rollups is not None:
+        columns = [col for col in ['Country', 'ISO3', 'Attacks', 'NVictimsKilled', 'NVictimsWounded'] if col in rollups['group_country']]
+        grouped_df = rollups['group_country'][columns].rename(columns={'Attacks': 'attacks'})
+    else:
+        attacks_df = df.groupby("Country", observed=False).size().reset_index(name="attacks")
+        attacks_df = attacks_df[attacks_df['attacks'] > 0]
+
+        victims_df = df.groupby("Country", observed=False).agg({
+            'NVictimsKilled': 'sum',
+            'NVictimsWounded': 'sum'
+        }).reset_index()
+
+        grouped_df = attacks_df.merge(victims_df, on='Country', how='left')
+
+    #ISO-3 codes from the ETL's country table when it wrote them, else the browser matches the country names
+    if 'ISO3' in grouped_df:
+        location_args = {'locations': 'ISO3', 'hover_data': {'Country': True, 'NVictimsKilled': True, 'NVictimsWounded': True, 'ISO3': False}}
+    else:
+        location_args = {'locations': 'Country', 'locationmode': 'country names', 'hover_data': ['NVictimsKilled', 'NVictimsWounded', 'Country']}
     fig = px.choropleth(grouped_df,
-                        locations='Country',
-                        locationmode='country names',
                         color='attacks',
                         title='Attacks by Country',
                         color_continuous_scale=color_scale,
                         range_color=(0, grouped_df['attacks'].max()),
                         template=template,
-                        hover_data=['NVictimsKilled', 'NVictimsWounded', 'Country'])
+                        **location_args)
 
     fig.update_layout(
         template=template,
@@ -223,30 +285,34 @@ def ov_attacks_by_country_choropleth(df, template):
     return fig
 
 
-def BuildGetOverviewLayout(filtered_df,template):
+def BuildGetOverviewLayout(filtered_df,template,rollups=None,facts=None,kpis=None):
+    if facts is None:
+        facts = TypeFacts(filtered_df)
+    if kpis is None:
+        kpis = ComputeKPIs(filtered_df)
     row_marg ='25px'
     ind_height = '100px'
     meth_height = '450px'
     return [
         dbc.Row([
-            dbc.Col(dcc.Graph(figure=ov_years_active_indicator(filtered_df), style={'height': ind_height}),width=2),
-            dbc.Col(dcc.Graph(figure=ov_countries_affected_indicator(filtered_df), style={'height': ind_height}),width=2),
-            dbc.Col(dcc.Graph(figure=ov_num_attacks_indicator(filtered_df), style={'height': ind_height}),width=4),
-            dbc.Col(dcc.Graph(figure=ov_victims_killed_indicator(filtered_df), style={'height': ind_height}),width=2),
-            dbc.Col(dcc.Graph(figure=ov_victims_wounded_indicator(filtered_df), style={'height': ind_height}),width=2),
+            dbc.Col(dcc.Graph(figure=ov_years_active_indicator(filtered_df,kpis=kpis), style={'height': ind_height}),width=2),
+            dbc.Col(dcc.Graph(figure=ov_countries_affected_indicator(filtered_df,kpis=kpis), style={'height': ind_height}),width=2),
+            dbc.Col(dcc.Graph(figure=ov_num_attacks_indicator(filtered_df,kpis=kpis), style={'height': ind_height}),width=4),
+            dbc.Col(dcc.Graph(figure=ov_victims_killed_indicator(filtered_df,kpis=kpis), style={'height': ind_height}),width=2),
+            dbc.Col(dcc.Graph(figure=ov_victims_wounded_indicator(filtered_df,kpis=kpis), style={'height': ind_height}),width=2),
         ],style={'margin-top': row_marg}), 
 
         dbc.Row([
-            dbc.Col(dcc.Graph(figure=ov_kill_wounded(filtered_df,template), style={'height': '250px'}),width=9),
-            dbc.Col(dcc.Graph(figure=ov_attack_success_gauge(filtered_df, template), style={'height': '250px'}),width=3),
+            dbc.Col(dcc.Graph(figure=ov_kill_wounded(filtered_df,template,rollups), style={'height': '250px'}),width=9),
+            dbc.Col(dcc.Graph(figure=ov_attack_success_gauge(filtered_df, template, kpis), style={'height': '250px'}),width=3),
         ], style={'margin-top': row_marg}),
 
         dbc.Row([
-            dbc.Col(dcc.Graph(figure=ov_attacks_by_country_choropleth(filtered_df,template), style={'height': meth_height}),width=8),
+            dbc.Col(dcc.Graph(figure=ov_attacks_by_country_choropleth(filtered_df,template,rollups), style={'height': meth_height}),width=8),
             dbc.Col(
                 children = [
-                dcc.Graph(figure=line_polar_attack_types(filtered_df,template), style={'height': '225px'}),
-                dcc.Graph(figure=ov_targetTypeBar(filtered_df,template), style={'height': '225px'})
+                dcc.Graph(figure=line_polar_attack_types(filtered_df,template,rollups,facts), style={'height': '225px'}),
+                dcc.Graph(figure=ov_targetTypeBar(filtered_df,template,rollups,facts), style={'height': '225px'})
                 ],width=4),
             
             
@@ -259,31 +325,26 @@ def BuildGetOverviewLayout(filtered_df,template):
 
 
 #####################################################################################Build Attack page
-def at_area_chart(df,template,c_val):
-    val_vars, _title,_legend_title = None,None,None
+@figure_timer
+def at_area_chart(df,template,c_val,facts=None):
+    _title,_legend_title = None,None
     if (c_val == 'Weapon'):
-        val_vars = ['WeaponType1','WeaponType2','WeaponType3']
         _title = 'Top 5 Most Used Weapons Over Time'
         _legend_title = 'Weapons Choice Evolution'
     if (c_val == 'Attack'):
-        val_vars = ['AttackType1','AttackType2','AttackType3']
         _title = 'Top 5 Attack Methods Over Time'
         _legend_title = 'Attack Method Evolution'
     if (c_val == 'Target'):
-        val_vars = ['TargetType1','TargetType2','TargetType3']
         _title = 'Top 5 Targets Over Time'
         _legend_title = 'Target Method Evolution'
+    type_col = c_val + 'Type'
+    if facts is None:
+        facts = TypeFacts(df)
 
-    df_melted = pd.melt(df,id_vars=['Year'],value_vars=val_vars,
-                        var_name='TypeCol', value_name='TypeValue')
-    df_melted = df_melted.dropna(subset=['TypeValue'])
-    df_melted = df_melted[df_melted['TypeValue']!='Unknown']
-    df_melted = df_melted[df_melted['TypeValue']!='Other']
+    top_5 = facts.Top(type_col, 5, exclude=['Unknown', 'Other'])
 
-    top_5_df = df_melted.groupby('TypeValue').size().reset_index(name='NumAttacks').sort_values(by='NumAttacks', ascending=False).head(5)
-    top_5 = top_5_df['TypeValue'].unique()
-
-    grouped_df = df_melted.groupby(['Year', 'TypeValue']).size().reset_index(name='NumAttacks')
+    grouped_df = facts.Counts(type_col, exclude=['Unknown', 'Other'], by_year=True)[['Year', type_col, 'Attacks']].rename(
+        columns={type_col: 'TypeValue', 'Attacks': 'NumAttacks'})
     grouped_df = grouped_df[grouped_df['TypeValue'].isin(top_5)]
 
     fig = px.area(grouped_df, x='Year', y='NumAttacks', color='TypeValue',
@@ -292,19 +353,29 @@ def at_area_chart(df,template,c_val):
     fig.update_layout(legend_title_text=_legend_title,yaxis_title='Attacks',margin={"r": 5, "t": 30, "l": 5, "b": 5})
     return fig
 
-def at_area_chart_tabs(filtered_df,template,height):
+def at_area_chart_tabs(filtered_df,template,height,facts=None):
+    if lazy_render:
+        #one graph under the tabs, drawn for the active tab by update_area_tab
+        return html.Div([
+            dbc.Tabs([
+                dbc.Tab(label='Attack Method Evolution',tab_id='Attack',active_label_style={'color' : t_green}),
+                dbc.Tab(label='Target Selection Evolution',tab_id='Target',active_label_style={'color' : t_green}),
+            ],active_tab='Attack',id='at-area-tabs'),
+            dcc.Graph(id='at-area-graph',style={'height': height}),
+        ])
     return dbc.Tabs([
         dbc.Tab(label='Attack Method Evolution',tab_id='Attack',active_label_style={'color' : t_green}, children=[
-            dcc.Graph(figure=at_area_chart(filtered_df, template,'Attack'),style={'height': height}),
+            dcc.Graph(figure=at_area_chart(filtered_df, template,'Attack',facts),style={'height': height}),
         ]),
 
         dbc.Tab(label='Target Selection Evolution',tab_id='Target',active_label_style={'color' : t_green}, children=[
-            dcc.Graph(figure=at_area_chart(filtered_df, template,'Target'),style={'height': height})
+            dcc.Graph(figure=at_area_chart(filtered_df, template,'Target',facts),style={'height': height})
         ]),
     ],active_tab='Attack')
 
-def at_sui_attack_gauge(df, template):
-    success_rate = (df['SuicideAttack'].sum() / len(df)) * 100
+@figure_timer
+def at_sui_attack_gauge(df, template, kpis=None):
+    success_rate = group_kpis(df, kpis)['suicide_rate']
 
     fig = go.Figure(go.Indicator(
         mode="gauge+number",
@@ -323,19 +394,13 @@ def at_sui_attack_gauge(df, template):
     return fig
 
 
-def at_cas_stacked_bar_chart(filtered_df, template):
-    df_melted = pd.melt(filtered_df, id_vars=['NVictimsKilled', 'NVictimsWounded', 'Casualties'],
-                        value_vars=['AttackType1', 'AttackType2', 'AttackType3'],
-                        var_name='AttackTypeCol', value_name='AttackType')
-    df_melted = df_melted.dropna(subset=['AttackType'])
-    df_melted = df_melted[df_melted['AttackType'] != 'Unknown']
-    df_melted = df_melted[df_melted['AttackType'] != 'Other']
-    df_summed = df_melted.groupby('AttackType').agg({'NVictimsWounded': 'sum',
-                                                      'NVictimsKilled': 'sum',
-                                                      'Casualties': 'sum'}).reset_index()
-    top_5_df = df_melted.groupby('AttackType').size().reset_index(name='NumAttacks').sort_values(by='NumAttacks',
-                                                                                                   ascending=False).head(
-        5)
+@figure_timer
+def at_cas_stacked_bar_chart(filtered_df, template, rollups=None, facts=None):
+    type_df = type_counts(filtered_df, 'AttackType', rollups, facts)
+    type_df = type_df[~type_df['AttackType'].isin(['Unknown', 'Other'])]
+    df_summed = type_df[['AttackType', 'NVictimsWounded', 'NVictimsKilled', 'Casualties']]
+    top_5_df = type_df[['AttackType', 'Attacks']].rename(columns={'Attacks': 'NumAttacks'}).sort_values(
+        by='NumAttacks', ascending=False).head(5)
     top_5 = top_5_df['AttackType'].unique()
     df_summed = df_summed[df_summed['AttackType'].isin(top_5)]
     df_summed = df_summed[(df_summed['NVictimsKilled'] > 0) | (df_summed['NVictimsWounded'] > 0)]
@@ -365,11 +430,9 @@ def at_cas_stacked_bar_chart(filtered_df, template):
     )
     return fig
 
-def at_atts_per_yr_indicator(df):
-    attacks_per_year = df['Year'].value_counts().reset_index()
-    attacks_per_year.columns = ['Year', 'NumAttacks']
-    average_attacks_per_year = attacks_per_year['NumAttacks'].mean()
-    rounded_average_attacks = round(average_attacks_per_year, 1)
+@figure_timer
+def at_atts_per_yr_indicator(df, kpis=None):
+    rounded_average_attacks = group_kpis(df, kpis)['attacks_per_year']
     fig = go.Figure()
     fig.add_trace(go.Indicator(
         mode="number",
@@ -379,12 +442,9 @@ def at_atts_per_yr_indicator(df):
     ))
     return fig
 
-def at_claimed_perc_indicator(df):
-    _df = df[df['GroupClaimed']>=0]
-    claimed_attacks = _df['GroupClaimed'].sum()
-    total_attacks = len(_df)
-    percentage_claimed = (claimed_attacks / total_attacks) * 100
-    percentage_claimed = round(percentage_claimed, 1)
+@figure_timer
+def at_claimed_perc_indicator(df, kpis=None):
+    percentage_claimed = group_kpis(df, kpis)['claimed_rate']
     fig = go.Figure()
 
     fig.add_trace(go.Indicator(
@@ -395,17 +455,16 @@ def at_claimed_perc_indicator(df):
     ))
     return fig
 
-def at_kpa_wpa_indicator(df,k_or_a):
+@figure_timer
+def at_kpa_wpa_indicator(df,k_or_a,kpis=None):
     rounded_average_killed_per_attack = None
     _title = ''
     if (k_or_a == 'Killed'):
-        average_killed_per_attack = df['NVictimsKilled'].mean()
-        rounded_average_killed_per_attack = round(average_killed_per_attack, 1)
+        rounded_average_killed_per_attack = group_kpis(df, kpis)['killed_per_attack']
         _title = 'Killed Per Attack'
     if (k_or_a == 'Wounded'):
-        average_killed_per_attack = df['NVictimsWounded'].mean()
-        rounded_average_killed_per_attack = round(average_killed_per_attack, 1)
-        _title = 'Wounded Per Attack'     
+        rounded_average_killed_per_attack = group_kpis(df, kpis)['wounded_per_attack']
+        _title = 'Wounded Per Attack'
     fig = go.Figure()
     fig.add_trace(go.Indicator(
         mode="number",
@@ -436,61 +495,40 @@ def at_treemap(df,template):
     df_summed = df_summed[(df_summed['NVictimsKilled'] > 0) | (df_summed['NVictimsWounded'] > 0)]
 
 
-def at_treemap_helper(df,in_str):
-    #just melts on commmon stuff
-    val_vars,var_nm,value_nm = [],'',''
-    if (in_str == 'AttackType'): 
-        val_vars = ['AttackType1', 'AttackType2', 'AttackType3']
-        var_nm ='AttackTypeCol'
-        value_nm ='AttackType'
-    if (in_str == 'TargetType'): 
-        val_vars = ['TargetType1', 'TargetType2', 'TargetType3']
-        var_nm ='TargetTypeCol'
-        value_nm ='TargetType'
-    ret = pd.melt(df, id_vars=['EventID','Casualties','AttackSuccess'],
-                        value_vars=val_vars,
-                        var_name=var_nm, value_name=value_nm)
-    ret = ret.dropna(subset=[value_nm])
-    return ret
-    
-
-def at_TreeMap(df,template):
-    #TARG_DF cols : TargetType, EventID, Casualties
-    #ATT_DF cols : AttackType, EventID, Casualties
-    targ_df = at_treemap_helper(df,'TargetType')
-    att_df = at_treemap_helper(df,'AttackType')
-    targ_df = targ_df[targ_df['TargetType'] != 'Unknown']
-    targ_df = targ_df[targ_df['TargetType'] != 'Other']
-    att_df = att_df[att_df['AttackType'] != 'Unknown']
-    att_df = att_df[att_df['AttackType'] != 'Other']
+def casualty_midpoint(df):
+    #casualties per attack, the treemaps' color midpoint. None (autoscaled) for a year range without attacks
+    if df['Attacks'].sum() == 0:
+        return None
+    return np.average(df['Casualties'], weights=df['Attacks'])
 
+@figure_timer
+def at_TreeMap(df,template,rollups=None,facts=None):
+    if facts is None and rollups is None:
+        facts = TypeFacts(df)
+    targ_counts = type_counts(df, 'TargetType', rollups, facts)
+    targ_counts = targ_counts[~targ_counts['TargetType'].isin(['Unknown', 'Other'])]
     #top 5 targets only
-    top_5_df = targ_df.groupby('TargetType').size().reset_index(name='NumAttacks').sort_values(by='NumAttacks',
-                                                                                           ascending=False).head(5)
+    top_5_df = targ_counts[['TargetType', 'Attacks']].rename(columns={'Attacks': 'NumAttacks'}).sort_values(
+        by='NumAttacks', ascending=False).head(5)
     top_5_targs = top_5_df['TargetType'].unique()
-    targ_df = targ_df[targ_df['TargetType'].isin(top_5_targs)]
-    
-    #join on the attack data
-    merged_df = pd.merge(targ_df, att_df[['EventID', 'AttackType']], on='EventID', how='left')
-    merged_df['Casualties'] = merged_df['Casualties'].fillna(0)
-
-    grouped_df = merged_df.groupby(['TargetType', 'AttackType']).agg({
-    'Casualties': 'sum',
-    'EventID': 'count'
-    }).reset_index()
-
-    grouped_df = grouped_df.rename(columns={'EventID': 'Attacks'})
-    print(grouped_df)
+    if rollups is not None:
+        grouped_df = rollups['group_targettype_attacktype']
+        grouped_df = grouped_df[grouped_df['TargetType'].isin(top_5_targs)]
+    else:
+        #joined on the attack methods of the same events
+        grouped_df = facts.PairCounts('TargetType', 'AttackType', top_5_targs, exclude=['Unknown', 'Other'])
+    grouped_df = grouped_df[['TargetType', 'AttackType', 'Casualties', 'Attacks']]
     #GROUPED_DF has columns : TargetType,AttackType,Casualties,NumOccurences
     fig = px.treemap(grouped_df, path=[px.Constant("Top 5 Targets"), 'TargetType', 'AttackType'], values='Attacks',
                   color='Casualties',
                   #color_continuous_scale='RdBu',#'Viridis',#
-                  color_continuous_midpoint=np.average(grouped_df['Casualties'], weights=grouped_df['Attacks']))
+                  color_continuous_midpoint=casualty_midpoint(grouped_df))
     fig.update_layout(margin = dict(t=50, l=25, r=25, b=25),template=template,title='Attack Profile of Top 5 Targets')
     return fig   
 #######
 
-def at_bar_polar(df,template,in_str):
+@figure_timer
+def at_bar_polar(df,template,in_str,rollups=None,facts=None):
     _title = ''
     _col = ''
     if(in_str == 'AttackType'):
@@ -499,15 +537,11 @@ def at_bar_polar(df,template,in_str):
     if(in_str == 'TargetType'):
         _title = 'Top 5 Targets'
         _col = 'TargetType'
-    grp = at_treemap_helper(df,in_str)
-    grp  = grp[grp[_col] != 'Unknown']
-    grp  = grp[grp[_col] != 'Other']
-    top_5_df = grp.groupby(_col).size().reset_index(name='NumAttacks').sort_values(by='NumAttacks',
-                                                                                           ascending=False).head(5)
+    grp = type_counts(df, in_str, rollups, facts)[[_col, 'Attacks']].rename(columns={'Attacks': 'NumAttacks'})
+    grp = grp[~grp[_col].isin(['Unknown', 'Other'])]
+    top_5_df = grp.sort_values(by='NumAttacks', ascending=False).head(5)
     top_5_targs = top_5_df[_col].unique()
-    _df = grp[grp[_col].isin(top_5_targs)]
-
-    _df = _df.groupby(_col).size().reset_index(name="frequency")
+    _df = grp[grp[_col].isin(top_5_targs)].rename(columns={'NumAttacks': 'frequency'})
 
     #only inlcude the top 5
     fig = px.bar_polar(_df, r="frequency",theta=_col,
@@ -523,7 +557,11 @@ def at_bar_polar(df,template,in_str):
 
 
 
-def BuildGetAttackLayout(filtered_df,template):
+def BuildGetAttackLayout(filtered_df,template,rollups=None,facts=None,kpis=None):
+    if facts is None:
+        facts = TypeFacts(filtered_df)
+    if kpis is None:
+        kpis = ComputeKPIs(filtered_df)
     row_marg ='25px'
     ind_height = '125px'#
     meth_height = '450px'
@@ -531,26 +569,26 @@ def BuildGetAttackLayout(filtered_df,template):
     bar_height = '215px'
     return [
         dbc.Row([
-            dbc.Col(dcc.Graph(figure=at_atts_per_yr_indicator(filtered_df), style={'height': ind_height}),width=2),
-            dbc.Col(dcc.Graph(figure=at_claimed_perc_indicator(filtered_df), style={'height': ind_height}),width=2),
-            dbc.Col(dcc.Graph(figure=at_sui_attack_gauge(filtered_df, template), style={'height': ind_height}),width=4),
-            dbc.Col(dcc.Graph(figure=at_kpa_wpa_indicator(filtered_df,'Killed'), style={'height': ind_height}),width=2),
-            dbc.Col(dcc.Graph(figure=at_kpa_wpa_indicator(filtered_df,'Wounded'), style={'height': ind_height}),width=2),
+            dbc.Col(dcc.Graph(figure=at_atts_per_yr_indicator(filtered_df,kpis=kpis), style={'height': ind_height}),width=2),
+            dbc.Col(dcc.Graph(figure=at_claimed_perc_indicator(filtered_df,kpis=kpis), style={'height': ind_height}),width=2),
+            dbc.Col(dcc.Graph(figure=at_sui_attack_gauge(filtered_df, template, kpis), style={'height': ind_height}),width=4),
+            dbc.Col(dcc.Graph(figure=at_kpa_wpa_indicator(filtered_df,'Killed',kpis), style={'height': ind_height}),width=2),
+            dbc.Col(dcc.Graph(figure=at_kpa_wpa_indicator(filtered_df,'Wounded',kpis), style={'height': ind_height}),width=2),
             
         ], style={'margin-top': row_marg}),
         dbc.Row([
-            dbc.Col(dcc.Graph(figure=at_bar_polar(filtered_df,template,'TargetType'), style={'height': bar_height}),width=4),
-            dbc.Col(dcc.Graph(figure=at_bar_polar(filtered_df,template,'AttackType'), style={'height': bar_height}),width=4),
-            dbc.Col(dcc.Graph(figure=at_cas_stacked_bar_chart(filtered_df,template), style={'height': bar_height}),width=4)
+            dbc.Col(dcc.Graph(figure=at_bar_polar(filtered_df,template,'TargetType',rollups,facts), style={'height': bar_height}),width=4),
+            dbc.Col(dcc.Graph(figure=at_bar_polar(filtered_df,template,'AttackType',rollups,facts), style={'height': bar_height}),width=4),
+            dbc.Col(dcc.Graph(figure=at_cas_stacked_bar_chart(filtered_df,template,rollups,facts), style={'height': bar_height}),width=4)
             
         ], style={'margin-top': row_marg}),
         
         dbc.Row([ 
-            dbc.Col(at_area_chart_tabs(filtered_df,template,'270px'),width=12),
+            dbc.Col(at_area_chart_tabs(filtered_df,template,'270px',facts),width=12),
         ], style={'margin-top': row_marg}),
 
         dbc.Row([
-            dbc.Col(dcc.Graph(figure=at_TreeMap(filtered_df,template), style={'height': '400px'}),width=12),
+            dbc.Col(lazy_graph('at_TreeMap', {'height': '400px'}, filtered_df, rollups, facts),width=12),
             
         ], style={'margin-top': row_marg}),
         dbc.Row([
@@ -561,18 +599,17 @@ def BuildGetAttackLayout(filtered_df,template):
 
 
 #####################################################################################Build Geo page
-def first_non_null(series):
-    return series.dropna().iloc[0] if not series.dropna().empty else None
-
-def geo_attacks_map(df, template):
-    attacks_df = df.groupby(['Year',"SubRegion"]).agg(attacks=('Casualties', 'size'), Casualties=('Casualties', 'sum')).reset_index()
-    attacks_df = attacks_df[attacks_df['attacks'] > 0]
-    attacks_df = attacks_df.dropna()
-
-    locs_df = df.groupby(['Year', 'SubRegion']).agg({'Latitude': first_non_null, 'Longitude': first_non_null}).reset_index()
-    merged_df = pd.merge(attacks_df, locs_df, on=['Year', 'SubRegion'], how='left')
-    merged_df = merged_df.dropna()
-    merged_df = merged_df[merged_df['attacks'] > 0]
+def geo_year_subregion(df, rollups=None, geo=None):
+    #Year x SubRegion attacks, casualties and first known location, the map's points
+    if rollups is not None and 'group_year_subregion_geo' in rollups:
+        return rollups['group_year_subregion_geo']
+    if geo is None:
+        geo = GeoFacts(df)
+    return geo.YearSubRegion()
+
+@figure_timer
+def geo_attacks_map(df, template, rollups=None, geo=None):
+    merged_df = geo_year_subregion(df, rollups, geo)
     fig = px.scatter_geo(merged_df, lat='Latitude',lon='Longitude', color="Casualties",
                         hover_name="SubRegion", size="attacks",
                         animation_frame="Year",
@@ -586,7 +623,36 @@ def geo_attacks_map(df, template):
 
     return fig
 
-def geo_bar_plots(df,template,in_str):
+@figure_timer
+def geo_attacks_map_year(merged_df, template, year):
+    #one year of geo_attacks_map, marker sizes on the scale of all the group's years like the animation's
+    fig = px.scatter_geo(merged_df[merged_df['Year'] == year], lat='Latitude',lon='Longitude', color="Casualties",
+                        hover_name="SubRegion", size="attacks",
+                        projection="natural earth",title="Attacks by Location in {}".format(year))
+    #px's marker scaling (size_max=20) from the largest point of any year
+    fig.update_traces(marker_sizeref=merged_df['attacks'].max() / (20 ** 2))
+
+    fig.update_layout(
+        autosize=False,
+        template=template,
+        margin={"r": 5,"t": 40, "l": 5, "b": 5}
+    )
+
+    return fig
+
+def geo_attacks_map_stream(merged_df, map_height):
+    #streamed geo_attacks_map: the graph is drawn for the slider's year by update_geo_map_year
+    years = merged_df['Year']
+    first, last = (int(years.min()), int(years.max())) if len(years) else (0, 0)
+    return html.Div([
+        dcc.Graph(id='geo-map-graph', style={'height': map_height}),
+        dcc.Slider(id='geo-map-year', min=first, max=last, step=1, value=first,
+                   marks={first: str(first), last: str(last)},
+                   tooltip={'placement': 'bottom', 'always_visible': True}),
+    ])
+
+@figure_timer
+def geo_bar_plots(df,template,in_str,geo=None):
     _title = ''
     _col = ''
     if(in_str == 'Countries'):
@@ -599,14 +665,11 @@ def geo_bar_plots(df,template,in_str):
         _title = 'Top 5 Cities'
         _col = 'City'
     
-    _df = df.copy()
-    _df[_col] = _df[_col].astype(str)
-    _df = _df[_df[_col] != 'Unknown']
-    _df['Country'] = _df['Country'].astype(str)
-    if(in_str != 'Countries'):
-        _df[_col]=_df[_col] + ', ' + _df['Country']
-    
-    top_5_df = _df.groupby(_col).size().reset_index(name='Attacks').sort_values(by='Attacks',
+    #labeled place counts, counted and labeled once per group
+    if geo is None:
+        geo = GeoFacts(df)
+    _df = geo.PlaceCounts(in_str)
+    top_5_df = _df.groupby(_col).agg({'Attacks': 'sum'}).reset_index().sort_values(by='Attacks',
                                                                                            ascending=False).head(5)
     #only inlcude the top 5
     fig = px.bar(top_5_df, y=_col, x='Attacks',
@@ -618,13 +681,18 @@ def geo_bar_plots(df,template,in_str):
                       )
     return fig
 
-def geo_Treemap(df,template): #highest casualties SubRegions
-    _df = df.copy()
-    _df = _df[_df['SubRegion']!= 'Unknown']
-    _df['SubRegion'] = _df['SubRegion'].astype(str)
-    _df['Country'] = _df['Country'].astype(str)
-    _df['SubRegion'] = _df['SubRegion'] + ', ' + _df['Country']
-    top_5_df = _df.groupby('SubRegion').agg({'Casualties': 'sum', 'EventID': 'count'}).reset_index()
+@figure_timer
+def geo_Treemap(df,template,rollups=None,geo=None): #highest casualties SubRegions
+    if rollups is not None:
+        #per (SubRegion, Country) first, labels are only built for the pairs that occur
+        _df = rollups['group_subregion_year'].groupby(['SubRegion', 'Country'], observed=True, dropna=False).agg(
+            Casualties=('Casualties', 'sum'), EventID=('Attacks', 'sum')).reset_index()
+        _df = LabelWithCountry(_df, 'SubRegion', True)
+    else:
+        if geo is None:
+            geo = GeoFacts(df)
+        _df = geo.SubRegionCounts()
+    top_5_df = _df.groupby('SubRegion').agg({'Casualties': 'sum', 'EventID': 'sum'}).reset_index()
     top_5_df.columns = ['SubRegion', 'Casualties', 'EventID']
     top_5_df = top_5_df.sort_values(by='EventID', ascending=False).head(5)
     top_5_df = top_5_df[top_5_df['EventID']>0]
@@ -633,13 +701,15 @@ def geo_Treemap(df,template): #highest casualties SubRegions
     fig = px.treemap(top_5_df, path=[px.Constant("Top 5 Regions"), 'SubRegion'], values='Attacks',
                   color='Casualties',
                   #color_continuous_scale='RdBu',#'Viridis',#
-                  color_continuous_midpoint=np.average(top_5_df['Casualties'], weights=top_5_df['Attacks']))
+                  color_continuous_midpoint=casualty_midpoint(top_5_df))
     fig.update_layout(margin = dict(t=50, l=25, r=25, b=25),template=template,title='Top 5 Regions: Attacks and Casualties')
     return fig   
 
-def geo_region_spread(df, template):
-    #Todo can do this with one dataset
-    df_summed = df.groupby('Year').agg({'SubRegion': 'nunique'}).reset_index()
+@figure_timer
+def geo_region_spread(df, template, geo=None):
+    if geo is None:
+        geo = GeoFacts(df)
+    df_summed = geo.RegionsPerYear().copy()
     df_summed['Regions Attacked'] = df_summed['SubRegion']
 
     fig_line = px.line(df_summed, x='Year', y=['Regions Attacked'],
@@ -651,31 +721,36 @@ def geo_region_spread(df, template):
     fig_line.update_layout(template=template, margin={"r": 5, "t": 40, "l": 5, "b": 20},showlegend=False,xaxis_title=None,yaxis_title_font=dict(size=12))
     return fig_line
 
-def BuildGetGeoLayout(filtered_df,template):
+def BuildGetGeoLayout(filtered_df,template,rollups=None,kpis=None,geo=None):
+    if kpis is None:
+        kpis = ComputeKPIs(filtered_df)
+    if geo is None:
+        geo = GeoFacts(filtered_df)
     row_marg ='25px'
     ind_height = '90px'
     bar_height = '150px'
     map_height = '500px'
     return [
         dbc.Row([
-            dbc.Col(dcc.Graph(figure=ov_countries_affected_indicator(filtered_df,in_str='Countries'), style={'height': ind_height}),width=4),
-            dbc.Col(dcc.Graph(figure=ov_countries_affected_indicator(filtered_df,in_str='Regions'), style={'height': ind_height}),width=4),
-            dbc.Col(dcc.Graph(figure=ov_countries_affected_indicator(filtered_df,in_str='Cities'), style={'height': ind_height}),width=4),
+            dbc.Col(dcc.Graph(figure=ov_countries_affected_indicator(filtered_df,in_str='Countries',kpis=kpis), style={'height': ind_height}),width=4),
+            dbc.Col(dcc.Graph(figure=ov_countries_affected_indicator(filtered_df,in_str='Regions',kpis=kpis), style={'height': ind_height}),width=4),
+            dbc.Col(dcc.Graph(figure=ov_countries_affected_indicator(filtered_df,in_str='Cities',kpis=kpis), style={'height': ind_height}),width=4),
         ], style={'margin-top': row_marg}),
 
         dbc.Row([ 
-            dbc.Col(dcc.Graph(figure=geo_bar_plots(filtered_df,template,in_str='Countries'), style={'height': bar_height}),width=4),
-            dbc.Col(dcc.Graph(figure=geo_bar_plots(filtered_df,template,in_str='Regions'), style={'height': bar_height}),width=4),
-            dbc.Col(dcc.Graph(figure=geo_bar_plots(filtered_df,template,in_str='Cities'), style={'height': bar_height}),width=4),
+            dbc.Col(dcc.Graph(figure=geo_bar_plots(filtered_df,template,in_str='Countries',geo=geo), style={'height': bar_height}),width=4),
+            dbc.Col(dcc.Graph(figure=geo_bar_plots(filtered_df,template,in_str='Regions',geo=geo), style={'height': bar_height}),width=4),
+            dbc.Col(dcc.Graph(figure=geo_bar_plots(filtered_df,template,in_str='Cities',geo=geo), style={'height': bar_height}),width=4),
         ], style={'margin-top': row_marg}),
 
         dbc.Row([ 
-            dbc.Col(dcc.Graph(figure=geo_region_spread(filtered_df,template), style={'height': '150px'}),width=12),
+            dbc.Col(dcc.Graph(figure=geo_region_spread(filtered_df,template,geo), style={'height': '150px'}),width=12),
         ], style={'margin-top': row_marg}),
 
         dbc.Row([ 
-            dbc.Col(dcc.Graph(figure=geo_attacks_map(filtered_df,template), style={'height': map_height}),width=7),
-            dbc.Col(dcc.Graph(figure=geo_Treemap(filtered_df,template), style={'height': map_height}),width=5),
+            dbc.Col(geo_attacks_map_stream(geo_year_subregion(filtered_df, rollups, geo), map_height) if stream_geo_map
+                    else lazy_graph('geo_attacks_map', {'height': map_height}, filtered_df, rollups, geo=geo),width=7),
+            dbc.Col(lazy_graph('geo_Treemap', {'height': map_height}, filtered_df, rollups, geo=geo),width=5),
         ], style={'margin-top': row_marg}),
 
 
@@ -687,18 +762,126 @@ def BuildGetGeoLayout(filtered_df,template):
     ]
 
 
+################################################################################# Build Compare page
+#several groups side by side. Every figure is drawn from one grouping of the selected groups' events
+#together (compare_facts.py), a group more adds rows to it rather than another round of page builders
+cmp_colors = [t_green, t_light_green] + qualitative.Pastel
+#(row title, KPI, format) of the KPI table
+cmp_kpi_rows = [('Years Active', 'years_active', '{:,.0f}'), ('Attacks', 'attacks', '{:,.0f}'),
+                ('Attacks per Year', 'attacks_per_year', '{:,.1f}'), ('Killed', 'killed', '{:,.0f}'),
+                ('Wounded', 'wounded', '{:,.0f}'), ('Killed per Attack', 'killed_per_attack', '{:,.1f}'),
+                ('Wounded per Attack', 'wounded_per_attack', '{:,.1f}'), ('Countries', 'Countries', '{:,.0f}'),
+                ('Regions', 'Regions', '{:,.0f}'), ('Cities', 'Cities', '{:,.0f}'),
+                ('Attack Success Rate', 'success_rate', '{:.1f}%'), ('Suicide Attacks', 'suicide_rate', '{:.1f}%'),
+                ('Claimed', 'claimed_rate', '{:.1f}%')]
+
+@figure_timer
+def cmp_kpi_table(kpis, template):
+    cells = [[title for title, _, _ in cmp_kpi_rows]]
+    for group in kpis.index:
+        cells.append(['-' if pd.isna(kpis.at[group, kpi]) else fmt.format(kpis.at[group, kpi]) for _, kpi, fmt in cmp_kpi_rows])
+    fig = go.Figure(go.Table(
+        header=dict(values=[''] + list(kpis.index), fill_color=t_bluegray, font=dict(color='white', size=13), align='left'),
+        cells=dict(values=cells, fill_color='rgba(0,0,0,0)', font=dict(color=['white'] + [t_green] * len(kpis)), align='left')
+    ))
+    fig.update_layout(template=template, margin={"r": 5, "t": 5, "l": 5, "b": 5})
+    return fig
+
+@figure_timer
+def cmp_per_year(year_counts, template, measure, title):
+    fig = px.line(year_counts, x='Year', y=measure, color='Group', title=title,
+                  color_discrete_sequence=cmp_colors, template=template)
+    fig.update_layout(legend=dict(orientation='h', y=-0.25, title=None), yaxis_title=None,
+                      margin={"r": 5, "t": 40, "l": 5, "b": 5})
+    return fig
+
+@figure_timer
+def cmp_top_bar(top, template, col, title):
+    #share of each group's attacks, groups of different sizes side by side
+    fig = px.bar(top, x='Share', y=col, color='Group', barmode='group', orientation='h', title=title,
+                 hover_data={'Attacks': True, 'Share': ':.1f'}, labels={'Share': '% of Attacks'},
+                 color_discrete_sequence=cmp_colors, template=template)
+    fig.update_layout(showlegend=False, yaxis=dict(title=''), margin={"r": 5, "t": 40, "l": 5, "b": 5})
+    return fig
+
+def BuildGetCompareLayout(groups_df, groups, template):
+    row_marg = '25px'
+    year_counts = compare_facts.YearCounts(groups_df, groups)
+    return [
+        dbc.Row([
+            dbc.Col(dcc.Graph(figure=cmp_kpi_table(compare_facts.GroupedKPIs(groups_df, groups), template), style={'height': '400px'}), width=12),
+        ], style={'margin-top': row_marg}),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(figure=cmp_per_year(year_counts, template, 'Attacks', 'Attacks per Year'), style={'height': '300px'}), width=6),
+            dbc.Col(dcc.Graph(figure=cmp_per_year(year_counts, template, 'Casualties', 'Casualties per Year'), style={'height': '300px'}), width=6),
+        ], style={'margin-top': row_marg}),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(figure=cmp_top_bar(compare_facts.TopTypes(groups_df, groups, 'AttackType'), template, 'AttackType', 'Top 5 Attack Types'), style={'height': '350px'}), width=4),
+            dbc.Col(dcc.Graph(figure=cmp_top_bar(compare_facts.TopTypes(groups_df, groups, 'TargetType'), template, 'TargetType', 'Top 5 Target Types'), style={'height': '350px'}), width=4),
+            dbc.Col(dcc.Graph(figure=cmp_top_bar(compare_facts.TopPlaces(groups_df, groups, 'Country'), template, 'Country', 'Top 5 Countries'), style={'height': '350px'}), width=4),
+        ], style={'margin-top': row_marg}),
+
+        dbc.Row([
+            dbc.Col(html.A("Data Sourced from the GTD Dataset (START, University of Maryland)", href="https://www.start.umd.edu/gtd/"), width=12),
+        ], style={'margin-top': row_marg}),
+    ]
+
+
+################################################################################# Lazy rendered graphs
+#draw the page with its visible graphs first, below the fold graphs and the
+#inactive area chart tab come in their own callbacks (render_lazy_graph,
+#update_area_tab) after the page is up; off, every graph is in the page callback
+lazy_render = True
+#send the Geo page map one year at a time as its slider moves (update_geo_map_year)
+#instead of one animated figure holding every year
+stream_geo_map = True
+
+#name -> figure of the page's (filtered_df, rollups, type facts, geo facts)
+lazy_figures = {
+    'at_area_Attack': lambda df, rollups, facts, geo: at_area_chart(df, template, 'Attack', facts),
+    'at_area_Target': lambda df, rollups, facts, geo: at_area_chart(df, template, 'Target', facts),
+    'at_TreeMap': lambda df, rollups, facts, geo: at_TreeMap(df, template, rollups, facts),
+    'geo_attacks_map': lambda df, rollups, facts, geo: geo_attacks_map(df, template, rollups, geo),
+    'geo_Treemap': lambda df, rollups, facts, geo: geo_Treemap(df, template, rollups, geo),
+}
+#built lazy figures, a group's are drawn once
+figure_cache = LayoutCache(maxsize=512)
+
+def lazy_figure_names():
+    #the lazy figures the pages use, the map is streamed instead with stream_geo_map
+    return [name for name in lazy_figures if not (stream_geo_map and name == 'geo_attacks_map')]
+
+def lazy_graph(name, style, filtered_df, rollups=None, facts=None, geo=None):
+    if lazy_render:
+        return dcc.Graph(id={'type': 'lazy-graph', 'name': name}, style=style)
+    return dcc.Graph(figure=lazy_figures[name](filtered_df, rollups, facts, geo), style=style)
+
+def lazy_figure(name, selected_group, years=None):
+    return figure_cache.Get((name, selected_group, years, data_store.dataset_version),
+                            lambda: stored_entry(name, selected_group, years, BuildLazyFigure))
+
+def BuildLazyFigure(name, selected_group, years=None):
+    return slim_figure(lazy_figures[name](data_store.GetGroupFrame(selected_group, years),
+                                          data_store.GetGroupRollups(selected_group, years),
+                                          data_store.GetGroupTypeFacts(selected_group, years),
+                                          data_store.GetGroupGeoFacts(selected_group, years)))
+
+
 ##################################################################################### Build the Navbar
 navbar = dbc.NavbarSimple(
     children=[
         dcc.Dropdown(
             id='group-dropdown',
-            options=[{'label': group, 'value': group} for group in raw_df.index.unique()],
-            value=raw_df.index.unique()[0],
+            options=[{'label': group, 'value': group} for group in group_names],
+            value=group_names[0],
             style={'width': '400px'}
         ),
         dbc.NavItem(dbc.NavLink("Group Overview", href="/overview", active=True, id='overview-link')),
         dbc.NavItem(dbc.NavLink("Attack Profile", href="/attackmethod", active=False, id='attackmethod-link')),
         dbc.NavItem(dbc.NavLink("Geographical", href="/geo", active=False, id='geo-link')),
+        dbc.NavItem(dbc.NavLink("Compare Groups", href="/compare", active=False, id='compare-link')),
     ],
     brand="Global Terrorism Perpetrators",
     brand_href="/overview",
@@ -707,42 +890,267 @@ navbar = dbc.NavbarSimple(
     style={'borderBottom': '1px solid white'}
 )
 
+################################################################################## Year range
+#every page shows the events of the years picked on the slider under the navbar, the figures are built from
+#just those rows (data_store.GetGroupFrame slices them out of the group's block by binary search)
+def year_marks(first, last):
+    #the ends and the decades between them, unless too close to an end to read
+    marks = {year: str(year) for year in range(first - first % 10 + 10, last, 10) if year - first > 3 and last - year > 3}
+    marks.update({first: str(first), last: str(last)})
+    return marks
+
+def selected_years(selected_group, year_range):
+    #the slider's [first, last] as data_store's year_range tuple, None when it covers every year of the group
+    first, last = data_store.GetGroupYears(selected_group)
+    if not year_range or (year_range[0] <= first and year_range[1] >= last):
+        return None
+    return (int(year_range[0]), int(year_range[1]))
+
+first_year, last_year = data_store.GetGroupYears(group_names[0])
+year_range_bar = html.Div(
+    dcc.RangeSlider(id='year-range', min=first_year, max=last_year, step=1, value=[first_year, last_year],
+                    marks=year_marks(first_year, last_year), allowCross=False,
+                    tooltip={'placement': 'bottom', 'always_visible': False}),
+    style={'padding': '15px 20px 0 20px'}
+)
+
+########################################################################### Built layouts, see layout_cache.py
+page_builders = {'/overview': BuildGetOverviewLayout,
+                 '/attackmethod': BuildGetAttackLayout,
+                 '/geo': BuildGetGeoLayout}
+#3 pages per group, big enough to hold every page of the default 15 groups many times over
+layout_cache = LayoutCache(maxsize=256)
+#build every page of every group at startup instead of on first visit
+prewarm_layouts = False
+
+#layouts and lazy figures rendered ahead by ETLCode/build_figure_store.py, see figure_store.py
+figure_store = FigureStore('figure_store', data_store.dataset_version)
+
+#send figures with the name of their template instead of the template, the browser has it once
+#from /figure-templates.js (see slim_responses.py)
+slim_figures = True
+#gzip/brotli the JSON responses for clients that accept it
+compress_responses = True
+
+def slim_figure(fig):
+    return SlimFigure(fig, template) if slim_figures else fig
+
+def render_settings():
+    #settings that change what the pages are made of, the figure store is only used if built with the same
+    return {'lazy_render': lazy_render, 'stream_geo_map': stream_geo_map, 'slim_figures': slim_figures}
+
+def stored_entry(entry, selected_group, years, build):
+    #pre-serialized JSON of a page or lazy figure from the store, build(entry, selected_group, years) when it's
+    #not there. The store has every group's whole history, a year range is always built
+    use_store = years is None and figure_store.settings == render_settings()
+    stored = figure_store.Get(entry, selected_group) if use_store else None
+    return stored if stored is not None else build(entry, selected_group, years)
+
 ######################################################################################## Page layout
 app.layout = dbc.Container(
     [
         dcc.Location(id='url', refresh=False, pathname='/overview'),
         navbar,
+        year_range_bar,
         html.Div(id='page-content')
     ],
     fluid=True,className="dbc"
 )
 
-########################################### Callback to update page content based on URL and dropdown value
+########################################### Callback to update page content based on URL, dropdown value and year range
 @app.callback(Output('page-content', 'children'),
               [Input('url', 'pathname'),
-               Input('group-dropdown', 'value')])
-def update_page_content(pathname, selected_group):
-    filtered_df = raw_df[raw_df.index == selected_group]
-    if pathname == '/overview':
-        return BuildGetOverviewLayout(filtered_df,template)
-
-    elif pathname == '/attackmethod':
-        return BuildGetAttackLayout(filtered_df,template)
-
-    elif pathname == '/geo':
-        return BuildGetGeoLayout(filtered_df,template)
+               Input('group-dropdown', 'value'),
+               Input('year-range', 'value')])
+def update_page_content(pathname, selected_group, year_range=None):
+    if pathname == '/compare':
+        return compare_page
+    if pathname not in page_builders:
+        return None
+    years = selected_years(selected_group, year_range)
+    return layout_cache.Get((pathname, selected_group, years, data_store.dataset_version),
+                            lambda: stored_entry(pathname, selected_group, years, BuildPageLayout))
+
+def BuildPageLayout(pathname, selected_group, years=None):
+    with metrics.page_build_seconds.labels(page=pathname).time():
+        filtered_df = data_store.GetGroupFrame(selected_group, years)
+        rollups = data_store.GetGroupRollups(selected_group, years)
+        kpis = data_store.GetGroupKPIs(selected_group, years)
+        if pathname == '/geo':
+            layout = BuildGetGeoLayout(filtered_df,template,rollups,kpis,data_store.GetGroupGeoFacts(selected_group, years))
+        else:
+            layout = page_builders[pathname](filtered_df,template,rollups,data_store.GetGroupTypeFacts(selected_group, years),kpis)
+        return SlimLayout(layout, template) if slim_figures else layout
+
+######################################################################## Compare page
+#the groups to compare are picked on the page, its figures come in update_compare_content. The dropdown
+#keeps its selection when the page is drawn again (persistence), e.g. as the year range moves
+compare_page = [
+    dbc.Row([
+        dbc.Col(dcc.Dropdown(id='compare-groups', options=[{'label': group, 'value': group} for group in group_names],
+                             value=group_names[:3], multi=True, persistence=True, persistence_type='memory'), width=12),
+    ], style={'margin-top': '25px'}),
+    html.Div(id='compare-content'),
+]
+
+@app.callback(Output('compare-content', 'children'),
+              Input('compare-groups', 'value'),
+              Input('year-range', 'value'),
+              State('group-dropdown', 'value'))
+def update_compare_content(groups, year_range, selected_group):
+    #the slider's ends are the navbar group's years, when it covers all of them every compared group shows all of its own
+    if not groups:
+        return html.P("Pick groups to compare.", style={'margin-top': '25px'})
+    groups = tuple(groups)
+    years = selected_years(selected_group, year_range)
+    return layout_cache.Get(('/compare', groups, years, data_store.dataset_version),
+                            lambda: BuildCompareLayout(groups, years))
+
+def BuildCompareLayout(groups, years=None):
+    with metrics.page_build_seconds.labels(page='/compare').time():
+        layout = BuildGetCompareLayout(data_store.GetGroupsFrame(groups, years), groups, template)
+        return SlimLayout(layout, template) if slim_figures else layout
+
+def PrewarmLayouts():
+    '''
+    Build every group x page layout into the cache.
+    '''
+    for selected_group in group_names:
+        for pathname in page_builders:
+            update_page_content(pathname, selected_group)
+        if lazy_render:
+            for name in lazy_figure_names():
+                lazy_figure(name, selected_group)
+    logger.info("Prewarmed %s layouts, %s lazy figures", layout_cache.Stats()['size'], figure_cache.Stats()['size'])
+
+#layout and lazy figure cache hit/miss counters
+@app.server.route('/layout-cache-stats')
+def layout_cache_stats():
+    return flask.jsonify({'layouts': layout_cache.Stats(), 'lazy_figures': figure_cache.Stats(),
+                          'figure_store': figure_store.Stats()})
+
+############################################ Request metrics served on /metrics (Prometheus text format)
+def cache_lookups():
+    #hit/miss counts kept by the caches themselves, added to the lookup counters after every request
+    lookups = [(cache, stats['hits'], stats['misses']) for cache, stats in
+               [('layouts', layout_cache.Stats()), ('lazy_figures', figure_cache.Stats()), ('figure_store', figure_store.Stats())]]
+    lookups += [(cache, info.hits, info.misses) for cache, info in
+                [('group_type_facts', data_store.GetGroupTypeFacts.cache_info()),
+                 ('group_geo_facts', data_store.GetGroupGeoFacts.cache_info()),
+                 ('group_kpis', data_store.GetGroupKPIs.cache_info())]]
+    return lookups
+cache_counters = metrics.CacheCounters(cache_lookups)
+
+#callbacks are timed around Dash's handler, so the JSON serialization is in there too
+@app.server.before_request
+def start_callback_timer():
+    if flask.request.path.endswith('/_dash-update-component'):
+        flask.g.callback_start = time.perf_counter()
+
+@app.server.after_request
+def observe_callback(response):
+    if 'callback_start' in flask.g:
+        output = (flask.request.get_json(silent=True) or {}).get('output')
+        callback = app.callback_map.get(output, {}).get('callback')
+        name = callback.__name__ if callback is not None else 'unknown'
+        metrics.callback_seconds.labels(callback=name).observe(time.perf_counter() - flask.g.callback_start)
+        metrics.callback_response_bytes.labels(callback=name).observe(len(response.get_data()))
+    cache_counters.Sync()
+    return response
+
+@app.server.route('/metrics')
+def prometheus_metrics():
+    body, content_type = metrics.Render()
+    return flask.Response(body, content_type=content_type)
+
+############################################ Slim, compressed responses, see slim_responses.py
+#the templates the slimmed figures name, put back in by assets/figure_templates.js
+@app.server.route(app.config.routes_pathname_prefix + templates_script_name)
+def figure_templates_script():
+    return flask.Response(TemplatesScript([template]), mimetype='text/javascript')
+
+#the JSON Dash answers with, static files are left alone
+compressed_paths = ('/_dash-update-component', '/_dash-layout', '/_dash-dependencies', '/' + templates_script_name)
+
+#registered after observe_callback so it runs before it: Flask calls after_request hooks last to first,
+#the response size metric sees the bytes sent
+@app.server.after_request
+def compress_response(response):
+    if compress_responses and flask.request.path.endswith(compressed_paths):
+        return CompressResponse(response, flask.request.headers.get('Accept-Encoding'))
+    return response
+
+############################################ Callbacks drawing the lazy graphs (lazy_render)
+#fires when a placeholder graph is put on the page
+@app.callback(Output({'type': 'lazy-graph', 'name': MATCH}, 'figure'),
+              Input({'type': 'lazy-graph', 'name': MATCH}, 'id'),
+              State('group-dropdown', 'value'),
+              State('year-range', 'value'))
+def render_lazy_graph(graph_id, selected_group, year_range=None):
+    return lazy_figure(graph_id['name'], selected_group, selected_years(selected_group, year_range))
+
+@functools.lru_cache(maxsize=64)
+def geo_map_table(selected_group, years=None):
+    return geo_year_subregion(data_store.GetGroupFrame(selected_group, years), data_store.GetGroupRollups(selected_group, years),
+                              data_store.GetGroupGeoFacts(selected_group, years))
+
+#first call draws the whole figure, moving the slider only sends the points and title of the new year
+@app.callback(Output('geo-map-graph', 'figure'),
+              Input('geo-map-year', 'value'),
+              State('group-dropdown', 'value'),
+              State('year-range', 'value'))
+def update_geo_map_year(year, selected_group, year_range=None):
+    years = selected_years(selected_group, year_range)
+    fig = figure_cache.Get(('geo_map_year', selected_group, years, year, data_store.dataset_version),
+                           lambda: geo_attacks_map_year(geo_map_table(selected_group, years), template, year))
+    if dash.ctx.triggered_id is None:
+        return slim_figure(fig)
+    patch = dash.Patch()
+    patch['data'] = fig.to_plotly_json()['data']
+    patch['layout']['title']['text'] = fig.layout.title.text
+    return patch
+
+@app.callback(Output('at-area-graph', 'figure'),
+              Input('at-area-tabs', 'active_tab'),
+              State('group-dropdown', 'value'),
+              State('year-range', 'value'))
+def update_area_tab(active_tab, selected_group, year_range=None):
+    return lazy_figure('at_area_' + active_tab, selected_group, selected_years(selected_group, year_range))
+
+#a new group's slider covers all of its years
+@app.callback([Output('year-range', 'min'),
+               Output('year-range', 'max'),
+               Output('year-range', 'value'),
+               Output('year-range', 'marks')],
+              Input('group-dropdown', 'value'))
+def update_year_range(selected_group):
+    first, last = data_store.GetGroupYears(selected_group)
+    return first, last, [first, last], year_marks(first, last)
 
 ############################################ Callback to update active state of NavLinks and highlight them
 @app.callback(
     [Output('overview-link', 'active'),
      Output('attackmethod-link', 'active'),
-     Output('geo-link', 'active')],
+     Output('geo-link', 'active'),
+     Output('compare-link', 'active')],
     [Input('url', 'pathname')]
 )
 def update_active_links(pathname):
-    return pathname == '/overview', pathname == '/attackmethod', pathname == '/geo'
-
+    return pathname == '/overview', pathname == '/attackmethod', pathname == '/geo', pathname == '/compare'
+
+############################################ Startup time
+#imports (data_store's file reads left out), data_store's load and the rest of this module: the figure
+#template, layout and callbacks. Prewarming (wsgi.py, __main__) comes after
+startup_seconds = {'imports': imports_seconds, 'data': data_store.load_seconds,
+                   'app': time.perf_counter() - startup_start - imports_seconds - data_store.load_seconds}
+logger.info("Dashboard loaded in %.2f s: imports %.2f s, data %.2f s, app %.2f s", sum(startup_seconds.values()),
+            startup_seconds['imports'], startup_seconds['data'], startup_seconds['app'])
+for phase, seconds in startup_seconds.items():
+    metrics.startup_seconds.labels(phase=phase).set(seconds)
 
 if __name__ == '__main__':
+    if prewarm_layouts:
+        PrewarmLayouts()
+    #development server, a single process. Production runs wsgi.py under gunicorn (gunicorn.conf.py)
     #port must match Dockerfile
-    app.run_server(debug=False, host='0.0.0.0', port=8050)
\ No newline at end of file
+    app.run(debug=False, host='0.0.0.0', port=8050)
\ No newline at end of file
@@ -0,0 +1,47 @@
+/*
+Figures come from the server with layout.template set to the name of their
+template instead of the template (slim_figures in app.py, slim_responses.py).
+The templates are loaded once from /figure-templates.js into
+window.dashboardFigureTemplates; this puts them back into every figure
+before plotly draws it.
+*/
+(function () {
+    function withTemplate(layout) {
+        var templates = window.dashboardFigureTemplates || {};
+        if (!layout || typeof layout.template !== 'string' || !templates[layout.template]) {
+            return layout;
+        }
+        return Object.assign({}, layout, {template: templates[layout.template]});
+    }
+
+    function wrapPlotly(Plotly) {
+        if (!Plotly || Plotly._dashboardFigureTemplates) {
+            return Plotly;
+        }
+        ['newPlot', 'react'].forEach(function (name) {
+            var draw = Plotly[name];
+            Plotly[name] = function (gd, data, layout, config) {
+                //called as (gd, {data, layout, frames, config}), like dcc.Graph does, or (gd, data, layout, config)
+                if (data && !Array.isArray(data) && typeof data === 'object') {
+                    return draw.call(this, gd, Object.assign({}, data, {layout: withTemplate(data.layout)}));
+                }
+                return draw.call(this, gd, data, withTemplate(layout), config);
+            };
+        });
+        Plotly._dashboardFigureTemplates = true;
+        return Plotly;
+    }
+
+    if (window.Plotly) {
+        wrapPlotly(window.Plotly);
+        return;
+    }
+    //plotly.js loads asynchronously, wrap it when it sets window.Plotly
+    var plotly;
+    Object.defineProperty(window, 'Plotly', {
+        configurable: true,
+        enumerable: true,
+        get: function () { return plotly; },
+        set: function (value) { plotly = wrapPlotly(value); }
+    });
+})();
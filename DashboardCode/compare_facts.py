@@ -0,0 +1,136 @@
+"""
+Aggregates of the Compare page, for several groups at once. The selected
+groups' events come as one frame (data_store.GetGroupsFrame) and each
+aggregate is one pass grouping all of them by group, instead of running the
+single group builders (ComputeKPIs, TypeFacts, the figures' own groupbys)
+once per group. Adding a group adds its rows to the same passes, not
+another round of them.
+
+Groups are numbered by their position in the selection (GroupIDs), the
+results are keyed by group name in that order. KPIs come out like
+ComputeKPIs gives them for each group alone.
+"""
+import numpy as np
+import pandas as pd
+from kpi import PLACE_COLUMNS
+from type_facts import BuildTypeFactTable, DimensionRows, TYPE_COLUMNS
+
+def GroupIDs(df, groups):
+    '''
+    Position in groups of each event's group (df is indexed by Group).
+    '''
+    return pd.Categorical(np.asarray(df.index, dtype=object), categories=list(groups)).codes
+
+def KnownCodes(series):
+    '''
+    Integer code of each value and a mask of the values that aren't missing
+    or 'Unknown'.
+    '''
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        unknown = series.cat.categories.get_indexer(['Unknown'])[0]
+    else:
+        codes, uniques = pd.factorize(series)
+        unknown = uniques.get_indexer(['Unknown'])[0] if len(uniques) else -1
+    return codes, (codes >= 0) & (codes != unknown)
+
+def GroupSums(group_ids, n_groups, values):
+    '''
+    (sum, count) per group of the non NaN values of a float array.
+    '''
+    known = ~np.isnan(values)
+    return (np.bincount(group_ids[known], weights=values[known], minlength=n_groups),
+            np.bincount(group_ids[known], minlength=n_groups))
+
+def GroupedKPIs(df, groups):
+    '''
+    ComputeKPIs' numbers as a frame, one row per group of groups in that
+    order, from one pass over each column of their events (bincounts keyed by
+    group). A group without events gets 0 attacks and NaN rates.
+    '''
+    n_groups = len(groups)
+    group_ids = GroupIDs(df, groups).astype('int64')
+    attacks = np.bincount(group_ids, minlength=n_groups)
+    #distinct (group, year) pairs, sorted: each group's years are a run of them (years are below 10000)
+    group_years = np.unique(group_ids * 10000 + df['Year'].to_numpy().astype('int64'))
+    year_groups, years = np.divmod(group_years, 10000)
+    n_years = np.bincount(year_groups, minlength=n_groups)
+    first = np.searchsorted(year_groups, np.arange(n_groups), side='left')
+    last = np.searchsorted(year_groups, np.arange(n_groups), side='right') - 1
+    killed, killed_count = GroupSums(group_ids, n_groups, df['NVictimsKilled'].to_numpy(dtype='float64'))
+    wounded, wounded_count = GroupSums(group_ids, n_groups, df['NVictimsWounded'].to_numpy(dtype='float64'))
+    claims = df['GroupClaimed'].to_numpy(dtype='float64')
+    claimed, claimed_count = GroupSums(group_ids, n_groups, np.where(claims >= 0, claims, np.nan)) #-9 is unknown, NaN not recorded
+    span = np.zeros(n_groups, dtype='int64')
+    active = attacks > 0
+    span[active] = years[last[active]] - years[first[active]]
+
+    kpis = pd.DataFrame(index=pd.Index(list(groups), name='Group'))
+    kpis['attacks'] = attacks
+    kpis['years_active'] = np.maximum(span, 1)
+    kpis['killed'] = killed
+    kpis['wounded'] = wounded
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kpis['success_rate'] = np.bincount(group_ids, weights=df['AttackSuccess'].to_numpy().astype('int64'), minlength=n_groups) / attacks * 100
+        kpis['suicide_rate'] = np.bincount(group_ids, weights=df['SuicideAttack'].to_numpy().astype('int64'), minlength=n_groups) / attacks * 100
+        kpis['attacks_per_year'] = np.round(attacks / n_years, 1)
+        kpis['claimed_rate'] = np.round(claimed / claimed_count * 100, 1)
+        kpis['killed_per_attack'] = np.round(killed / killed_count, 1)
+        kpis['wounded_per_attack'] = np.round(wounded / wounded_count, 1)
+
+    for name, col in PLACE_COLUMNS.items():
+        codes, known = KnownCodes(df[col])
+        n_codes = int(codes.max(initial=0)) + 1
+        #distinct (group, place) pairs
+        places = np.unique(group_ids[known] * n_codes + codes[known])
+        kpis[name] = np.bincount(places // n_codes, minlength=n_groups)
+    return kpis
+
+def YearCounts(df, groups):
+    '''
+    Group, Year, Attacks and the casualty sums of every group and year with
+    events, one grouping.
+    '''
+    events = pd.DataFrame({
+        'GroupID': GroupIDs(df, groups),
+        'Year': df['Year'].to_numpy(),
+        'NVictimsKilled': df['NVictimsKilled'].to_numpy(dtype='float64'),
+        'NVictimsWounded': df['NVictimsWounded'].to_numpy(dtype='float64'),
+        'Casualties': df['Casualties'].to_numpy(dtype='float64'),
+    })
+    counts = events.groupby(['GroupID', 'Year']).agg(
+        Attacks=('Year', 'size'), NVictimsKilled=('NVictimsKilled', 'sum'),
+        NVictimsWounded=('NVictimsWounded', 'sum'), Casualties=('Casualties', 'sum')).reset_index()
+    counts.insert(0, 'Group', pd.Categorical.from_codes(counts.pop('GroupID'), categories=list(groups)))
+    return counts
+
+def TopPerGroup(group_ids, values, groups, col, n, exclude):
+    '''
+    Each group's n most frequent values (ties in value order): Group, col,
+    Attacks and the group's Share of its counted attacks in percent.
+    '''
+    rows = pd.DataFrame({'GroupID': group_ids, col: values})
+    rows = rows[rows[col].notna() & ~rows[col].isin(exclude)]
+    counts = rows.groupby(['GroupID', col], observed=True).size().rename('Attacks').reset_index()
+    counts['Share'] = counts['Attacks'] / counts.groupby('GroupID')['Attacks'].transform('sum') * 100
+    counts = counts.sort_values(by=['GroupID', 'Attacks'], ascending=[True, False], kind='stable')
+    top = counts.groupby('GroupID').head(n).reset_index(drop=True)
+    top.insert(0, 'Group', pd.Categorical.from_codes(top.pop('GroupID'), categories=list(groups)))
+    return top
+
+def TopTypes(df, groups, dimension, n=5, exclude=('Unknown', 'Other')):
+    '''
+    Each group's top n values of a type dimension ('AttackType',
+    'TargetType', 'WeaponType'), counted over the filled type slots of every
+    group's events melted together.
+    '''
+    events = df[['Year'] + TYPE_COLUMNS[dimension]].reset_index(drop=True)
+    events.insert(0, 'GroupID', GroupIDs(df, groups))
+    rows = DimensionRows(*BuildTypeFactTable(events, id_columns=['GroupID', 'Year'], dimensions=[dimension]), dimension)
+    return TopPerGroup(rows['GroupID'].to_numpy(), rows['Value'], groups, dimension, n, exclude)
+
+def TopPlaces(df, groups, col='Country', n=5, exclude=('Unknown',)):
+    '''
+    Each group's top n places of col (Country, SubRegion, City) by attacks.
+    '''
+    return TopPerGroup(GroupIDs(df, groups), df[col].reset_index(drop=True), groups, col, n, exclude)
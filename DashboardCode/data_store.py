@@ -0,0 +1,359 @@
+"""
+Where the dashboard gets its data. The ETL writes an uncompressed Arrow IPC
+file that is memory mapped here: startup only reads its footer, nothing is
+decoded, and every process serving the dashboard shares the same page cache
+pages. The ETL sorts by Group, so every group is one run of rows: their
+offsets are worked out once at load and a request slices its group out of
+the mapped columns without copying or scanning them. Within a group the rows
+are sorted by Year, so a year range is found by binary search in the
+group's block and sliced out too.
+Without it we read the dataset partitioned by Group (one folder per group, row
+groups sorted by date with statistics), so a request only reads the group, and
+the years, it shows. If only the flat parquet file is around we fall back to
+loading all of it like before.
+
+Only the event columns the pages read (EVENT_COLUMNS) are loaded, from
+whichever of these it is.
+
+Tables come into pandas with Arrow-backed dtypes: dictionary columns as
+categoricals (codes + categories, no per row strings) and text columns as
+string[pyarrow], which keeps the Arrow buffers instead of building a python
+str per cell on every request.
+"""
+import os
+import functools
+import hashlib
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from type_facts import TypeFacts
+from geo_facts import GeoFacts
+from kpi import ComputeKPIs
+
+#False converts text columns to python objects, like a plain pd.read_parquet
+arrow_strings = True
+ARROW_STRING_TYPES = {pa.string(): pd.StringDtype('pyarrow'), pa.large_string(): pd.StringDtype('pyarrow')}
+
+def ToPandas(table):
+    if arrow_strings:
+        return table.to_pandas(types_mapper=ARROW_STRING_TYPES.get)
+    return table.to_pandas()
+
+#the event columns the dashboard reads, only these are loaded. The ETL writes more (details, ransom,
+#perpetrators...) that no page shows; DASHBOARD_ALL_COLUMNS=1 loads them all
+EVENT_COLUMNS = ['Group', 'GroupClaimed', 'EventID', 'Year', 'Country', 'SubRegion', 'City', 'Latitude', 'Longitude',
+                 'AttackType1', 'AttackType2', 'AttackType3', 'AttackSuccess', 'SuicideAttack',
+                 'WeaponType1', 'WeaponType2', 'WeaponType3', 'TargetType1', 'TargetType2', 'TargetType3',
+                 'NVictimsKilled', 'NVictimsWounded', 'Casualties']
+all_columns = os.environ.get('DASHBOARD_ALL_COLUMNS') == '1'
+
+def LoadedColumns(names):
+    '''
+    The columns of a file (names, in its order) to load, None for all of them.
+    '''
+    if all_columns:
+        return None
+    return [name for name in names if name in EVENT_COLUMNS]
+
+ipc_fpath = "gtd_clean_dataset.arrow"
+flat_fpath = "gtd_clean_dataset_pqt.parquet"
+by_group_dir = "gtd_clean_dataset_by_group"
+
+def GroupOffsets(group_codes, group_names):
+    '''
+    {group: (start, stop)} row range of every group, from the integer code of
+    each row's group (indexes group_names). The ETL sorts by Group so each
+    group is one contiguous run; None if the rows aren't laid out that way.
+    '''
+    n_rows = len(group_codes)
+    if n_rows == 0:
+        return {}
+    starts = np.flatnonzero(np.r_[True, group_codes[1:] != group_codes[:-1]])
+    stops = np.r_[starts[1:], n_rows]
+    run_codes = group_codes[starts]
+    if len(np.unique(run_codes)) != len(run_codes):
+        return None
+    return {group_names[code]: (int(start), int(stop)) for code, start, stop in zip(run_codes, starts, stops)}
+
+def YearsSortedInGroups(years, offsets):
+    '''
+    True if years only ever go down where a new group starts, i.e. every
+    group's block is sorted by Year (ETL output from before it sorted by Year
+    isn't).
+    '''
+    drops = np.flatnonzero(years[1:] < years[:-1]) + 1
+    return np.isin(drops, [start for start, _ in offsets.values()]).all()
+
+def YearRows(years, start, stop, year_range):
+    '''
+    (start, stop) rows of the inclusive year_range within a group's block
+    start:stop of the sorted years, two binary searches.
+    '''
+    block = years[start:stop]
+    return (start + int(np.searchsorted(block, year_range[0], side='left')),
+            start + int(np.searchsorted(block, year_range[1], side='right')))
+
+#time to open the events and read the rollups, reported on /metrics
+load_start = time.perf_counter()
+ipc_table = None
+group_dataset = None
+raw_df = None
+#{group: (start, stop)} into ipc_table or raw_df, built once so a request slices its rows instead of scanning for them
+group_offsets = None
+#Year of every row of ipc_table or raw_df when each group's rows are sorted by it, year ranges are searched in it
+event_years = None
+if os.path.exists(ipc_fpath):
+    ipc_table = pa.ipc.open_file(pa.memory_map(ipc_fpath, 'r')).read_all()
+    if not all_columns:
+        #dropping columns from the mapped table reads nothing, requests then convert only the rest
+        ipc_table = ipc_table.select(LoadedColumns(ipc_table.column_names))
+    group_codes = ipc_table['Group'].combine_chunks().dictionary_encode()
+    group_offsets = GroupOffsets(group_codes.indices.to_numpy(), group_codes.dictionary.to_pylist())
+    if group_offsets is not None:
+        event_years = ipc_table['Year'].to_numpy()
+elif os.path.isdir(by_group_dir):
+    group_dataset = ds.dataset(by_group_dir, format='parquet',
+                               partitioning=ds.HivePartitioning.discover(infer_dictionary=True))
+    dataset_columns = LoadedColumns(group_dataset.schema.names)
+else:
+    raw_df = ToPandas(pq.read_table(flat_fpath, columns=LoadedColumns(pq.read_schema(flat_fpath).names)))
+    raw_df.set_index('Group', inplace=True)
+    group_codes, group_uniques = pd.factorize(raw_df.index)
+    group_offsets = GroupOffsets(group_codes, list(group_uniques))
+    if group_offsets is not None:
+        event_years = raw_df['Year'].to_numpy()
+if event_years is not None and not YearsSortedInGroups(event_years, group_offsets):
+    event_years = None
+
+def GetGroupNames():
+    '''
+    Every group in the data, sorted like the ETL sorts them.
+    '''
+    if ipc_table is not None:
+        if group_offsets is not None:
+            return sorted(group_offsets)
+        return sorted(pc.unique(ipc_table['Group']).to_pylist())
+    if group_dataset is not None:
+        return sorted(group_dataset.partitioning.dictionaries[0].to_pylist())
+    return list(raw_df.index.unique())
+
+#the Arrow file stores Group as plain strings, it comes out as the categorical of every group the parquet files give
+ipc_group_dtype = pd.CategoricalDtype(GetGroupNames()) if ipc_table is not None else None
+
+@functools.lru_cache(maxsize=1)
+def EmptyEvents():
+    '''
+    No events, with the dtypes of the loaded ones (categories included).
+    '''
+    if ipc_table is not None:
+        return IPCGroupFrame(ipc_table.slice(0, 1)).iloc[:0]
+    return GetGroupFrame(GetGroupNames()[0]).iloc[:0]
+
+def IPCGroupFrame(table):
+    '''
+    Rows of ipc_table in pandas, indexed by Group like the parquet files load them.
+    '''
+    if table.num_rows == 0 and ipc_table.num_rows > 0:
+        #a table without rows loses its dictionaries on the way to pandas
+        return EmptyEvents().copy()
+    group_df = ToPandas(table)
+    group_df['Group'] = group_df['Group'].astype(ipc_group_dtype)
+    group_df.set_index('Group', inplace=True)
+    return group_df
+
+def GetGroupFrame(group,year_range=None):
+    '''
+    Events of one group, indexed by Group. year_range=(first, last) is inclusive.
+    The group's rows are a zero-copy slice of the loaded table/frame found in
+    group_offsets, the cost doesn't grow with the number of rows or groups.
+    The years are sliced out of that the same way, their rows found by binary
+    search in event_years, so the cost follows the rows in the window (a mask
+    over the group's rows when they aren't sorted by Year).
+    With the partitioned dataset only that group's files are opened and row
+    groups outside the years are skipped using their statistics.
+    '''
+    if ipc_table is not None:
+        if group_offsets is not None:
+            start, stop = group_offsets.get(group, (0, 0))
+            if year_range is not None and event_years is not None:
+                start, stop = YearRows(event_years, start, stop, year_range)
+            group_table = ipc_table.slice(start, stop - start)
+            if year_range is not None and event_years is None:
+                group_table = group_table.filter(pc.and_(pc.greater_equal(group_table['Year'], year_range[0]),
+                                                         pc.less_equal(group_table['Year'], year_range[1])))
+        else:
+            mask = pc.equal(ipc_table['Group'], group)
+            if year_range is not None:
+                mask = pc.and_(mask, pc.and_(pc.greater_equal(ipc_table['Year'], year_range[0]),
+                                             pc.less_equal(ipc_table['Year'], year_range[1])))
+            group_table = ipc_table.filter(mask)
+        return IPCGroupFrame(group_table)
+    if group_dataset is not None:
+        filt = ds.field('Group') == group
+        if year_range is not None:
+            filt = filt & (ds.field('Year') >= year_range[0]) & (ds.field('Year') <= year_range[1])
+        group_table = group_dataset.to_table(columns=dataset_columns, filter=filt)
+        if group_table.num_rows == 0 and group in GetGroupNames():
+            return EmptyEvents().copy()
+        group_df = ToPandas(group_table)
+        group_df.set_index('Group', inplace=True)
+        return group_df
+
+    if group_offsets is not None:
+        start, stop = group_offsets.get(group, (0, 0))
+        if year_range is not None and event_years is not None:
+            return raw_df.iloc[slice(*YearRows(event_years, start, stop, year_range))]
+        group_df = raw_df.iloc[start:stop]
+    else:
+        group_df = raw_df[raw_df.index == group]
+    if year_range is not None:
+        group_df = group_df[group_df['Year'].between(year_range[0], year_range[1])]
+    return group_df
+
+def GetGroupsFrame(groups, year_range=None):
+    '''
+    Events of several groups in one frame indexed by Group, each group's rows
+    (and years) sliced like GetGroupFrame, in the order of groups (in the
+    dataset's order from the partitioned dataset).
+    The slices are converted to pandas together, once, whatever the number of
+    groups; the partitioned dataset is read in one scan.
+    '''
+    groups = list(groups)
+    if ipc_table is not None and group_offsets is not None:
+        slices = []
+        for group in groups:
+            start, stop = group_offsets.get(group, (0, 0))
+            if year_range is not None and event_years is not None:
+                start, stop = YearRows(event_years, start, stop, year_range)
+            slices.append(ipc_table.slice(start, stop - start))
+        table = pa.concat_tables(slices) if slices else ipc_table.slice(0, 0)
+        if year_range is not None and event_years is None:
+            table = table.filter(pc.and_(pc.greater_equal(table['Year'], year_range[0]),
+                                         pc.less_equal(table['Year'], year_range[1])))
+        return IPCGroupFrame(table)
+    if group_dataset is not None:
+        filt = ds.field('Group').isin(groups)
+        if year_range is not None:
+            filt = filt & (ds.field('Year') >= year_range[0]) & (ds.field('Year') <= year_range[1])
+        groups_table = group_dataset.to_table(columns=dataset_columns, filter=filt)
+        if groups_table.num_rows == 0:
+            return EmptyEvents().copy()
+        groups_df = ToPandas(groups_table)
+        groups_df.set_index('Group', inplace=True)
+        return groups_df
+    if not groups:
+        return GetGroupFrame(None, year_range)
+    return pd.concat([GetGroupFrame(group, year_range) for group in groups])
+
+@functools.lru_cache(maxsize=256)
+def GetGroupYears(group):
+    '''
+    (first, last) year of the group's events, (0, 0) if it has none.
+    '''
+    if event_years is not None:
+        start, stop = group_offsets.get(group, (0, 0))
+        return (int(event_years[start]), int(event_years[stop - 1])) if stop > start else (0, 0)
+    years = GetGroupFrame(group)['Year']
+    return (int(years.min()), int(years.max())) if len(years) else (0, 0)
+
+#the facts below are per group and year range (None for all of its years), year_range a tuple
+
+@functools.lru_cache(maxsize=64)
+def GetGroupTypeFacts(group, year_range=None):
+    '''
+    The group's attack/target/weapon type fact table (type_facts.py), kept for
+    the pages of the most recently viewed groups. It is melted on first use.
+    '''
+    return TypeFacts(GetGroupFrame(group, year_range))
+
+@functools.lru_cache(maxsize=64)
+def GetGroupGeoFacts(group, year_range=None):
+    '''
+    The group's Geo page aggregates (geo_facts.py), grouped on first use and
+    kept for the most recently viewed groups.
+    '''
+    return GeoFacts(GetGroupFrame(group, year_range))
+
+@functools.lru_cache(maxsize=256)
+def GetGroupKPIs(group, year_range=None):
+    '''
+    The group's header numbers (kpi.py), computed once per group.
+    '''
+    return ComputeKPIs(GetGroupFrame(group, year_range))
+
+######################################################## Rollup tables written by the ETL (BuildRollups)
+rollups_dir = "gtd_rollups"
+
+#rollup name -> group -> that group's rows, split once here so lookups are a dict get
+group_rollups = {}
+#rollup name -> no rows, with its columns: groups can be missing from a rollup (the geo one drops SubRegions
+#without a location, the target x attack one Unknown/Other targets), they get this
+empty_rollups = {}
+if os.path.isdir(rollups_dir):
+    for fname in sorted(os.listdir(rollups_dir)):
+        if not fname.endswith('.parquet'):
+            continue
+        rollup_df = ToPandas(pq.read_table(os.path.join(rollups_dir, fname)))
+        #the ETL writes them sorted by Group: slice each group's run of rows out instead of grouping
+        rollup_codes, rollup_groups = pd.factorize(rollup_df['Group'])
+        rollup_offsets = GroupOffsets(rollup_codes, list(rollup_groups))
+        if rollup_offsets is not None and (rollup_codes >= 0).all():
+            rollup_rows = rollup_df.drop(columns=['Group'])
+            by_group = {group: rollup_rows.iloc[start:stop].reset_index(drop=True)
+                        for group, (start, stop) in rollup_offsets.items()}
+        else:
+            by_group = {group: grp_df.drop(columns=['Group']).reset_index(drop=True)
+                        for group, grp_df in rollup_df.groupby('Group', observed=True)}
+        group_rollups[fname[:-len('.parquet')]] = by_group
+        empty_rollups[fname[:-len('.parquet')]] = rollup_df.drop(columns=['Group']).iloc[:0]
+
+load_seconds = time.perf_counter() - load_start
+
+def GetGroupRollups(group, year_range=None):
+    '''
+    {rollup name: rows for this group}, or None when the ETL didn't write
+    rollups, in which case the figures aggregate the events themselves.
+    The rollups cover all of a group's years, None for a year_range too.
+    A rollup without rows for the group gives an empty frame of its columns.
+    '''
+    if not group_rollups or year_range is not None:
+        return None
+    return {name: by_group.get(group, empty_rollups[name]) for name, by_group in group_rollups.items()}
+
+######################################################## Dataset version
+def _FilesSignature(path):
+    '''
+    (relative path, size, mtime) of a file, or of every file under a folder.
+    '''
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [(path, stat.st_size, stat.st_mtime_ns)]
+    sig = []
+    for root, _, fnames in os.walk(path):
+        for fname in sorted(fnames):
+            stat = os.stat(os.path.join(root, fname))
+            sig.append((os.path.relpath(os.path.join(root, fname), path), stat.st_size, stat.st_mtime_ns))
+    return sorted(sig)
+
+def _DatasetVersion():
+    '''
+    Short hash of the size and modification time of the files loaded above,
+    it changes whenever the ETL writes them again.
+    '''
+    if ipc_table is not None:
+        sources = [ipc_fpath]
+    elif group_dataset is not None:
+        sources = [by_group_dir]
+    else:
+        sources = [flat_fpath]
+    if group_rollups:
+        sources.append(rollups_dir)
+    sig = [(src, _FilesSignature(src)) for src in sources]
+    return hashlib.sha1(repr(sig).encode()).hexdigest()[:12]
+
+#computed once: the loaded data doesn't change while the dashboard runs
+dataset_version = _DatasetVersion()
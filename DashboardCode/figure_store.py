@@ -0,0 +1,96 @@
+"""
+Page layouts and lazy figures rendered at build time (ETLCode/build_figure_store.py)
+and kept on disk as gzipped JSON, one file per group and page/figure. The app
+hands them to Dash as they are, a request for a stored entry only reads and
+decompresses a file: no pandas, no plotly figure building.
+
+The store records the dataset version and the app's render settings
+(lazy_render, stream_geo_map) it was built with. Built for other data it
+isn't read at all, and the app doesn't use it while its settings differ; the
+figures are then computed live, as they are for entries the store doesn't
+have.
+"""
+import os
+import json
+import gzip
+import shutil
+import hashlib
+
+MANIFEST_FNAME = 'manifest.json'
+
+def GroupFolder(group):
+    '''
+    Folder name of a group's entries, group names aren't all valid file names.
+    '''
+    return hashlib.sha1(group.encode('utf-8')).hexdigest()[:16]
+
+def EntryFname(entry):
+    '''
+    '/overview' -> 'overview.json.gz', 'at_TreeMap' -> 'at_TreeMap.json.gz'
+    '''
+    return entry.strip('/') + '.json.gz'
+
+def WriteFigureStore(out_dir, entries, dataset_version, settings):
+    '''
+    entries: iterable of (group, entry name, serialized JSON string). Written
+    next to out_dir and swapped in once complete.
+    '''
+    tmp_dir = out_dir + '.tmp'
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    groups = {}
+    n_entries, n_bytes = 0, 0
+    for group, entry, payload in entries:
+        folder = groups.setdefault(group, GroupFolder(group))
+        os.makedirs(os.path.join(tmp_dir, folder), exist_ok=True)
+        data = gzip.compress(payload.encode('utf-8'), compresslevel=9)
+        with open(os.path.join(tmp_dir, folder, EntryFname(entry)), 'wb') as f:
+            f.write(data)
+        n_entries += 1
+        n_bytes += len(data)
+    with open(os.path.join(tmp_dir, MANIFEST_FNAME), 'w') as f:
+        json.dump({'dataset_version': dataset_version, 'settings': settings, 'groups': groups}, f, indent=2)
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+    return n_entries, n_bytes
+
+class FigureStore:
+    '''
+    Read side, Get returns the stored JSON (parsed) or None.
+
+        store = FigureStore('figure_store', data_store.dataset_version)
+        layout = store.Get('/overview', group)
+    '''
+    def __init__(self, store_dir, dataset_version):
+        self.store_dir = store_dir
+        self.groups = {}
+        self.settings = None
+        self.hits = 0
+        self.misses = 0
+        manifest_fpath = os.path.join(store_dir, MANIFEST_FNAME)
+        if not os.path.exists(manifest_fpath):
+            return
+        with open(manifest_fpath) as f:
+            manifest = json.load(f)
+        if manifest['dataset_version'] != dataset_version:
+            print("Figure store {} was built for other data, figures are computed live".format(store_dir))
+            return
+        self.groups = manifest['groups']
+        self.settings = manifest['settings']
+
+    def Get(self, entry, group):
+        fpath = None
+        if group in self.groups:
+            fpath = os.path.join(self.store_dir, self.groups[group], EntryFname(entry))
+        if fpath is None or not os.path.exists(fpath):
+            self.misses += 1
+            return None
+        with open(fpath, 'rb') as f:
+            payload = gzip.decompress(f.read())
+        self.hits += 1
+        return json.loads(payload)
+
+    def Stats(self):
+        return {'groups': len(self.groups), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,135 @@
+"""
+Geo page aggregates of a group (map points, top countries/regions/cities,
+regions attacked per year, region treemap) from one grouping of its events
+by Year, Country, SubRegion and City. The figures used to group the events
+on their own, one of them with a Python level first-non-null aggregator for
+the map's locations, and rebuilt their "SubRegion, Country" labels with
+astype(str) on every call.
+
+The grouping keeps each cell's attacks, casualties and the row of its first
+known Latitude/Longitude, every coarser aggregate is summed from the cells.
+Labels are built once per group. Every aggregate comes out like grouping
+the events directly did (same rows, order and dtypes), so the figures don't
+change.
+"""
+import numpy as np
+import pandas as pd
+
+GEO_KEYS = ['Year', 'Country', 'SubRegion', 'City']
+#geo_bar_plots choice -> (labeled column, keys it's counted by)
+PLACE_KEYS = {
+    'Countries': ('Country', ['Country']),
+    'Regions': ('SubRegion', ['SubRegion', 'Country']),
+    'Cities': ('City', ['City', 'Country']),
+}
+
+def FirstValidRows(group_ids, values, n_groups):
+    '''
+    Row of each group's first non NaN value, len(values) when it has none.
+    '''
+    valid = np.flatnonzero(~np.isnan(values))
+    first = np.full(n_groups, len(values), dtype='int64')
+    #valid rows are in row order, so a group's first occurrence among them is its first valid row
+    groups, first_idx = np.unique(group_ids[valid], return_index=True)
+    first[groups] = valid[first_idx]
+    return first
+
+def LabelWithCountry(df, col, add_country):
+    '''
+    "<col>, <Country>" labels (just col for countries) with 'Unknown' dropped.
+    Missing values are labeled 'nan' like astype(str) does.
+    '''
+    _df = df.copy()
+    _df[col] = _df[col].astype(str)
+    _df = _df[_df[col] != 'Unknown']
+    if add_country:
+        _df[col] = _df[col] + ', ' + _df['Country'].astype(str)
+    return _df
+
+class GeoFacts:
+    '''
+    A group's Year x Country x SubRegion x City cells and the Geo page
+    aggregates drawn from them. Grouped the first time something asks.
+
+        geo = GeoFacts(group_df)
+        geo.PlaceCounts('Regions')
+
+    Returned frames are shared between calls, don't modify them.
+    '''
+    def __init__(self, df):
+        self._df = df
+        self._cells = None
+        self._latlon = None
+        self._memo = {}
+
+    def _Build(self):
+        if self._cells is not None:
+            return
+        df = self._df
+        grouped = df.groupby(GEO_KEYS, observed=True, dropna=False)
+        cells = grouped.agg(Attacks=('Year', 'size'), Casualties=('Casualties', 'sum')).reset_index()
+        group_ids = grouped.ngroup().to_numpy()
+        #rows of the events table, a cell's location is looked up from its first valid row
+        self._latlon = (np.append(df['Latitude'].to_numpy(dtype='float64'), np.nan),
+                        np.append(df['Longitude'].to_numpy(dtype='float64'), np.nan))
+        cells['LatitudeRow'] = FirstValidRows(group_ids, self._latlon[0][:-1], len(cells))
+        cells['LongitudeRow'] = FirstValidRows(group_ids, self._latlon[1][:-1], len(cells))
+        self._cells = cells
+        self._df = None
+
+    @property
+    def cells(self):
+        self._Build()
+        return self._cells
+
+    def _Memo(self, key, build):
+        if key not in self._memo:
+            self._Build()
+            self._memo[key] = build()
+        return self._memo[key]
+
+    def PlaceCounts(self, in_str):
+        '''
+        Attacks per labeled place, 'Countries', 'Regions' or 'Cities': the
+        place column (labeled with the country for regions and cities) and
+        Country, Attacks. Like counting the events per place and country.
+        '''
+        def build():
+            col, keys = PLACE_KEYS[in_str]
+            counts = self._cells.groupby(keys, observed=True, dropna=False)['Attacks'].sum().reset_index()
+            return LabelWithCountry(counts, col, in_str != 'Countries')
+        return self._Memo(('places', in_str), build)
+
+    def SubRegionCounts(self):
+        '''
+        SubRegion (labeled with the country), Country, Casualties and
+        EventID (attacks) per SubRegion and Country.
+        '''
+        def build():
+            counts = self._cells.groupby(['SubRegion', 'Country'], observed=True, dropna=False).agg(
+                Casualties=('Casualties', 'sum'), EventID=('Attacks', 'sum')).reset_index()
+            return LabelWithCountry(counts, 'SubRegion', True)
+        return self._Memo('subregions', build)
+
+    def RegionsPerYear(self):
+        '''
+        Year, SubRegion: the number of distinct SubRegions attacked each year.
+        '''
+        return self._Memo('regions_per_year', lambda: self._cells.groupby('Year').agg({'SubRegion': 'nunique'}).reset_index())
+
+    def YearSubRegion(self):
+        '''
+        The map's points: Year, SubRegion, attacks, Casualties and the first
+        known Latitude/Longitude of the SubRegion that year. SubRegions
+        without a known location are left out.
+        '''
+        def build():
+            cells = self._cells[self._cells['SubRegion'].notna()]
+            points = cells.groupby(['Year', 'SubRegion'], observed=True).agg(
+                attacks=('Attacks', 'sum'), Casualties=('Casualties', 'sum'),
+                Latitude=('LatitudeRow', 'min'), Longitude=('LongitudeRow', 'min')).reset_index()
+            #first valid row of the SubRegion that year -> its value, the NaN past the last row when there is none
+            points['Latitude'] = self._latlon[0][points['Latitude'].to_numpy()]
+            points['Longitude'] = self._latlon[1][points['Longitude'].to_numpy()]
+            return points.dropna().reset_index(drop=True)
+        return self._Memo('year_subregion', build)
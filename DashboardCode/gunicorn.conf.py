@@ -0,0 +1,52 @@
+"""
+gunicorn settings of the production server (see wsgi.py). Worker count,
+threads and recycling can be set from the environment, e.g.
+docker run -e DASHBOARD_WORKERS=8 ...
+"""
+import os
+import gc
+import tempfile
+import multiprocessing
+
+#port must match Dockerfile
+bind = '0.0.0.0:' + os.environ.get('DASHBOARD_PORT', '8050')
+#worker processes, one per core by default, each serves its callbacks on its own
+workers = int(os.environ.get('DASHBOARD_WORKERS', multiprocessing.cpu_count()))
+#requests a worker serves at once, >1 runs them on threads of the same process
+threads = int(os.environ.get('DASHBOARD_THREADS', 1))
+#load the app and its data in the master before forking, the workers share it instead of each loading a copy
+preload_app = True
+
+#restart a worker after this many requests, give or take the jitter so they don't all restart at once.
+#its caches are dropped with it, the data stays in the master. 0 never restarts them
+max_requests = int(os.environ.get('DASHBOARD_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+#a restarting worker finishes the requests it has before it exits
+graceful_timeout = 30
+#first builds of a large group's pages take a few seconds
+timeout = 120
+
+accesslog = '-'
+
+#every process keeps its request metrics in files here and /metrics adds them up (prometheus_client's
+#multiprocess mode, metrics.py). Set before the app is loaded, prometheus_client reads it at import.
+#A new folder per start, or the given one emptied of the last run's files
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='dashboard_metrics_')
+else:
+    for name in os.listdir(os.environ['PROMETHEUS_MULTIPROC_DIR']):
+        if name.endswith('.db'):
+            os.remove(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], name))
+
+def when_ready(server):
+    import app
+    #the cache lookups of the master's loading (prewarm_layouts) are counted as its own, the workers count from there
+    app.cache_counters.Sync()
+    #the objects the master loaded are left out of the workers' garbage collections,
+    #which would otherwise write to their pages and copy them into every worker
+    gc.freeze()
+    server.log.info("Dashboard loaded, starting %s workers", workers)
+
+def child_exit(server, worker):
+    import metrics
+    metrics.MarkProcessDead(worker.pid)
@@ -0,0 +1,67 @@
+"""
+Header numbers of the dashboard pages (years active, attacks, killed,
+wounded, places affected, success/suicide/claimed rates, per attack and per
+year averages) computed together from the group's column arrays, instead of
+every indicator scanning the frame on its own. data_store keeps the result
+per group, the indicator figures only read it.
+
+Every value is computed the way the pandas expression it replaces did it
+(NaNs skipped, 'Unknown' places left out, same rounding), so the figures
+don't change.
+"""
+import numpy as np
+import pandas as pd
+
+#indicator name -> column counted by ov_countries_affected_indicator
+PLACE_COLUMNS = {'Countries': 'Country', 'Regions': 'SubRegion', 'Cities': 'City'}
+
+def CountKnown(series):
+    '''
+    Distinct values of series that aren't missing or 'Unknown'. Categoricals
+    are counted from their codes.
+    '''
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        seen = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories)) > 0
+        unknown = series.cat.categories.get_indexer(['Unknown'])[0]
+        if unknown >= 0:
+            seen[unknown] = False
+        return int(seen.sum())
+    codes, uniques = pd.factorize(series)
+    return int(len(uniques) - (uniques == 'Unknown').sum())
+
+def NanSumCount(values):
+    '''
+    (sum, count) of the non NaN values of a float array.
+    '''
+    missing = np.isnan(values)
+    return np.where(missing, 0, values).sum(), len(values) - int(missing.sum())
+
+def ComputeKPIs(df):
+    '''
+    {kpi name: value} for one group's events.
+    '''
+    n_attacks = len(df)
+    years = df['Year'].to_numpy()
+    killed_sum, killed_count = NanSumCount(df['NVictimsKilled'].to_numpy(dtype='float64'))
+    wounded_sum, wounded_count = NanSumCount(df['NVictimsWounded'].to_numpy(dtype='float64'))
+    claimed = df['GroupClaimed'].to_numpy(dtype='float64')
+    claim_known = claimed >= 0 #-9 is unknown, NaN not recorded
+
+    #a group with no known claims, or no recorded casualties, gets NaN like compare_facts.GroupedKPIs
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kpis = {
+            'attacks': n_attacks,
+            'years_active': max(years.max() - years.min(), 1) if n_attacks else 1,
+            'killed': killed_sum,
+            'wounded': wounded_sum,
+            'success_rate': (df['AttackSuccess'].to_numpy().sum(dtype='int64') / n_attacks) * 100,
+            'suicide_rate': (df['SuicideAttack'].to_numpy().sum(dtype='int64') / n_attacks) * 100,
+            'attacks_per_year': round(np.float64(n_attacks) / len(np.unique(years)), 1),
+            'claimed_rate': round((claimed[claim_known].sum() / np.int64(claim_known.sum())) * 100, 1),
+            'killed_per_attack': round(killed_sum / killed_count, 1),
+            'wounded_per_attack': round(wounded_sum / wounded_count, 1),
+        }
+    for name, col in PLACE_COLUMNS.items():
+        kpis[name] = CountKnown(df[col])
+    return kpis
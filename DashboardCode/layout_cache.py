@@ -0,0 +1,58 @@
+"""
+Bounded LRU cache of built page layouts. The data only changes when the ETL
+runs again, so a page for a group is built once and served from here after
+that; the key carries the dataset version so a new ETL output never hits a
+layout built from the old one.
+"""
+import threading
+from collections import OrderedDict
+
+class LayoutCache:
+    '''
+    Least recently used cache of layouts keyed by (pathname, group, dataset version).
+
+        layout = layout_cache.Get(key, lambda: BuildGetOverviewLayout(...))
+
+    Dash serves callbacks from several threads, lookups and inserts are
+    done under a lock, the build itself isn't (two requests missing the same
+    key both build it, the second one just replaces the first).
+    '''
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def Get(self, key, build):
+        with self._lock:
+            if key in self._layouts:
+                self._layouts.move_to_end(key)
+                self.hits += 1
+                return self._layouts[key]
+            self.misses += 1
+        layout = build()
+        self.Put(key, layout)
+        return layout
+
+    def Put(self, key, layout):
+        with self._lock:
+            self._layouts[key] = layout
+            self._layouts.move_to_end(key)
+            while len(self._layouts) > self.maxsize:
+                self._layouts.popitem(last=False)
+
+    def Clear(self):
+        with self._lock:
+            self._layouts.clear()
+
+    def Stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'size': len(self._layouts),
+                'maxsize': self.maxsize,
+            }
@@ -0,0 +1,96 @@
+"""
+Request metrics of the dashboard in Prometheus text format, served on
+/metrics through prometheus_client: latency histograms of the figure
+builders, page builds and callbacks, response sizes, cache hit/miss counters
+and the dataset load time.
+
+Under gunicorn (gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR before the app
+is loaded) prometheus_client keeps every process's numbers in files in that
+folder and /metrics adds them up, so whichever worker answers the scrape
+reports all of them. The master marks exited workers dead, their counts are
+kept. Without the folder the numbers are the serving process's own.
+"""
+import os
+import functools
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+
+#seconds, from a cached lookup to a large group's first build
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+#bytes of a callback response, from a slider patch to a full page
+SIZE_BUCKETS = (1e3, 3e3, 1e4, 3e4, 1e5, 3e5, 1e6, 3e6)
+
+figure_build_seconds = Histogram('dashboard_figure_build_seconds', 'Time to build one figure, by figure builder.',
+                                 ['figure'], buckets=LATENCY_BUCKETS)
+page_build_seconds = Histogram('dashboard_page_build_seconds', 'Time to build a page layout that was not cached, by page.',
+                               ['page'], buckets=LATENCY_BUCKETS)
+callback_seconds = Histogram('dashboard_callback_seconds', 'Time to answer a callback request, serialization included, by callback.',
+                             ['callback'], buckets=LATENCY_BUCKETS)
+callback_response_bytes = Histogram('dashboard_callback_response_bytes',
+                                    'Size of a callback response body as sent, compressed when the client accepts it, by callback.',
+                                    ['callback'], buckets=SIZE_BUCKETS)
+cache_lookups = Counter('dashboard_cache_lookups_total',
+                        'Lookups in the layout, figure and group caches and the figure store, by cache and hit/miss.',
+                        ['cache', 'result'])
+#set once by the process that loads the data, the workers inherit it
+dataset_load_seconds = Gauge('dashboard_dataset_load_seconds',
+                             'Time data_store took to open the events and read the rollups at startup.', multiprocess_mode='max')
+startup_seconds = Gauge('dashboard_startup_seconds', 'Time app.py took to load at startup, by phase (imports, data, app).',
+                        ['phase'], multiprocess_mode='max')
+
+def Timed(histogram, label):
+    '''
+    Decorator observing a function's run time in histogram, with label set
+    to the function's name.
+    '''
+    def decorator(func):
+        timer = histogram.labels(**{label: func.__name__})
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with timer.time():
+                return func(*args, **kwargs)
+        return timed
+    return decorator
+
+class CacheCounters:
+    '''
+    Brings cache_lookups up to hit/miss counts the caches keep themselves.
+    lookups() -> [(cache, hits, misses)], Sync() adds what they gained since
+    the last Sync. A forked worker counts from what the caches held at the
+    fork, what the master did before is in the master's numbers.
+    '''
+    def __init__(self, lookups):
+        self.lookups = lookups
+        self._seen = {}
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._AfterFork)
+
+    def Sync(self):
+        for cache, hits, misses in self.lookups():
+            for result, count in (('hit', hits), ('miss', misses)):
+                seen = self._seen.get((cache, result), 0)
+                if count > seen:
+                    cache_lookups.labels(cache=cache, result=result).inc(count - seen)
+                self._seen[(cache, result)] = count
+
+    def _AfterFork(self):
+        self._seen = {(cache, result): count for cache, hits, misses in self.lookups()
+                      for result, count in (('hit', hits), ('miss', misses))}
+
+def Render():
+    '''
+    (body, content type) of the Prometheus text exposition of every process's
+    numbers, or this process's without a multiprocess folder.
+    '''
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def MarkProcessDead(pid):
+    '''
+    Run by the gunicorn master when a worker exits: its live gauges go, its counts stay.
+    '''
+    multiprocess.mark_process_dead(pid)
@@ -0,0 +1,104 @@
+"""
+Smaller callback responses. Every figure of the dashboard carries its whole
+plotly template (darkly, ~7.7 KB of JSON) in layout.template, most of a
+page's bytes. SlimFigure leaves just the template's name there; the browser
+gets the templates once, from TemplatesScript served on /figure-templates.js,
+and assets/figure_templates.js puts them back into each figure before plotly
+draws it. A few trace attributes plotly express writes out with plotly.js's
+default value are dropped as well.
+
+CompressResponse gzips (brotli when the brotli package is installed) the
+JSON the dashboard sends, callback responses above all.
+"""
+import gzip
+import functools
+import plotly.io as pio
+from plotly.io.json import to_json_plotly
+from dash.development.base_component import Component
+from dash import dcc
+from werkzeug.http import parse_accept_header
+try:
+    import brotli
+except ImportError: #gzip only
+    brotli = None
+
+#trace attribute -> the value plotly.js defaults it to. Only subplot references and legendgroup:
+#templates can't set these, so dropping them can't change a figure. Most other attributes px writes
+#(orientation, textposition, showlegend...) would fall back to a template or inferred default instead
+DEFAULT_TRACE_ATTRIBUTES = {'xaxis': 'x', 'yaxis': 'y', 'geo': 'geo', 'subplot': 'polar', 'legendgroup': ''}
+#responses smaller than this aren't worth compressing
+MIN_COMPRESS_BYTES = 500
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 #fast, still ahead of gzip -9 on JSON
+
+@functools.lru_cache(maxsize=None)
+def TemplateJSON(template_name):
+    return pio.templates[template_name].to_plotly_json()
+
+def IsDefaultTraceAttribute(key, value):
+    #values can be arrays, the defaults are all strings
+    return isinstance(value, str) and DEFAULT_TRACE_ATTRIBUTES.get(key) == value
+
+def SlimFigure(figure, template_name):
+    '''
+    Figure (go.Figure or dict) -> its dict with layout.template replaced by
+    template_name if it is that template, and the default trace attributes
+    dropped. The figure passed in is not modified.
+    '''
+    fig = figure.to_plotly_json() if hasattr(figure, 'to_plotly_json') else dict(figure)
+    layout = fig.get('layout')
+    if layout is not None and layout.get('template') == TemplateJSON(template_name):
+        fig['layout'] = dict(layout, template=template_name)
+    fig['data'] = [{key: value for key, value in trace.items() if not IsDefaultTraceAttribute(key, value)}
+                   for trace in fig.get('data', [])]
+    return fig
+
+def SlimLayout(component, template_name):
+    '''
+    Slims the figure of every dcc.Graph in a component tree, in place.
+    Returns the tree.
+    '''
+    if isinstance(component, (list, tuple)):
+        for child in component:
+            SlimLayout(child, template_name)
+    elif isinstance(component, Component):
+        if isinstance(component, dcc.Graph) and getattr(component, 'figure', None) is not None:
+            component.figure = SlimFigure(component.figure, template_name)
+        SlimLayout(getattr(component, 'children', None), template_name)
+    return component
+
+def TemplatesScript(template_names):
+    '''
+    JS defining window.dashboardFigureTemplates, {name: template}, for
+    assets/figure_templates.js.
+    '''
+    templates = {name: TemplateJSON(name) for name in template_names}
+    return 'window.dashboardFigureTemplates = {};\n'.format(to_json_plotly(templates))
+
+def AcceptedEncoding(accept_encoding):
+    '''
+    'br', 'gzip' or None, from a request's Accept-Encoding header.
+    '''
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return parse_accept_header(accept_encoding).best_match(encodings)
+
+def CompressResponse(response, accept_encoding):
+    '''
+    Compresses a buffered response's body for a client sending
+    accept_encoding, if it's big enough and not compressed yet.
+    '''
+    response.vary.add('Accept-Encoding')
+    encoding = AcceptedEncoding(accept_encoding or '')
+    if (encoding is None or response.direct_passthrough or response.status_code != 200
+            or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+    if encoding == 'br':
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
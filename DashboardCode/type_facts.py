@@ -0,0 +1,161 @@
+"""
+Long format table of a group's attack, target and weapon types, one row per
+filled type slot (AttackType1..3 etc.), with the event's year and casualties.
+The figures used to melt the same three columns each on their own, several
+times per page; they now melt once per group and aggregate through TypeFacts.
+
+Counts come out shaped like the ETL's type rollups (same key and measure
+names), so a figure can take either.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+#dimension -> the event columns it is melted from
+TYPE_COLUMNS = {
+    'AttackType': ['AttackType1', 'AttackType2', 'AttackType3'],
+    'TargetType': ['TargetType1', 'TargetType2', 'TargetType3'],
+    'WeaponType': ['WeaponType1', 'WeaponType2', 'WeaponType3'],
+}
+MEASURES = ['NVictimsKilled', 'NVictimsWounded', 'Casualties']
+FACT_ID_COLUMNS = ['EventID', 'Year'] + MEASURES
+
+def SlotsDtype(df, type_cols):
+    '''
+    dtype holding the values of all of a dimension's slot columns:
+    categoricals get every slot's categories (sorted, like the ETL makes
+    them), other columns the dtype concatenating them gives.
+    '''
+    slots = [df[col].iloc[:0] for col in type_cols]
+    if all(isinstance(slot.dtype, pd.CategoricalDtype) for slot in slots):
+        #a slot that is empty everywhere has no categories to add, nor their dtype
+        slots = [slot for slot in slots if len(slot.cat.categories)] or slots[:1]
+        return union_categoricals(slots, sort_categories=True).dtype
+    return pd.concat(slots, ignore_index=True).dtype
+
+def BuildTypeFactTable(df, id_columns=FACT_ID_COLUMNS, dimensions=TYPE_COLUMNS):
+    '''
+    (table, {dimension: (start, stop)}, {dimension: value dtype}). table has
+    columns EventID, Year, Dimension, Value and the measures (id_columns, with
+    Dimension and Value after Year), each of dimensions' rows contiguous and in melt order (slot 1 rows, then slot 2, then 3),
+    empty slots dropped. Same rows as pd.melt + dropna per dimension, gathered
+    with one take of the event columns instead.
+    '''
+    rows, values, offsets, value_dtypes = [], [], {}, {}
+    start = 0
+    for dimension in dimensions:
+        type_cols = TYPE_COLUMNS[dimension]
+        for col in type_cols:
+            filled = np.flatnonzero(df[col].notna().to_numpy())
+            rows.append(filled)
+            values.append(df[col].iloc[filled])
+        stop = start + sum(len(r) for r in rows[-len(type_cols):])
+        offsets[dimension] = (start, stop)
+        value_dtypes[dimension] = SlotsDtype(df, type_cols)
+        start = stop
+
+    #slots without a filled row add no values, and an all empty column's categories may not share the others' dtype
+    values = [v for v in values if len(v)] or values[:1]
+    if all(isinstance(v.dtype, pd.CategoricalDtype) for v in values):
+        #one categorical holding every dimension's categories, Rows() puts each dimension's back
+        values = pd.Series(union_categoricals(values))
+    else:
+        values = pd.concat(values, ignore_index=True)
+    table = df[list(id_columns)].take(np.concatenate(rows)).reset_index(drop=True)
+    at = table.columns.get_loc('Year') + 1
+    table.insert(at, 'Dimension', pd.Categorical.from_codes(
+        np.repeat(np.arange(len(offsets)), [stop - start for start, stop in offsets.values()]),
+        categories=list(offsets)))
+    table.insert(at + 1, 'Value', values)
+    return table, offsets, value_dtypes
+
+def DimensionRows(table, offsets, value_dtypes, dimension):
+    '''
+    The rows of a BuildTypeFactTable table holding dimension's slots, without
+    the Dimension column and with Value back in the dimension's dtype.
+    '''
+    start, stop = offsets[dimension]
+    rows = table.iloc[start:stop].drop(columns=['Dimension'])
+    rows['Value'] = rows['Value'].astype(value_dtypes[dimension])
+    return rows
+
+class TypeFacts:
+    '''
+    A group's type fact table and the aggregations the figures draw from it.
+    The table is only melted the first time something asks for it, a page
+    drawn from rollups never pays for it.
+
+        facts = TypeFacts(group_df)
+        facts.Counts('AttackType', exclude=['Unknown', 'Other'])
+
+    Values of categorical event columns are categoricals of every category
+    any of the dimension's slots has. Groupings only list the values that
+    occur, like grouping the melted slots does.
+    '''
+    def __init__(self, df):
+        self._df = df
+        self._table = None
+        self._rows = {}
+        self._counts = {}
+
+    def _Build(self):
+        if self._table is None:
+            self._table, self._offsets, self._value_dtypes = BuildTypeFactTable(self._df)
+            self._df = None
+
+    @property
+    def table(self):
+        self._Build()
+        return self._table
+
+    def Rows(self, dimension, exclude=()):
+        '''
+        Filled slots of one dimension, columns EventID, Year, <dimension> and
+        the measures. exclude drops rows with those values.
+        '''
+        if dimension not in self._rows:
+            self._Build()
+            rows = DimensionRows(self._table, self._offsets, self._value_dtypes, dimension)
+            self._rows[dimension] = rows.rename(columns={'Value': dimension})
+        rows = self._rows[dimension]
+        if len(exclude):
+            rows = rows[~rows[dimension].isin(exclude)]
+        return rows
+
+    def Counts(self, dimension, exclude=(), by_year=False):
+        '''
+        [Year,] <dimension>, Attacks (filled slots) and the summed measures,
+        like the ETL's group_<dimension> rollups. Computed once per arguments,
+        the returned frame is shared so don't modify it.
+        '''
+        key = (dimension, tuple(exclude), by_year)
+        if key not in self._counts:
+            rows = self.Rows(dimension, exclude)
+            keys = ['Year', dimension] if by_year else [dimension]
+            grouped = rows.groupby(keys, observed=True)
+            counts = grouped[MEASURES].sum()
+            counts.insert(0, 'Attacks', grouped.size())
+            self._counts[key] = counts.reset_index()
+        return self._counts[key]
+
+    def Top(self, dimension, n=5, exclude=()):
+        '''
+        The n values of dimension filling the most slots.
+        '''
+        counts = self.Counts(dimension, exclude)
+        return counts.sort_values(by='Attacks', ascending=False).head(n)[dimension].unique()
+
+    def PairCounts(self, dimension, other, values=None, exclude=()):
+        '''
+        Slots of dimension (only those in values, if given) joined to the same
+        event's other dimension: <dimension>, <other>, Attacks, Casualties.
+        Like the ETL's group_targettype_attacktype rollup.
+        '''
+        rows = self.Rows(dimension, exclude)[['EventID', dimension, 'Casualties']]
+        if values is not None:
+            rows = rows[rows[dimension].isin(values)]
+        merged = pd.merge(rows, self.Rows(other, exclude)[['EventID', other]], on='EventID', how='left')
+        merged['Casualties'] = merged['Casualties'].fillna(0)
+        return merged.groupby([dimension, other], observed=True).agg(
+            Casualties=('Casualties', 'sum'),
+            Attacks=('EventID', 'count')).reset_index()
@@ -0,0 +1,18 @@
+"""
+WSGI entry point of the dashboard for serving it with several worker
+processes (gunicorn.conf.py, the Dockerfile's CMD):
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+
+The gunicorn master imports this once (preload_app) and forks the workers
+from it, so the dataset data_store loads at import, and the layouts
+prewarmed here with prewarm_layouts, are in memory once and shared by every
+worker copy-on-write. `python app.py` still runs the single process Dash
+development server.
+"""
+import app as dashboard
+
+if dashboard.prewarm_layouts:
+    dashboard.PrewarmLayouts()
+
+server = dashboard.app.server
@@ -1,18 +1,36 @@
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import sys
 import json
 import os
+import hashlib
+import shutil
+import xlsx_stream
+from stage_report import StageReport, CurrentRSSBytes
 
 #Going to use some relative paths, so need this as a safety.
 script_directory = os.path.dirname(os.path.abspath(__file__))
 print(script_directory)
 os.chdir(script_directory)
 
-def ReadRename(gtd_fpath,read_cols_fpath):
-    """
-    Reads in the gtd excel file, reads in the 
-    needed columns, and performs some renaming.
-    """
+def HashFile(fpath, chunk_size=1 << 20):
+    '''
+    sha256 of a file's bytes. Read in chunks so the big workbook never has
+    to sit in memory just to be hashed.
+    '''
+    hasher = hashlib.sha256()
+    with open(fpath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def ReadColsMapping(read_cols_fpath):
+    '''
+    Original GTD column name -> our column name, from ReadCols.xlsx.
+    '''
     rd_cols_df = pd.read_excel(read_cols_fpath)
 
     rd_rename_cols_dct = {}
@@ -20,25 +38,108 @@ def ReadRename(gtd_fpath,read_cols_fpath):
         orig_col = row['ReadCols'].strip()
         rename_col = row['RenameTo'].strip()
         rd_rename_cols_dct[orig_col] = rename_col
+    return rd_rename_cols_dct
+
+def IngestCachePath(gtd_fpath,rd_rename_cols_dct,cache_dir):
+    '''
+    Cache file name is content addressed: a new workbook or a change to the
+    column list gives a new name, so a stale cache is never picked up.
+    '''
+    cols_key = json.dumps(rd_rename_cols_dct, sort_keys=True).encode('utf-8')
+    key = hashlib.sha256()
+    key.update(HashFile(gtd_fpath).encode('utf-8'))
+    key.update(hashlib.sha256(cols_key).hexdigest().encode('utf-8'))
+    return os.path.join(cache_dir, 'gtd_ingest_' + key.hexdigest()[:24] + '.parquet')
+
+#readers decode a row group at a time, this bounds what ReadKeptEvents holds
+INGEST_ROW_GROUP_ROWS = 1 << 15
+
+def WriteIngestCache(df,cache_fpath):
+    '''
+    Write to a temp file and swap it in, so a killed run can't leave half a
+    cache behind. Returns the frame as read back from the cache, that way a
+    cold run and a warm run hand the exact same frame to the transforms.
+    '''
+    os.makedirs(os.path.dirname(cache_fpath) or '.', exist_ok=True)
+    tmp_fpath = cache_fpath + '.tmp'
+    try:
+        df.to_parquet(tmp_fpath, index=False, row_group_size=INGEST_ROW_GROUP_ROWS)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        print("could not write ingest cache, continuing without it: " + str(e))
+        if os.path.exists(tmp_fpath):
+            os.remove(tmp_fpath)
+        return df
+    os.replace(tmp_fpath, cache_fpath)
+    return pd.read_parquet(cache_fpath)
+
+def ReadRename(gtd_fpath,read_cols_fpath,cache_dir=None,reader='excel',n_workers=None):
+    """
+    Reads in the gtd excel file, reads in the 
+    needed columns, and performs some renaming.
+    With a cache_dir the result is kept there as parquet, keyed by a hash of
+    the workbook and the column list, and later runs skip the excel parse.
+    reader='stream' parses the sheet in blocks over n_workers processes
+    (see xlsx_stream.py), same frame as reader='excel' (pd.read_excel).
+    """
+    rd_rename_cols_dct = ReadColsMapping(read_cols_fpath)
+
+    cache_fpath = None
+    if cache_dir is not None:
+        cache_fpath = IngestCachePath(gtd_fpath,rd_rename_cols_dct,cache_dir)
+        if os.path.exists(cache_fpath):
+            print("reading from ingest cache " + cache_fpath)
+            return pd.read_parquet(cache_fpath)
     
     print("reading into dataframe...this will take a while, excel is slow!")
-    df = pd.read_excel(gtd_fpath, usecols = list(rd_rename_cols_dct.keys()))
+    if reader == 'stream' and xlsx_stream.TextParser is None:
+        print("WARNING: the streaming reader doesn't support this pandas version, using pd.read_excel")
+        reader = 'excel'
+    if reader == 'stream':
+        df = xlsx_stream.ReadExcelStreaming(gtd_fpath, list(rd_rename_cols_dct.keys()), n_workers)
+    else:
+        df = pd.read_excel(gtd_fpath, usecols = list(rd_rename_cols_dct.keys()))
     df.rename(columns=rd_rename_cols_dct,inplace=True)
+    if cache_fpath is not None:
+        df = WriteIngestCache(df,cache_fpath)
 
     print("reading complete.")
     return df
 
 
+#GTD labels shortened for the figures, per type column
+TYPE_RENAMES = {
+    'AttackType': {
+        'Bombing/Explosion' : 'Bombing',
+        'Facility/Infrastructure Attack' :'Facility/Infra Attack',
+        'Hostage Taking (Barricade Incident)' : 'Hostage Taking',
+        'Hostage Taking (Kidnapping)' : 'Hostage Taking'
+    },
+    'TargetType': {
+        'Airports & Aircraft' : 'Airport/Aircraft',
+        'Food or Water Supply':  'Food/Water Supply',
+        'Government (Diplomatic)' : 'Government',
+        'Government (General)' : 'Government',
+        'Journalists & Media' : 'Media',
+        'Private Citizens & Property' : 'Citizens/Property',
+        'Religious Figures/Institutions' :'Religious Entity',
+        'Terrorists/Non-State Militia' : 'Terrorists/Militia',
+        'Telecommunication' : 'Telecom/Utilities',
+        'Utilities' : 'Telecom/Utilities',
+    },
+    'WeaponType': {
+        'Vehicle (not to include vehicle-borne explosives, i.e., car or truck bombs)' : 'Vehicle'
+    },
+}
+
 def BuildColumns(df):
     '''
-    Builds a time and CityCountry feature. Also sets a verified bit per group involvement
+    Builds a time and CityCountry feature. Also sets a verified bit per group involvement.
+    df is left as is: the result is a copy on write view of it, only the
+    columns built or replaced here take new memory.
     '''
     print("Creating some features")
-    df_temp = df.copy()
-    df_temp['EventDateTime'] = pd.to_datetime(df_temp[['Year', 'Month', 'Day']], 
-                                        errors='coerce')
-    
-    df_temp['CityCountry'] = df['City'] + ', ' + df['Country']
+    df_temp = df.assign(EventDateTime=pd.to_datetime(df[['Year', 'Month', 'Day']], errors='coerce'),
+                        CityCountry=df['City'] + ', ' + df['Country'])
 
     ##set verified
     df_temp['Group1Verified'] = None
@@ -52,45 +153,54 @@ def BuildColumns(df):
     df_temp.loc[df_temp['Group3Uncertain']==1,'Group3Verified'] = 0
 
     #Clean up some annoying categorical columns, etc.
-    attk_type_ren = {
-        'Bombing/Explosion' : 'Bombing',
-        'Facility/Infrastructure Attack' :'Facility/Infra Attack',
-        'Hostage Taking (Barricade Incident)' : 'Hostage Taking',
-        'Hostage Taking (Kidnapping)' : 'Hostage Taking'
-    }
-    df_temp['AttackType1'].replace(attk_type_ren,inplace=True)
-    df_temp['AttackType2'].replace(attk_type_ren,inplace=True)
-    df_temp['AttackType3'].replace(attk_type_ren,inplace=True)
-
-    targ_type_ren = {
-        'Airports & Aircraft' : 'Airport/Aircraft',
-        'Food or Water Supply':  'Food/Water Supply',
-        'Government (Diplomatic)' : 'Government',
-        'Government (General)' : 'Government',
-        'Journalists & Media' : 'Media',
-        'Private Citizens & Property' : 'Citizens/Property',
-        'Religious Figures/Institutions' :'Religious Entity',
-        'Terrorists/Non-State Militia' : 'Terrorists/Militia',
-        'Telecommunication' : 'Telecom/Utilities',
-        'Utilities' : 'Telecom/Utilities',
-    }
-    df_temp['TargetType1'].replace(targ_type_ren,inplace=True)
-    df_temp['TargetType2'].replace(targ_type_ren,inplace=True)
-    df_temp['TargetType3'].replace(targ_type_ren,inplace=True)
-
-    wep_type_ren = {
-        'Vehicle (not to include vehicle-borne explosives, i.e., car or truck bombs)' : 'Vehicle'
-    }
-    df_temp['WeaponType1'].replace(wep_type_ren,inplace=True)
-    df_temp['WeaponType2'].replace(wep_type_ren,inplace=True)
-    df_temp['WeaponType3'].replace(wep_type_ren,inplace=True)
+    for type_col, renames in TYPE_RENAMES.items():
+        for n in range(1, 4):
+            col = type_col + str(n)
+            df_temp[col] = df_temp[col].replace(renames)
 
     return df_temp
 
+GROUP_SLOT_COLS = [
+    ['Group1','GroupSub1','Group1Claimed','Group1ClaimedMethod','Group1Verified'],
+    ['Group2','GroupSub2','Group2Claimed','Group2ClaimedMethod','Group2Verified'],
+    ['Group3','GroupSub3','Group3Claimed','Group3ClaimedMethod','Group3Verified'],
+]
+
 def LongifyByGroup(df):
+    '''
+    Make our dataset long by group only. The other aspects can stay wide.
+    Row positions of every filled Group{n} slot are collected first, then the
+    shared columns are gathered with one take, instead of copying the wide
+    frame once per slot. Same output as LongifyByGroupLegacy.
+    '''
+    long_grp_cols = [''.join(filter(str.isalpha, col)) for col in GROUP_SLOT_COLS[0]]
+    all_slot_cols = [col for grp_cols in GROUP_SLOT_COLS for col in grp_cols]
+
+    slot_rows = [np.flatnonzero(df[grp_cols[0]].notna().to_numpy()) for grp_cols in GROUP_SLOT_COLS]
+    take_rows = np.concatenate(slot_rows)
+
+    #the group columns are small, concat them per slot so dtypes resolve like before
+    grp_df = pd.concat([df[grp_cols].iloc[rows].set_axis(long_grp_cols, axis=1)
+                        for grp_cols, rows in zip(GROUP_SLOT_COLS, slot_rows)],
+                       axis=0, ignore_index=True)
+
+    #one gather of every shared column, then swap the slot columns for the long ones
+    long_df = df.take(take_rows)
+    long_df.index = pd.RangeIndex(len(long_df))
+    for col in all_slot_cols:
+        del long_df[col]
+    for pos, col in enumerate(long_grp_cols):
+        long_df.insert(pos, col, grp_df[col])
+
+    long_df['Casualties'] = long_df['NVictimsKilled'] + long_df['NVictimsWounded']
+    long_df['Casualties'] = long_df['Casualties'].fillna(long_df['NVictimsKilled']).fillna(long_df['NVictimsWounded'])
+    return long_df
+
+def LongifyByGroupLegacy(df):
     '''
     Make our dataset long by group only. The other aspects can stay wide. Ugly,
     but works because this is beyond the capability of pd.melt() to my knowledge.
+    Kept around as the reference for LongifyByGroup, see BenchmarkCode/bench_longify.py
     '''
     grp1_cols = ['Group1','GroupSub1','Group1Claimed','Group1ClaimedMethod','Group1Verified']
     grp1_rename = {col: ''.join(filter(str.isalpha, col)) for col in grp1_cols}
@@ -119,114 +229,533 @@ def LongifyByGroup(df):
     long_df['Casualties'] = long_df['Casualties'].fillna(long_df['NVictimsKilled']).fillna(long_df['NVictimsWounded'])
     return long_df
 
+#free text columns, kept as arrow strings so the writers and the dashboard
+#never build a python object per cell
+ARROW_STRING = "string[pyarrow]"
+
+#hard defined datatype of each output column, cuts memory usage in half
+FINAL_DTYPES = {
+    "Country": "category",
+    "Region" : "category",
+    "SubRegion": "category",
+    "City" : "category",
+    "Latitude": "float64",
+    "Longitude" : "float64",
+    "SpecificLocation" : ARROW_STRING,
+    "AttackDetails" : ARROW_STRING,
+    "AttackSuccess" : "int8",
+    "SuicideAttack" : "int8",
+    "AttackType1" : "category",
+    "AttackType2" : "category",
+    "AttackType3" : "category",
+    "TargetType1" : "category",
+    "TargetSubType1" : "category",
+    "SpecificTarget1" : "category",
+    "TargetNationality1": "category",
+    "TargetType2" : "category",
+    "TargetSubType2" : "category",
+    "SpecificTarget2" : "category",
+    "TargetNationality2": "category",
+    "TargetType3" : "category",
+    "TargetSubType3" : "category",
+    "SpecificTarget3" : "category",
+    "TargetNationality3": "category",
+    "Group" : "category",
+    "GroupSub" : "category",
+    "GroupClaimedMethod" : "category",
+    "MotiveDetails" : ARROW_STRING,
+    "WeaponType1" : "category",
+    "WeaponSubType1" : "category",
+    "WeaponType2" : "category",
+    "WeaponSubType2" : "category",
+    "WeaponType3" : "category",
+    "WeaponSubType3" : "category",
+    "PropertyDamaged" : "int8",
+    "PropertyDamagedExtent" : "category",
+    "PropertyDamageUSD" : "float64",
+    "RansomUSD" : "float64",
+    "RansomPaid" : "float64",
+    "HostageOrKidnapOutcome" : ARROW_STRING,
+    "EventDateTime" : "datetime64[ns]",
+    "CityCountry" : ARROW_STRING
+}
+#columns we don't need in the output
+DROPPED_COLS = ['Month','Day','Group1Uncertain','Group2Uncertain','Group3Uncertain',
+                #dropping the below for now...
+                'TargetSubType1','TargetSubType2','TargetSubType3',
+                'WeaponSubType1','WeaponSubType2','WeaponSubType3']
+
 def SetDatatypesAndSort(df):
     '''
     Hard define what datatypes for each column. Cuts memory usage in half.
     Then, do some pre sorting that might help performance later. This will
     persist into the parquet file :)
+    Columns that already have their dtype (see ApplyEarlyDatatypes) or were
+    already dropped are left alone, copy on write means they aren't copied.
     '''
     print("Setting datatypes and sorting")
-    new_dtypes = {
-        "Country": "category",
-        "Region" : "category",
-        "SubRegion": "category",
-        "City" : "category",
-        "Latitude": "float64",
-        "Longitude" : "float64",
-        "SpecificLocation" : "object",
-        "AttackDetails" : "object",
-        "AttackSuccess" : "int8",
-        "SuicideAttack" : "int8",
-        "AttackType1" : "category",
-        "AttackType2" : "category",
-        "AttackType3" : "category",
-        "TargetType1" : "category",
-        "TargetSubType1" : "category",
-        "SpecificTarget1" : "category",
-        "TargetNationality1": "category",
-        "TargetType2" : "category",
-        "TargetSubType2" : "category",
-        "SpecificTarget2" : "category",
-        "TargetNationality2": "category",
-        "TargetType3" : "category",
-        "TargetSubType3" : "category",
-        "SpecificTarget3" : "category",
-        "TargetNationality3": "category",
-        "Group" : "category",
-        "GroupSub" : "category",
-        "GroupClaimedMethod" : "category",
-        "MotiveDetails" : 'object',
-        "WeaponType1" : "category",
-        "WeaponSubType1" : "category",
-        "WeaponType2" : "category",
-        "WeaponSubType2" : "category",
-        "WeaponType3" : "category",
-        "WeaponSubType3" : "category",
-        "PropertyDamaged" : "int8",
-        "PropertyDamagedExtent" : "category",
-        "PropertyDamageUSD" : "float64",
-        "RansomUSD" : "float64",
-        "RansomPaid" : "float64",
-        "HostageOrKidnapOutcome" : "object",
-        "EventDateTime" : "datetime64[ns]",
-        "CityCountry" : "object"
-    }
-    ret = df.copy()
-    ret = ret.astype(new_dtypes)
-    #drop columns we don't need
-    ret = ret.drop(columns=['Month','Day','Group1Uncertain',
-                                    'Group2Uncertain','Group3Uncertain',
-                                    #dropping the below for now...
-                                    'TargetSubType1','TargetSubType2',
-                                    'TargetSubType3','WeaponSubType1',
-                                    'WeaponSubType2','WeaponSubType3'])
-    ret = ret.sort_values(by=['Group','EventDateTime'])
+    ret = df.drop(columns=[col for col in DROPPED_COLS if col in df.columns])
+    ret = ret.astype({col: dtype for col, dtype in FINAL_DTYPES.items() if col in ret.columns})
+    #Year before EventDateTime: events missing their month or day have no EventDateTime and would sort to
+    #the end of the group, this keeps them in their year so a group's Year column is sorted (the dashboard's
+    #year range is a binary search over it). EventID breaks ties so the order doesn't depend on how the rows came in
+    ret = ret.sort_values(by=['Group','Year','EventDateTime','EventID'],kind='stable')
     return ret
 
+def ReadExcludeGroups(exclude_groups_fpath):
+    '''
+    Group names to ignore, first column of the exclude groups file.
+    '''
+    excl_grps_df = pd.read_excel(exclude_groups_fpath, header=None)
+    return excl_grps_df.iloc[:, 0].tolist()
+
+def ReadCountryISO3(country_iso3_fpath):
+    '''
+    GTD country name -> ISO-3 code, from country_iso3.xlsx. The codes are the
+    ones Plotly resolves the names to; names it has no map shape for (Soviet
+    Union, Yugoslavia, ...) have none.
+    '''
+    #deliberately plotly.js's resolution, not the real ISO-3 codes: e.g. "Republic of the Congo" is COD
+    #(the DR Congo's code) because plotly.js's country name table lists "republic of the congo" under COD.
+    #The maps drew it there when they were given names, so don't "fix" it to COG
+    iso3_df = pd.read_excel(country_iso3_fpath)
+    return dict(zip(iso3_df['Country'].str.strip(), iso3_df['ISO3']))
+
+def FilterToEligibleRows(df,exclude_groups_fpath,year_thresh):
+    '''
+    Row level filters: unaffiliated individuals, unverified involvement,
+    year threshold and the exclude groups file. Doesn't look at other rows,
+    so it can be run on just the new events of a release.
+    '''
+    #remove unaffiliated individuals / verified attacks only / after year threshold / the exclude groups,
+    #one mask so only the rows that pass are copied
+    keep = (df['IsUnaffiliatedIndividual'] != 1) & (df['GroupVerified'] == 1)
+    if(year_thresh != None):
+        keep &= df['Year']>=year_thresh
+    keep &= ~df['Group'].isin(ReadExcludeGroups(exclude_groups_fpath))
+    return df.loc[keep].drop(columns=['IsUnaffiliatedIndividual'])
+
+def KeepTopGroups(df,n_groups_to_keep):
+    '''
+    Keep the n groups with the most rows. Ties are broken by group name so the
+    pick doesn't depend on row order.
+    '''
+    group_counts = df['Group'].value_counts().sort_index()
+    top_groups_overall = group_counts.sort_values(ascending=False,kind='stable').head(n_groups_to_keep).index
+    return df[df['Group'].isin(top_groups_overall)]
+
 def FilterToApplicableGroups(df,exclude_groups_fpath,n_groups_to_keep,year_thresh):
     '''
     Filtered to named groups from the GTD who have committed more than
     n_attacks_needed. Exclude groups file gives the group names to ignore.
     '''
     print("identifying groups to keep")
-    df_temp = df.copy()
-    #remove unaffiliated individuals / verified attacks only / after year threshold
-    df_temp = df_temp[df_temp['IsUnaffiliatedIndividual'] != 1]
-    df_temp = df_temp.drop(columns=['IsUnaffiliatedIndividual'])
-    df_temp = df_temp[df_temp['GroupVerified'] == 1]
-    if(year_thresh != None):
-        df_temp = df_temp[df_temp['Year']>=year_thresh]
-
-    # filter out the exclude groups
-    excl_grps_df = pd.read_excel(exclude_groups_fpath, header=None)
-    excl_grps_ls = excl_grps_df.iloc[:, 0].tolist()
-    grps_to_keep_ls = [gname for gname in df_temp['Group'].tolist() if gname not in excl_grps_ls]
-    df_temp = df_temp[df_temp['Group'].isin(grps_to_keep_ls)]
+    df_temp = FilterToEligibleRows(df,exclude_groups_fpath,year_thresh)
 
     # keep n top groups
-    top_groups_overall = df_temp['Group'].value_counts().nlargest(n_groups_to_keep).index
-    df_temp = df_temp[df_temp['Group'].isin(top_groups_overall)]
+    df_temp = KeepTopGroups(df_temp,n_groups_to_keep)
 
     return df_temp
 
+######################################################## Memory budgeted mode
+#the only columns FilterToApplicableGroups decides on
+KEEP_DECISION_COLS = ['Year','IsUnaffiliatedIndividual'] + \
+    [col for grp_cols in GROUP_SLOT_COLS for col in (grp_cols[0], grp_cols[0]+'Uncertain')]
+
+def KeptEventRows(sel_df,exclude_groups_fpath,n_groups_to_keep,year_thresh):
+    '''
+    Row positions of the events that end up in the output, worked out from the
+    KEEP_DECISION_COLS only. Mirrors FilterToEligibleRows and KeepTopGroups per
+    group slot: a slot is eligible when its group is named, not excluded and its
+    involvement is verified (Uncertain == 0 is what sets GroupVerified to 1),
+    on an event that isn't by an unaffiliated individual and is past year_thresh.
+    '''
+    excl_grps_ls = ReadExcludeGroups(exclude_groups_fpath)
+    event_ok = (sel_df['IsUnaffiliatedIndividual'] != 1).to_numpy()
+    if(year_thresh != None):
+        event_ok &= (sel_df['Year']>=year_thresh).to_numpy()
+
+    slot_rows, slot_groups = [], []
+    for grp_cols in GROUP_SLOT_COLS:
+        grp = sel_df[grp_cols[0]]
+        slot_ok = event_ok & grp.notna().to_numpy() & (sel_df[grp_cols[0]+'Uncertain'] == 0).to_numpy() \
+            & ~grp.isin(excl_grps_ls).to_numpy()
+        rows = np.flatnonzero(slot_ok)
+        slot_rows.append(rows)
+        #plain strings, so KeepTopGroups orders ties exactly like the full path
+        slot_groups.append(grp.iloc[rows].astype(object).to_numpy())
+    slots_df = pd.DataFrame({'Row': np.concatenate(slot_rows),
+                             'Group': np.concatenate(slot_groups)})
+    #same tie breaking as the full path, counts are over the same slots
+    slots_df = KeepTopGroups(slots_df,n_groups_to_keep)
+    return np.unique(slots_df['Row'].to_numpy())
+
+#columns BuildColumns, LongifyByGroup and the row filters read or rewrite, they
+#get their final dtype in SetDatatypesAndSort like on the full path
+TRANSFORMED_COLS = set(KEEP_DECISION_COLS + ['Month','Day','City','Country','NVictimsKilled','NVictimsWounded'] +
+                       [type_col + str(n) for type_col in TYPE_RENAMES for n in range(1, 4)] +
+                       [col for grp_cols in GROUP_SLOT_COLS for col in grp_cols])
+
+#peak RSS of the transforms over the arrow size of the events they start from,
+#measured on synthetic releases (BenchmarkCode/bench_etl_scaling.py)
+TRANSFORM_PEAK_FACTOR = 6
+
+def ApplyEarlyDatatypes(df):
+    '''
+    Drop the DROPPED_COLS and give the FINAL_DTYPES to the columns no transform
+    touches, in place, one column at a time, so the kept events are held in
+    their small dtypes through the transforms. Only for the kept events: their
+    values are the output's values, so categories come out the same as
+    SetDatatypesAndSort gives them on the full path.
+    '''
+    df.drop(columns=[col for col in DROPPED_COLS if col in df.columns and col not in TRANSFORMED_COLS], inplace=True)
+    for col, dtype in FINAL_DTYPES.items():
+        if col in df.columns and col not in TRANSFORMED_COLS:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def ProjectedPeakMB(n_rows,row_bytes):
+    '''
+    What the process is expected to peak at once n_rows events of row_bytes
+    (arrow) each are read and transformed.
+    '''
+    return ((CurrentRSSBytes() or 0) + n_rows * row_bytes * TRANSFORM_PEAK_FACTOR) / 1e6
+
+def SampleRowBytes(pq_file):
+    '''
+    Arrow bytes per row of the ingest cache, measured on a sample batch.
+    '''
+    sample = next(pq_file.iter_batches(batch_size=1024), None)
+    if sample is None or sample.num_rows == 0:
+        return 1
+    return max(1, sample.nbytes // sample.num_rows)
+
+def BudgetBatchRows(row_bytes,memory_budget_mb):
+    '''
+    Rows per read batch so one batch takes at most 1/32 of the budget in arrow
+    memory. Decoding costs around 5x that in RSS, the rest of the budget is left
+    for the kept events and the transforms on them.
+    '''
+    return int(np.clip(memory_budget_mb * 1e6 / 32 // row_bytes, 1024, INGEST_ROW_GROUP_ROWS))
+
+def ReadKeptEvents(gtd_fpath,read_cols_fpath,cache_dir,reader,exclude_groups_fpath,
+                   n_groups_to_keep,year_thresh,memory_budget_mb):
+    '''
+    ReadRename, cut down to the events that make it into the output. The keep
+    decision is made from a column projected read of the ingest cache, then the
+    cache is streamed in batches sized from memory_budget_mb and only kept rows
+    are held on to, with their final dtypes (ApplyEarlyDatatypes). The kept
+    events carry all their group slots, so running the usual transforms on them
+    gives the same output as on the whole table.
+    Raises MemoryError before reading the events if the read and transforms are
+    projected to go over memory_budget_mb (ProjectedPeakMB).
+    The first run on a new workbook still reads it whole to build the cache.
+    '''
+    if cache_dir is None:
+        raise ValueError("memory budgeted mode reads from the ingest cache, cache_dir can't be None")
+    cache_fpath = IngestCachePath(gtd_fpath,ReadColsMapping(read_cols_fpath),cache_dir)
+    if not os.path.exists(cache_fpath):
+        full_df = ReadRename(gtd_fpath,read_cols_fpath,cache_dir,reader)
+        if not os.path.exists(cache_fpath): #cache couldn't be written, filter what we have
+            keep_rows = KeptEventRows(full_df[KEEP_DECISION_COLS],exclude_groups_fpath,n_groups_to_keep,year_thresh)
+            return ApplyEarlyDatatypes(full_df.take(keep_rows).reset_index(drop=True))
+        del full_df
+
+    pq_file = pq.ParquetFile(cache_fpath)
+    #group names as categoricals, a python string per cell would cost more than the rest of the read
+    sel_df = pq.ParquetFile(cache_fpath, read_dictionary=[grp_cols[0] for grp_cols in GROUP_SLOT_COLS]
+                            ).read(columns=KEEP_DECISION_COLS).to_pandas()
+    keep_rows = KeptEventRows(sel_df,exclude_groups_fpath,n_groups_to_keep,year_thresh)
+    del sel_df
+    print("keeping {} of {} events".format(len(keep_rows),pq_file.metadata.num_rows))
+
+    row_bytes = SampleRowBytes(pq_file)
+    projected_mb = ProjectedPeakMB(len(keep_rows),row_bytes)
+    if projected_mb > memory_budget_mb:
+        raise MemoryError("the {} kept events are projected to peak at {:.0f} MB, over the {} MB budget. "
+                          "Raise memory_budget_mb or keep fewer groups".format(len(keep_rows),projected_mb,memory_budget_mb))
+
+    batch_rows = BudgetBatchRows(row_bytes,memory_budget_mb)
+    kept_batches = []
+    batch_start = 0
+    for batch in pq_file.iter_batches(batch_size=batch_rows):
+        batch_end = batch_start + batch.num_rows
+        lo, hi = np.searchsorted(keep_rows, [batch_start, batch_end])
+        if hi > lo:
+            kept_batches.append(batch.take(pa.array(keep_rows[lo:hi] - batch_start)))
+        batch_start = batch_end
+    kept_table = pa.Table.from_batches(kept_batches, schema=pq_file.schema_arrow)
+    del kept_batches
+    #self_destruct frees each arrow column once it's converted, the table and the frame are never both held
+    kept_df = kept_table.to_pandas(split_blocks=True, self_destruct=True).reset_index(drop=True)
+    del kept_table
+    #hand the decoded row groups back, or they count against the budget for the rest of the run
+    pa.default_memory_pool().release_unused()
+    return ApplyEarlyDatatypes(kept_df)
+
+def MeltTypeColumns(df,type_col):
+    '''
+    Long format of type_col1..3 (AttackType, TargetType, ...), one row per
+    filled slot, the same way the dashboard melts them.
+    '''
+    melted = pd.melt(df, id_vars=['Group','EventID','NVictimsKilled','NVictimsWounded','Casualties'],
+                     value_vars=[type_col+'1', type_col+'2', type_col+'3'],
+                     var_name=type_col+'Col', value_name=type_col)
+    melted = melted.dropna(subset=[type_col])
+    return melted
+
+def BuildRollups(df,country_iso3=None):
+    '''
+    Small aggregate tables the dashboard figures are drawn from, so a page
+    render reads a few hundred rows instead of scanning the group's events.
+    Keys are what the figures group by, Group is always the first key.
+    country_iso3 (ReadCountryISO3) adds the countries' ISO-3 codes to
+    group_country, the choropleth then doesn't resolve country names.
+    '''
+    print("Building rollup tables")
+    rollups = {}
+    rollups['group_year'] = df.groupby(['Group','Year'], observed=True).agg(
+        Attacks=('EventID','size'),
+        NVictimsKilled=('NVictimsKilled','sum'),
+        NVictimsWounded=('NVictimsWounded','sum')).reset_index()
+
+    rollups['group_country'] = df.groupby(['Group','Country'], observed=True).agg(
+        Attacks=('EventID','size'),
+        NVictimsKilled=('NVictimsKilled','sum'),
+        NVictimsWounded=('NVictimsWounded','sum')).reset_index()
+    if country_iso3 is not None:
+        countries = rollups['group_country']['Country'].astype(str)
+        unknown = sorted(set(countries) - set(country_iso3))
+        if unknown:
+            print("WARNING: no ISO-3 code for {}, add them to the country table or they are left off the map".format(unknown))
+        rollups['group_country']['ISO3'] = countries.map(country_iso3).astype('category')
+
+    #missing SubRegions are kept, the Geo page labels them as "nan, <Country>"
+    rollups['group_subregion_year'] = df.groupby(['Group','SubRegion','Country','Year'], observed=True, dropna=False).agg(
+        Attacks=('EventID','size'),
+        Casualties=('Casualties','sum')).reset_index()
+
+    #points of the Geo page map: where (first known location) and how much a group hit each SubRegion each year
+    rollups['group_year_subregion_geo'] = df.groupby(['Group','Year','SubRegion'], observed=True).agg(
+        attacks=('EventID','size'),
+        Casualties=('Casualties','sum'),
+        Latitude=('Latitude','first'),
+        Longitude=('Longitude','first')).reset_index().dropna()
+
+    #type rollups only have the values a group's slots hold, like grouping its melted slots does
+    for type_col in ['AttackType','TargetType']:
+        melted = MeltTypeColumns(df,type_col)
+        rollups['group_'+type_col.lower()] = melted.groupby(['Group',type_col], observed=True).agg(
+            Attacks=('EventID','size'),
+            NVictimsKilled=('NVictimsKilled','sum'),
+            NVictimsWounded=('NVictimsWounded','sum'),
+            Casualties=('Casualties','sum')).reset_index()
+
+    #target x attack method, matches the join in the Attack page treemap
+    targ_df = MeltTypeColumns(df,'TargetType')
+    targ_df = targ_df[~targ_df['TargetType'].isin(['Unknown','Other'])]
+    att_df = MeltTypeColumns(df,'AttackType')
+    att_df = att_df[~att_df['AttackType'].isin(['Unknown','Other'])]
+    merged_df = pd.merge(targ_df, att_df[['Group','EventID','AttackType']], on=['Group','EventID'], how='left')
+    merged_df['Casualties'] = merged_df['Casualties'].fillna(0)
+    rollups['group_targettype_attacktype'] = merged_df.groupby(['Group','TargetType','AttackType'], observed=True).agg(
+        Attacks=('EventID','count'),
+        Casualties=('Casualties','sum')).reset_index()
+    return rollups
+
+def WriteRollups(rollups,out_dir):
+    '''
+    One parquet file per rollup, named after it.
+    '''
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+    for name, rollup_df in rollups.items():
+        rollup_df.to_parquet(os.path.join(out_dir, name + '.parquet'), index=False)
+
+def GroupAsStringTable(df):
+    '''
+    Arrow table of df with Group as plain strings instead of a dictionary.
+    '''
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    grp_idx = table.schema.get_field_index('Group')
+    return table.set_column(grp_idx, 'Group', table['Group'].cast(pa.string()))
+
+def WriteArrowIPC(df,out_fpath):
+    '''
+    Uncompressed Arrow IPC (Feather v2) file the dashboard memory maps: opening
+    it is reading the footer, the columns are used straight from the page
+    cache, shared by every process that maps it. Written next to the old file
+    and swapped in, a running dashboard keeps the mapping it already has.
+    '''
+    table = GroupAsStringTable(df)
+    tmp_fpath = out_fpath + '.tmp'
+    with pa.OSFile(tmp_fpath, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_fpath, out_fpath)
+
+def WriteGroupPartitionedParquet(df,out_dir,rows_per_group=4096):
+    '''
+    Parquet dataset with one folder per Group (hive style, Group=<name>) so
+    the dashboard can read just the group it's showing. df is already sorted
+    by Group, Year then EventDateTime, so every row group covers a tight date/year
+    range and its column statistics let readers skip the years they don't need.
+    '''
+    #plain strings for the partition column, folder names are the group names
+    table = GroupAsStringTable(df)
+    #groups that fell out of the top n must not linger from an older build
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    ds.write_dataset(table, out_dir, format='parquet',
+                     partitioning=ds.partitioning(pa.schema([('Group', pa.string())]), flavor='hive'),
+                     min_rows_per_group=rows_per_group, max_rows_per_group=rows_per_group,
+                     file_options=ds.ParquetFileFormat().make_write_options(write_statistics=True),
+                     existing_data_behavior='error')
+
+################################################################ Incremental builds
+INCREMENTAL_STATE_VERSION = 1
+
+def HashEvents(df):
+    '''
+    One hash per raw event row, used to tell which events a release changed.
+    '''
+    return pd.DataFrame({'EventID': df['EventID'].values,
+                         'RowHash': pd.util.hash_pandas_object(df, index=False).values})
+
+def DiffRelease(event_hashes,prev_event_hashes):
+    '''
+    EventIDs inserted, changed and deleted between the previous build and this release.
+    '''
+    cur = event_hashes.set_index('EventID')['RowHash']
+    prev = prev_event_hashes.set_index('EventID')['RowHash']
+    in_prev = cur.index.isin(prev.index)
+    inserted = cur.index[~in_prev]
+    common = cur.index[in_prev]
+    changed = common[cur.loc[common].values != prev.loc[common].values]
+    deleted = prev.index[~prev.index.isin(cur.index)]
+    return inserted, changed, deleted
+
+def IncrementalStateKey(raw_df,exclude_groups_fpath,year_thresh):
+    '''
+    Anything that changes the eligible rows other than the events themselves.
+    If it differs from the stored state we have to rebuild everything.
+    '''
+    return {
+        'version': INCREMENTAL_STATE_VERSION,
+        'columns': list(raw_df.columns),
+        'exclude_groups': HashFile(exclude_groups_fpath),
+        'year_thresh': year_thresh,
+    }
+
+def ReadIncrementalState(state_dir,state_key):
+    manifest_fpath = os.path.join(state_dir, 'manifest.json')
+    if not os.path.exists(manifest_fpath):
+        return None, None
+    with open(manifest_fpath) as f:
+        manifest = json.load(f)
+    if manifest['key'] != state_key:
+        print("incremental state is from a different setup, rebuilding from scratch")
+        return None, None
+    event_hashes = pd.read_parquet(os.path.join(state_dir, 'event_hashes.parquet'))
+    eligible_df = pd.read_parquet(os.path.join(state_dir, 'eligible_rows.parquet'))
+    #parquet doesn't round trip every pandas dtype (object ints come back int64)
+    eligible_df = eligible_df.astype(manifest['dtypes'])
+    return event_hashes, eligible_df
+
+def WriteIncrementalState(state_dir,state_key,event_hashes,eligible_df):
+    '''
+    Manifest is written last and removed first, so a half written state is
+    never mistaken for a good one.
+    '''
+    os.makedirs(state_dir, exist_ok=True)
+    manifest_fpath = os.path.join(state_dir, 'manifest.json')
+    if os.path.exists(manifest_fpath):
+        os.remove(manifest_fpath)
+    event_hashes.to_parquet(os.path.join(state_dir, 'event_hashes.parquet'), index=False)
+    eligible_df.to_parquet(os.path.join(state_dir, 'eligible_rows.parquet'), index=False)
+    manifest = {
+        'key': state_key,
+        'dtypes': {col: str(dtype) for col, dtype in eligible_df.dtypes.items()},
+    }
+    with open(manifest_fpath, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+def IncrementalEligibleRows(raw_df,state_dir,exclude_groups_fpath,year_thresh):
+    '''
+    Same rows FilterToEligibleRows(LongifyByGroup(BuildColumns(raw_df))) gives,
+    but BuildColumns/LongifyByGroup only run on events that are new or changed
+    since the build stored in state_dir. Top n groups and the sort are left to
+    KeepTopGroups/SetDatatypesAndSort since they need every eligible row.
+    '''
+    state_key = IncrementalStateKey(raw_df,exclude_groups_fpath,year_thresh)
+    event_hashes = HashEvents(raw_df)
+    prev_event_hashes, prev_eligible_df = ReadIncrementalState(state_dir,state_key)
+
+    if prev_eligible_df is None:
+        print("no usable incremental state, doing a full build")
+        eligible_df = BuildColumns(raw_df)
+        eligible_df = LongifyByGroup(eligible_df)
+        eligible_df = FilterToEligibleRows(eligible_df,exclude_groups_fpath,year_thresh)
+    else:
+        inserted, changed, deleted = DiffRelease(event_hashes,prev_event_hashes)
+        print("release diff: {} inserted, {} changed, {} deleted events".format(
+            len(inserted), len(changed), len(deleted)))
+        eligible_df = prev_eligible_df[~prev_eligible_df['EventID'].isin(changed.union(deleted))]
+        touched_df = raw_df[raw_df['EventID'].isin(inserted.union(changed))]
+        if len(touched_df) > 0:
+            delta_df = BuildColumns(touched_df)
+            delta_df = LongifyByGroup(delta_df)
+            delta_df = FilterToEligibleRows(delta_df,exclude_groups_fpath,year_thresh)
+            eligible_df = pd.concat([eligible_df, delta_df], axis=0, ignore_index=True)
+
+    WriteIncrementalState(state_dir,state_key,event_hashes,eligible_df)
+    return eligible_df
+
 if __name__ == "__main__":
     ## Extract
     gtd_fpath = r"../../../RawData/globalterrorismdb_0522dist.xlsx"
     out_fpath_pqt =r"../DashboardCode/gtd_clean_dataset_pqt.parquet"
     out_fpath_csv =r"../DashboardCode/gtd_clean_dataset_csv.csv"
+    out_dir_pqt_by_group =r"../DashboardCode/gtd_clean_dataset_by_group"
+    out_fpath_arrow =r"../DashboardCode/gtd_clean_dataset.arrow"
+    out_dir_rollups =r"../DashboardCode/gtd_rollups"
     read_cols_fpath = r"ReadCols.xlsx"
     exclude_groups_fpath = r"exclude_group_names.xlsx"
-    df = ReadRename(gtd_fpath,read_cols_fpath)
-
-    ## Transform
+    country_iso3_fpath = r"country_iso3.xlsx"
+    ingest_cache_dir = r"cache" #set to None to always read the excel file
+    incremental_state_dir = None #e.g. r"incremental_state", only changed events get rebuilt
+    excel_reader = "stream" #"excel" to use pd.read_excel on a single core
+    stage_report_fpath = r"etl_stage_report.json" #time/memory per stage, None to skip writing it
+    report = StageReport(trace_allocs=False) #trace_allocs adds tracemalloc peaks, but slows every stage
+    memory_budget_mb = None #e.g. 1024, only the kept events are read from the ingest cache, fails up front if they won't fit
     year_thresh = None
     n_groups_to_keep = 15
-    df = BuildColumns(df)
-    df = LongifyByGroup(df)
-    df = FilterToApplicableGroups(df,exclude_groups_fpath,n_groups_to_keep,year_thresh)
-    df = SetDatatypesAndSort(df)
+    if memory_budget_mb is None or incremental_state_dir is not None:
+        df = report.Run('ReadRename', ReadRename, gtd_fpath,read_cols_fpath,ingest_cache_dir,excel_reader)
+    else:
+        df = report.Run('ReadKeptEvents', ReadKeptEvents, gtd_fpath,read_cols_fpath,ingest_cache_dir,excel_reader,
+                        exclude_groups_fpath,n_groups_to_keep,year_thresh,memory_budget_mb)
+
+    ## Transform
+    if incremental_state_dir is None:
+        df = report.Run('BuildColumns', BuildColumns, df)
+        df = report.Run('LongifyByGroup', LongifyByGroup, df)
+        df = report.Run('FilterToApplicableGroups', FilterToApplicableGroups, df,exclude_groups_fpath,n_groups_to_keep,year_thresh)
+    else:
+        df = report.Run('IncrementalEligibleRows', IncrementalEligibleRows, df,incremental_state_dir,exclude_groups_fpath,year_thresh)
+        df = report.Run('KeepTopGroups', KeepTopGroups, df,n_groups_to_keep)
+    df = report.Run('SetDatatypesAndSort', SetDatatypesAndSort, df)
+    rollups = report.Run('BuildRollups', BuildRollups, df,ReadCountryISO3(country_iso3_fpath))
     
     ## Load
     print(df.info())
-    df.to_parquet(out_fpath_pqt,index=False) #performant one
-    df.to_csv(out_fpath_csv,index=False) #for visiblity
\ No newline at end of file
+    report.Run('WriteParquet', lambda d: d.to_parquet(out_fpath_pqt,index=False), df) #performant one
+    report.Run('WriteArrowIPC', WriteArrowIPC, df,out_fpath_arrow) #what the dashboard maps
+    report.Run('WriteGroupPartitionedParquet', WriteGroupPartitionedParquet, df,out_dir_pqt_by_group) #dashboard fallback
+    report.Run('WriteRollups', WriteRollups, rollups,out_dir_rollups)
+    report.Run('WriteCsv', lambda d: d.to_csv(out_fpath_csv,index=False), df) #for visiblity
+    if stage_report_fpath is not None:
+        report.Write(stage_report_fpath)
+    if memory_budget_mb is not None and report.PeakRSSMB() > memory_budget_mb:
+        print("WARNING: peak RSS {:.0f} MB went over the {} MB budget".format(report.PeakRSSMB(),memory_budget_mb))
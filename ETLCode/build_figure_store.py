@@ -0,0 +1,43 @@
+"""
+Build step to run after ETL.py: renders every page layout and lazy figure of
+the dashboard for every group from the ETL output in DashboardCode and writes
+them to DashboardCode/figure_store (see figure_store.py there). The dashboard
+then serves them without computing anything; it falls back to computing live
+whatever the store doesn't have, or all of it once the ETL output changes and
+the store's dataset version no longer matches.
+
+usage: python build_figure_store.py [folder with the dashboard's data, default ../DashboardCode]
+"""
+import os
+import sys
+import time
+
+#the dashboard opens its data relative to the working directory
+script_directory = os.path.dirname(os.path.abspath(__file__))
+dashboard_dir = os.path.join(script_directory, '..', 'DashboardCode')
+sys.path.insert(0, dashboard_dir)
+os.chdir(sys.argv[1] if len(sys.argv) > 1 else dashboard_dir)
+
+from plotly.io.json import to_json_plotly
+import app
+import figure_store
+
+store_dir = 'figure_store'
+
+def RenderEntries():
+    '''
+    (group, entry, JSON) for every page, and every lazy figure when the app
+    renders lazily, of every group.
+    '''
+    for group in app.group_names:
+        for pathname in app.page_builders:
+            yield group, pathname, to_json_plotly(app.BuildPageLayout(pathname, group))
+        if app.lazy_render:
+            for name in app.lazy_figure_names():
+                yield group, name, to_json_plotly(app.BuildLazyFigure(name, group))
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    n_entries, n_bytes = figure_store.WriteFigureStore(store_dir, RenderEntries(), app.data_store.dataset_version, app.render_settings())
+    print("Wrote {} figures of {} groups to {}, {:.1f} MB compressed, in {:.1f}s".format(
+        n_entries, len(app.group_names), os.path.abspath(store_dir), n_bytes / 1e6, time.perf_counter() - start))
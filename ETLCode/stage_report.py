@@ -0,0 +1,164 @@
+"""
+Per-stage instrumentation for the ETL: wall and CPU time, peak memory, rows
+and DataFrame memory going in and out of every step, written to a JSON
+report so builds can be compared release to release.
+
+Peak RSS is per stage on Linux (the kernel's high water mark is reset before
+each stage through /proc/self/clear_refs). Elsewhere it falls back to the
+process' lifetime peak from getrusage, which only ever grows.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import tracemalloc
+from datetime import datetime, timezone
+import pandas as pd
+
+try:
+    import resource
+except ImportError: #windows
+    resource = None
+
+def _ReadProcStatusKB(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def ResetPeakRSS():
+    '''
+    Start a new RSS high water mark, True if the platform allows it.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def PeakRSSBytes():
+    '''
+    (peak RSS of this process, peak RSS of its largest finished child) in bytes.
+    Children are the reader's worker processes, the kernel only reports the
+    biggest one.
+    '''
+    hwm_kb = _ReadProcStatusKB('VmHWM')
+    if resource is None:
+        return (hwm_kb * 1024 if hwm_kb is not None else None), None
+    #ru_maxrss is kilobytes on linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    self_peak = hwm_kb * 1024 if hwm_kb is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    child_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return self_peak, child_peak
+
+def CurrentRSSBytes():
+    rss_kb = _ReadProcStatusKB('VmRSS')
+    return rss_kb * 1024 if rss_kb is not None else None
+
+def FrameStats(obj):
+    '''
+    (rows, deep memory bytes) of a DataFrame, or summed over a dict/list/tuple
+    of them (BuildRollups returns a dict). (None, None) for anything else.
+    '''
+    if isinstance(obj, pd.DataFrame):
+        return len(obj), int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, dict):
+        obj = list(obj.values())
+    if isinstance(obj, (list, tuple)) and obj and all(isinstance(o, pd.DataFrame) for o in obj):
+        stats = [FrameStats(o) for o in obj]
+        return sum(s[0] for s in stats), sum(s[1] for s in stats)
+    return None, None
+
+def _MB(n_bytes):
+    return None if n_bytes is None else round(n_bytes / 1e6, 3)
+
+class StageReport:
+    '''
+    Runs ETL stages and records what each one cost.
+
+        report = StageReport()
+        df = report.Run('BuildColumns', BuildColumns, df)
+        report.Write('etl_stage_report.json')
+
+    Rows/memory in are taken from the first DataFrame argument, out from the
+    return value. trace_allocs also records the tracemalloc peak (python and
+    numpy allocations), it makes the stages noticeably slower so it's off by
+    default.
+    '''
+    def __init__(self, trace_allocs=False):
+        self.trace_allocs = trace_allocs
+        self.stages = []
+        self.started = datetime.now(timezone.utc)
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def Run(self, name, func, *args, **kwargs):
+        frame_in = next((a for a in args if isinstance(a, pd.DataFrame)), None)
+        rows_in, bytes_in = FrameStats(frame_in)
+        rss_before = CurrentRSSBytes()
+        per_stage_rss = ResetPeakRSS()
+        if self.trace_allocs:
+            tracemalloc.start()
+
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        result = func(*args, **kwargs)
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+        traced_peak = None
+        if self.trace_allocs:
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        peak_rss, child_peak_rss = PeakRSSBytes()
+        rss_after = CurrentRSSBytes()
+        rows_out, bytes_out = FrameStats(result)
+
+        stage = {
+            'stage': name,
+            'wall_s': round(wall, 4),
+            'cpu_s': round(cpu, 4),
+            'rss_before_mb': _MB(rss_before),
+            'rss_after_mb': _MB(rss_after),
+            'peak_rss_mb': _MB(peak_rss),
+            'peak_rss_is_per_stage': per_stage_rss,
+            'peak_child_rss_mb': _MB(child_peak_rss),
+            'tracemalloc_peak_mb': _MB(traced_peak),
+            'rows_in': rows_in,
+            'rows_out': rows_out,
+            'frame_mb_in': _MB(bytes_in),
+            'frame_mb_out': _MB(bytes_out),
+        }
+        self.stages.append(stage)
+        print("[{}] {:.2f}s wall, {:.2f}s cpu, peak rss {} MB".format(name, wall, cpu, stage['peak_rss_mb']))
+        return result
+
+    def PeakRSSMB(self):
+        '''
+        Highest peak RSS of any stage so far, in MB.
+        '''
+        peaks = [stage['peak_rss_mb'] for stage in self.stages if stage['peak_rss_mb'] is not None]
+        return max(peaks, default=0)
+
+    def ToDict(self):
+        return {
+            'started_utc': self.started.isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'total_wall_s': round(time.perf_counter() - self._wall_start, 4),
+            #without the time spent measuring (deep memory usage of object columns isn't free)
+            'stages_wall_s': round(sum(stage['wall_s'] for stage in self.stages), 4),
+            'total_cpu_s': round(time.process_time() - self._cpu_start, 4),
+            'stages': self.stages,
+        }
+
+    def Write(self, fpath):
+        with open(fpath, 'w') as f:
+            json.dump(self.ToDict(), f, indent=2)
+        print("Stage report written to {}".format(fpath))
@@ -0,0 +1,329 @@
+"""
+Streaming, multi process reader for big single sheet workbooks like the GTD.
+
+pd.read_excel parses the whole sheet on one core through openpyxl. Here the
+sheet xml is decompressed as a stream and cut into blocks of whole <row>
+elements. The blocks are parsed in a process pool, each worker keeps only the
+requested columns, and the rows go through the same TextParser read_excel
+uses, so the resulting DataFrame matches pd.read_excel(fpath, usecols=...).
+"""
+import os
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+try:
+    #not public API, but it's what read_excel hands the cell values to: going through it gives read_excel's
+    #type inference and na handling. tests/test_xlsx_stream.py checks the frames still match on upgrades
+    from pandas.io.parsers import TextParser
+except ImportError: #moved in a pandas release, ReadRename falls back to pd.read_excel
+    TextParser = None
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils.cell import column_index_from_string, coordinate_to_tuple
+from openpyxl.utils.datetime import from_excel, from_ISO8601, CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+CHUNK_BYTES = 4 << 20
+
+#per worker process, set up once by InitWorker
+_worker_ctx = {}
+
+def ReadRels(zf, part_path):
+    '''
+    Relationship id -> target path (inside the zip) for a part.
+    '''
+    rels_path = posixpath.join(posixpath.dirname(part_path), '_rels', posixpath.basename(part_path) + '.rels')
+    rels = {}
+    root = ET.fromstring(zf.read(rels_path))
+    for rel in root.iter('{%s}Relationship' % PKG_REL_NS):
+        target = rel.get('Target')
+        if target.startswith('/'):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(part_path), target))
+        rels[rel.get('Id')] = (rel.get('Type').rsplit('/', 1)[-1], target)
+    return rels
+
+def ReadWorkbookMeta(zf):
+    '''
+    Path of the first worksheet (what read_excel reads by default), the
+    shared strings, which styles are dates/timedeltas and the date epoch.
+    '''
+    wb_path = 'xl/workbook.xml'
+    rels = ReadRels(zf, wb_path)
+    wb_root = ET.fromstring(zf.read(wb_path))
+
+    sheet_path = None
+    for sheet in wb_root.iter('{%s}sheet' % MAIN_NS):
+        rel_type, target = rels[sheet.get('{%s}id' % REL_NS)]
+        if rel_type == 'worksheet':
+            sheet_path = target
+            break
+    if sheet_path is None:
+        raise ValueError("workbook has no worksheets")
+
+    wb_pr = wb_root.find('{%s}workbookPr' % MAIN_NS)
+    date1904 = wb_pr is not None and wb_pr.get('date1904') in ('1', 'true')
+    epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+    shared_strings = []
+    date_styles, timedelta_styles = set(), set()
+    for rel_type, target in rels.values():
+        if rel_type == 'sharedStrings':
+            shared_strings = ReadSharedStrings(zf, target)
+        if rel_type == 'styles':
+            stylesheet = Stylesheet.from_tree(ET.fromstring(zf.read(target)))
+            date_styles = stylesheet.date_formats
+            timedelta_styles = stylesheet.timedelta_formats
+
+    return sheet_path, {'shared_strings': shared_strings, 'date_styles': date_styles,
+                        'timedelta_styles': timedelta_styles, 'epoch': epoch}
+
+def ReadSharedStrings(zf, path):
+    '''
+    Plain text of every <si>, same as openpyxl's read_string_table: the
+    direct <t> plus the <t> of each rich text run, phonetic runs ignored.
+    '''
+    strings = []
+    si_tag, t_tag, r_tag = '{%s}si' % MAIN_NS, '{%s}t' % MAIN_NS, '{%s}r' % MAIN_NS
+    with zf.open(path) as f:
+        for _, node in ET.iterparse(f):
+            if node.tag == si_tag:
+                strings.append(InlineText(node, t_tag, r_tag).replace('x005F_', ''))
+                node.clear()
+    return strings
+
+def InlineText(node, t_tag, r_tag):
+    snippets = []
+    plain = node.find(t_tag)
+    if plain is not None and plain.text is not None:
+        snippets.append(plain.text)
+    for run in node.findall(r_tag):
+        run_t = run.find(t_tag)
+        if run_t is not None and run_t.text is not None:
+            snippets.append(run_t.text)
+    return ''.join(snippets)
+
+def ConvertCell(cell, ns, ctx):
+    '''
+    Value of one <c>, converted the way openpyxl reads it and then the way
+    pandas' openpyxl reader converts it (empty -> "", errors -> nan,
+    integral numbers -> int).
+    '''
+    data_type = cell.get('t', 'n')
+    if data_type == 'inlineStr':
+        inline = cell.find(ns + 'is')
+        if inline is None:
+            return ''
+        return InlineText(inline, ns + 't', ns + 'r')
+
+    value = cell.findtext(ns + 'v') or None
+    if value is None:
+        return ''
+    if data_type == 'n':
+        value = float(value) if ('.' in value or 'E' in value or 'e' in value) else int(value)
+        style_id = int(cell.get('s', 0))
+        if style_id and style_id in ctx['date_styles']:
+            try:
+                return from_excel(value, ctx['epoch'], timedelta=style_id in ctx['timedelta_styles'])
+            except (OverflowError, ValueError):
+                return np.nan
+        as_int = int(value)
+        return as_int if as_int == value else float(value)
+    if data_type == 's':
+        return ctx['shared_strings'][int(value)]
+    if data_type == 'b':
+        return bool(int(value))
+    if data_type == 'd':
+        return from_ISO8601(value)
+    if data_type == 'e':
+        return np.nan
+    return value
+
+def InitWorker(ctx):
+    _worker_ctx.update(ctx)
+
+def ParseRowBlock(block, open_tag, close_tag, col_positions):
+    '''
+    Parse a block of whole <row> elements. Returns (row number, row has any
+    data, values of the requested columns) per row. col_positions are 0 based
+    sheet column positions, in the order they should come out.
+    '''
+    ctx = _worker_ctx
+    ns = '{%s}' % MAIN_NS
+    out_pos = {col: i for i, col in enumerate(col_positions)}
+    n_out = len(col_positions)
+    col_cache = {}
+    rows = []
+    root = ET.fromstring(open_tag + block + close_tag)
+    for row in root.iter(ns + 'row'):
+        row_num = row.get('r')
+        if row_num is None:
+            raise ValueError("rows without a row number aren't supported, use the excel reader")
+        values = [''] * n_out
+        has_data = False
+        col = -1
+        for cell in row.iter(ns + 'c'):
+            ref = cell.get('r')
+            if ref is None:
+                col += 1
+            else:
+                letters = ref.rstrip('0123456789')
+                col = col_cache.get(letters)
+                if col is None:
+                    col = column_index_from_string(letters) - 1
+                    col_cache[letters] = col
+            pos = out_pos.get(col)
+            if pos is None:
+                #only need to know whether the cell holds anything
+                if not has_data and (cell.findtext(ns + 'v') or cell.find(ns + 'is') is not None):
+                    has_data = ConvertCell(cell, ns, ctx) != ''
+                continue
+            value = ConvertCell(cell, ns, ctx)
+            values[pos] = value
+            has_data = has_data or not (isinstance(value, str) and value == '')
+        rows.append((int(row_num), has_data, values))
+    return rows
+
+def IterRowBlocks(stream, block_bytes):
+    '''
+    Yields (preamble, block) where block is bytes of whole <row> elements.
+    The preamble (everything before the first row) comes with the first block
+    so the caller can pick up namespaces and the row tag prefix.
+    '''
+    buf = b''
+    preamble = None
+    while True:
+        chunk = stream.read(CHUNK_BYTES)
+        buf += chunk
+        if preamble is None:
+            match = re.search(rb'<((?:\w+:)?)sheetData[^>]*?(/?)>', buf)
+            if match is None:
+                if not chunk:
+                    raise ValueError("sheet has no sheetData")
+                continue
+            prefix = match.group(1)
+            row_start, row_end, sheet_end = b'<' + prefix + b'row', b'</' + prefix + b'row>', b'</' + prefix + b'sheetData>'
+            preamble = buf[:match.end()]
+            yield preamble, None
+            if match.group(2):
+                return
+            buf = buf[match.end():]
+            first_row = buf.find(row_start)
+            if first_row >= 0:
+                buf = buf[first_row:]
+        if not chunk:
+            end = buf.find(sheet_end)
+            if end >= 0:
+                buf = buf[:end]
+            if buf.strip():
+                yield preamble, buf
+            return
+        if len(buf) >= block_bytes:
+            cut = buf.rfind(row_end)
+            if cut >= 0:
+                cut += len(row_end)
+                yield preamble, buf[:cut]
+                buf = buf[cut:]
+
+def WrapTags(preamble):
+    '''
+    Opening/closing tags to wrap a row block in, keeping the root's
+    namespaces, and the closing tag of a row.
+    '''
+    root_match = re.search(rb'<((?:\w+:)?)worksheet\b[^>]*>', preamble)
+    prefix = re.search(rb'<((?:\w+:)?)sheetData\b', preamble).group(1)
+    open_tag = root_match.group(0) + b'<' + prefix + b'sheetData>'
+    close_tag = b'</' + prefix + b'sheetData></' + root_match.group(1) + b'worksheet>'
+    return open_tag, close_tag, b'</' + prefix + b'row>'
+
+def ReadExcelStreaming(fpath, usecols, n_workers=None, block_bytes=16 << 20):
+    '''
+    Same DataFrame as pd.read_excel(fpath, usecols=usecols) for the first
+    sheet, with the xml parsing spread over n_workers processes.
+    '''
+    if TextParser is None:
+        raise ImportError("this pandas has no pandas.io.parsers.TextParser, read the workbook with pd.read_excel")
+    n_workers = n_workers or os.cpu_count() or 1
+    with zipfile.ZipFile(fpath) as zf:
+        sheet_path, ctx = ReadWorkbookMeta(zf)
+        InitWorker(ctx)
+        with zf.open(sheet_path) as stream, \
+                ProcessPoolExecutor(max_workers=n_workers, initializer=InitWorker, initargs=(ctx,)) as pool:
+            blocks = IterRowBlocks(stream, block_bytes)
+            preamble, _ = next(blocks)
+            open_tag, close_tag, row_end = WrapTags(preamble)
+
+            #header is parsed here so the workers know which columns to keep
+            header = None
+            pending = []
+            rows = []
+            for _, block in blocks:
+                if header is None:
+                    header, col_positions, block = SplitHeader(block, open_tag, close_tag, row_end, usecols)
+                    rows.append((1, True, [header[col] for col in col_positions]))
+                    if not block.strip():
+                        continue
+                pending.append(pool.submit(ParseRowBlock, block, open_tag, close_tag, col_positions))
+                #keep a bounded number of blocks in flight, results come back in order
+                while len(pending) > 2 * n_workers:
+                    rows.extend(pending.pop(0).result())
+            for future in pending:
+                rows.extend(future.result())
+
+    if header is None:
+        return pd.DataFrame()
+    return RowsToFrame(rows)
+
+def SplitHeader(block, open_tag, close_tag, row_end, usecols):
+    '''
+    Parses the first row of the sheet as the header and returns it, the
+    sheet positions of usecols (sheet order, like read_excel) and the rest
+    of the block.
+    '''
+    cut = block.find(row_end)
+    first_row, rest = block[:cut + len(row_end)], block[cut + len(row_end):]
+    ns = '{%s}' % MAIN_NS
+    root = ET.fromstring(open_tag + first_row + close_tag)
+    row = root.find(ns + 'sheetData/' + ns + 'row')
+    if row.get('r') not in (None, '1'):
+        raise ValueError("first sheet row is empty, use the excel reader")
+    header = {}
+    col = -1
+    for cell in row.iter(ns + 'c'):
+        ref = cell.get('r')
+        col = col + 1 if ref is None else coordinate_to_tuple(ref)[1] - 1
+        header[col] = ConvertCell(cell, ns, _worker_ctx)
+    wanted = set(usecols)
+    col_positions = sorted(col for col, name in header.items() if name in wanted)
+    missing = wanted - {header[col] for col in col_positions}
+    if missing:
+        raise ValueError("Usecols do not match columns, columns expected but not found: " + str(sorted(missing)))
+    return header, col_positions, rest
+
+def RowsToFrame(rows):
+    '''
+    Fill in rows missing from the xml, drop trailing empty rows, then let
+    TextParser do the type inference/na handling exactly as read_excel does.
+    '''
+    n_cols = len(rows[0][2])
+    data = []
+    last_row_with_data = 0
+    expected = 1
+    for row_num, has_data, values in rows:
+        while expected < row_num:
+            data.append([''] * n_cols)
+            expected += 1
+        data.append(values)
+        expected = row_num + 1
+        if has_data:
+            last_row_with_data = len(data)
+    data = data[:last_row_with_data]
+    parser = TextParser(data, header=0, skip_blank_lines=False)
+    return parser.read()
@@ -0,0 +1,137 @@
+"""
+The original dashboard's aggregations, written the way its figures computed
+them (melt the three type slots of the group's events, group over the
+values), as the reference the rollups and fact tables are checked against.
+"""
+import numpy as np
+import pandas as pd
+
+MEASURES = ['NVictimsKilled', 'NVictimsWounded', 'Casualties']
+
+def GroupEvents(events_df, group):
+    '''
+    One group's events, indexed by Group like the dashboard gets them.
+    '''
+    return events_df[events_df['Group'] == group].set_index('Group')
+
+def MeltSlots(group_df, type_col, id_vars=('EventID', 'Year') + tuple(MEASURES)):
+    '''
+    One row per filled type_col1..3 slot, values as plain objects so grouping
+    over them only sees the values that occur.
+    '''
+    melted = pd.melt(group_df, id_vars=list(id_vars), value_vars=[type_col + '1', type_col + '2', type_col + '3'],
+                     var_name=type_col + 'Col', value_name=type_col)
+    melted = melted.dropna(subset=[type_col])
+    melted[type_col] = melted[type_col].astype(object)
+    return melted
+
+def TypeCounts(group_df, type_col, by_year=False):
+    '''
+    [Year,] type_col, Attacks (filled slots) and the summed measures.
+    '''
+    keys = ['Year', type_col] if by_year else [type_col]
+    grouped = MeltSlots(group_df, type_col).groupby(keys)
+    counts = grouped[MEASURES].sum()
+    counts.insert(0, 'Attacks', grouped.size())
+    return counts.reset_index()
+
+def TargetAttackCounts(group_df):
+    '''
+    Target type slots joined to the attack types of the same event, Unknown
+    and Other left out of both, like the Attack page treemap, over every target.
+    '''
+    targ_df = MeltSlots(group_df, 'TargetType')
+    targ_df = targ_df[~targ_df['TargetType'].isin(['Unknown', 'Other'])]
+    att_df = MeltSlots(group_df, 'AttackType')
+    att_df = att_df[~att_df['AttackType'].isin(['Unknown', 'Other'])]
+    merged_df = pd.merge(targ_df, att_df[['EventID', 'AttackType']], on='EventID', how='left')
+    merged_df['Casualties'] = merged_df['Casualties'].fillna(0)
+    return merged_df.groupby(['TargetType', 'AttackType']).agg(
+        Attacks=('EventID', 'count'),
+        Casualties=('Casualties', 'sum')).reset_index()
+
+def Comparable(df, keys):
+    '''
+    df with its keys as strings, sorted by them, and numbers as floats, so
+    frames built with different dtypes compare on their values.
+    '''
+    ret = df.reset_index(drop=True).copy()
+    for col in ret.columns:
+        if col in keys and col != 'Year':
+            ret[col] = ret[col].astype(str)
+        elif col != 'Year':
+            ret[col] = ret[col].astype('float64')
+    return ret.sort_values(by=keys).reset_index(drop=True)
+
+#indicator name -> column counted by the places indicators
+PLACE_COLUMNS = {'Countries': 'Country', 'Regions': 'SubRegion', 'Cities': 'City'}
+
+def SeparateKPIs(df):
+    '''
+    The header indicators' numbers, each one computed on the group's frame
+    the way its indicator did.
+    '''
+    years_active = df['Year'].max() - df['Year'].min()
+    claimed_df = df[df['GroupClaimed'] >= 0]
+    #no known claims is NaN, quietly like ComputeKPIs
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kpis = {
+            'attacks': len(df),
+            'years_active': years_active if years_active != 0 else 1,
+            'killed': df['NVictimsKilled'].sum(skipna=True),
+            'wounded': df['NVictimsWounded'].sum(skipna=True),
+            'success_rate': (df['AttackSuccess'].sum() / len(df)) * 100,
+            'suicide_rate': (df['SuicideAttack'].sum() / len(df)) * 100,
+            'attacks_per_year': round(df['Year'].value_counts().reset_index()['count'].mean(), 1),
+            'claimed_rate': round((claimed_df['GroupClaimed'].sum() / len(claimed_df)) * 100, 1),
+            'killed_per_attack': round(df['NVictimsKilled'].mean(), 1),
+            'wounded_per_attack': round(df['NVictimsWounded'].mean(), 1),
+        }
+    for name, col in PLACE_COLUMNS.items():
+        kpis[name] = df[df[col] != 'Unknown'][col].nunique()
+    return kpis
+
+def FirstNonNull(series):
+    return series.dropna().iloc[0] if not series.dropna().empty else None
+
+def MapPoints(df):
+    '''
+    The Geo map's points: Year, SubRegion, attacks, Casualties and the first
+    known Latitude/Longitude, SubRegions without one left out.
+    '''
+    attacks_df = df.groupby(['Year', 'SubRegion'], observed=True).agg(
+        attacks=('Casualties', 'size'), Casualties=('Casualties', 'sum')).reset_index()
+    attacks_df = attacks_df[attacks_df['attacks'] > 0].dropna()
+    locs_df = df.groupby(['Year', 'SubRegion'], observed=True).agg(
+        {'Latitude': FirstNonNull, 'Longitude': FirstNonNull}).reset_index()
+    merged_df = pd.merge(attacks_df, locs_df, on=['Year', 'SubRegion'], how='left')
+    return merged_df.dropna()
+
+def LabeledPlaces(df, col, add_country):
+    '''
+    df with col as "<col>, <Country>" labels (just col for countries), 'Unknown' dropped.
+    '''
+    _df = df.copy()
+    _df[col] = _df[col].astype(str)
+    _df = _df[_df[col] != 'Unknown']
+    if add_country:
+        _df[col] = _df[col] + ', ' + _df['Country'].astype(str)
+    return _df
+
+def PlaceCounts(df, in_str):
+    '''
+    Attacks per labeled place, like the top countries/regions/cities bars.
+    '''
+    col = PLACE_COLUMNS[in_str]
+    return LabeledPlaces(df, col, in_str != 'Countries').groupby(col).size().reset_index(name='Attacks')
+
+def SubRegionCounts(df):
+    '''
+    Casualties and attacks (EventID) per labeled SubRegion, like the region treemap.
+    '''
+    _df = df[df['SubRegion'] != 'Unknown']
+    _df = LabeledPlaces(_df, 'SubRegion', True)
+    return _df.groupby('SubRegion').agg({'Casualties': 'sum', 'EventID': 'count'}).reset_index()
+
+def RegionsPerYear(df):
+    return df.groupby('Year').agg({'SubRegion': 'nunique'}).reset_index()
@@ -0,0 +1,84 @@
+"""
+Fixtures shared by the tests: a synthetic GTD release
+(BenchmarkCode/gen_synthetic_gtd.py) put through the ETL's transforms, its
+rollups, and the dashboard loaded on the ETL's output.
+
+run from the repository root: python -m pytest -q
+"""
+import os
+import sys
+import pytest
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+etl_dir = os.path.join(repo_dir, 'ETLCode')
+sys.path[:0] = [etl_dir, os.path.join(repo_dir, 'DashboardCode'), os.path.join(repo_dir, 'BenchmarkCode')]
+
+#ETL.py changes directory on import, the tests use absolute paths and go back
+test_cwd = os.getcwd()
+import ETL
+os.chdir(test_cwd)
+import gen_synthetic_gtd
+
+#enough for the top 15 groups to have a few hundred events each, and slots 2 and 3 filled on some
+SYNTHETIC_EVENTS = 60000
+N_GROUPS_TO_KEEP = 15
+
+READ_COLS_FPATH = os.path.join(etl_dir, 'ReadCols.xlsx')
+EXCLUDE_GROUPS_FPATH = os.path.join(etl_dir, 'exclude_group_names.xlsx')
+
+@pytest.fixture(scope='session')
+def release_df():
+    '''
+    The synthetic release as ReadRename leaves it.
+    '''
+    raw_df = gen_synthetic_gtd.GenerateGTD(SYNTHETIC_EVENTS, seed=0)
+    rd_rename_cols_dct = ETL.ReadColsMapping(READ_COLS_FPATH)
+    return raw_df[list(rd_rename_cols_dct)].rename(columns=rd_rename_cols_dct)
+
+@pytest.fixture(scope='session')
+def wide_df(release_df):
+    '''
+    The synthetic release as ReadRename and BuildColumns leave it.
+    '''
+    return ETL.BuildColumns(release_df)
+
+#small enough to write and read back as a workbook in a few seconds
+WORKBOOK_EVENTS = 3000
+
+@pytest.fixture(scope='session')
+def gtd_workbook(tmp_path_factory):
+    '''
+    Path of a synthetic release written as a workbook, like the GTD ships.
+    '''
+    fpath = str(tmp_path_factory.mktemp('workbook') / 'gtd_synthetic.xlsx')
+    gen_synthetic_gtd.WriteSynthetic(gen_synthetic_gtd.GenerateGTD(WORKBOOK_EVENTS, seed=2), fpath)
+    return fpath
+
+@pytest.fixture(scope='session')
+def events_df(wide_df):
+    '''
+    Events of the kept groups, long by group, typed and sorted like the ETL writes them.
+    '''
+    df = ETL.LongifyByGroup(wide_df)
+    df = ETL.FilterToApplicableGroups(df, EXCLUDE_GROUPS_FPATH, N_GROUPS_TO_KEEP, None)
+    return ETL.SetDatatypesAndSort(df)
+
+@pytest.fixture(scope='session')
+def rollups(events_df):
+    return ETL.BuildRollups(events_df)
+
+@pytest.fixture(scope='session')
+def dashboard(events_df, rollups, tmp_path_factory):
+    '''
+    app.py loaded on the ETL's Arrow file and rollups, written to a scratch folder.
+    '''
+    data_dir = tmp_path_factory.mktemp('dashboard')
+    ETL.WriteArrowIPC(events_df, str(data_dir / 'gtd_clean_dataset.arrow'))
+    ETL.WriteRollups(rollups, str(data_dir / 'gtd_rollups'))
+    #data_store.py opens its files relative to the working directory
+    os.chdir(data_dir)
+    try:
+        import app
+    finally:
+        os.chdir(test_cwd)
+    return app
@@ -0,0 +1,81 @@
+"""
+The Compare page's grouped passes (compare_facts.py) against computing each
+group on its own: ComputeKPIs, and the original figures' melts and groupbys
+(baseline.py).
+"""
+import pandas as pd
+import pytest
+import baseline
+import compare_facts
+from kpi import ComputeKPIs
+
+N_COMPARED = 4
+
+@pytest.fixture(scope='module')
+def compared(events_df):
+    '''
+    (groups, their events in one frame indexed by Group), like data_store.GetGroupsFrame.
+    '''
+    groups = list(events_df['Group'].unique()[:N_COMPARED])
+    groups_df = pd.concat([baseline.GroupEvents(events_df, group) for group in groups])
+    return groups, groups_df
+
+def ExpectedTop(counts, col, n=5, exclude=('Unknown', 'Other')):
+    '''
+    A group's top n of its per value counts (in value order), with each value's share of the counted attacks.
+    '''
+    counts = counts[~counts[col].isin(exclude)][[col, 'Attacks']].copy()
+    counts['Share'] = counts['Attacks'] / counts['Attacks'].sum() * 100
+    return counts.sort_values(by='Attacks', ascending=False, kind='stable').head(n)
+
+def test_grouped_kpis_match_each_group(events_df, compared):
+    groups, groups_df = compared
+    kpis = compare_facts.GroupedKPIs(groups_df, groups)
+    for group in groups:
+        expected = ComputeKPIs(baseline.GroupEvents(events_df, group))
+        for name, value in expected.items():
+            assert kpis.at[group, name] == pytest.approx(value, nan_ok=True), (group, name)
+
+def test_year_counts_match_each_group(events_df, compared):
+    groups, groups_df = compared
+    year_counts = compare_facts.YearCounts(groups_df, groups)
+    for group in groups:
+        group_df = baseline.GroupEvents(events_df, group)
+        expected = group_df.groupby('Year').agg(Attacks=('Year', 'size'), NVictimsKilled=('NVictimsKilled', 'sum'),
+                                                NVictimsWounded=('NVictimsWounded', 'sum'),
+                                                Casualties=('Casualties', 'sum')).reset_index()
+        got = year_counts[year_counts['Group'] == group].drop(columns=['Group'])
+        pd.testing.assert_frame_equal(baseline.Comparable(got, ['Year']), baseline.Comparable(expected, ['Year']))
+
+@pytest.mark.parametrize('dimension', ['AttackType', 'TargetType'])
+def test_top_types_match_each_group(events_df, compared, dimension):
+    groups, groups_df = compared
+    top = compare_facts.TopTypes(groups_df, groups, dimension)
+    for group in groups:
+        expected = ExpectedTop(baseline.TypeCounts(baseline.GroupEvents(events_df, group), dimension), dimension)
+        got = top[top['Group'] == group].drop(columns=['Group'])
+        pd.testing.assert_frame_equal(got.reset_index(drop=True).astype({dimension: str}),
+                                      expected.reset_index(drop=True).astype({dimension: str}), check_dtype=False)
+
+def test_top_types_count_later_slots():
+    #Hijacking is only ever in slot 2
+    groups_df = pd.DataFrame({
+        'Year': [2000, 2001, 2002],
+        'AttackType1': pd.Categorical(['Bombing', 'Bombing', 'Armed Assault']),
+        'AttackType2': pd.Categorical(['Hijacking', None, 'Hijacking']),
+        'AttackType3': pd.Categorical([None, None, None]),
+    }, index=pd.Index(['A', 'A', 'B'], name='Group'))
+    top = compare_facts.TopTypes(groups_df, ['A', 'B'], 'AttackType')
+    assert sorted(zip(top['Group'].astype(str), top['AttackType'].astype(str), top['Attacks'])) == \
+        [('A', 'Bombing', 2), ('A', 'Hijacking', 1), ('B', 'Armed Assault', 1), ('B', 'Hijacking', 1)]
+
+def test_top_places_match_each_group(events_df, compared):
+    groups, groups_df = compared
+    top = compare_facts.TopPlaces(groups_df, groups, 'Country')
+    for group in groups:
+        group_df = baseline.GroupEvents(events_df, group)
+        counts = group_df.groupby('Country', observed=True).size().rename('Attacks').reset_index()
+        expected = ExpectedTop(counts, 'Country', exclude=('Unknown',))
+        got = top[top['Group'] == group].drop(columns=['Group'])
+        pd.testing.assert_frame_equal(got.reset_index(drop=True).astype({'Country': str}),
+                                      expected.reset_index(drop=True).astype({'Country': str}), check_dtype=False)
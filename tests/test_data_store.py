@@ -0,0 +1,111 @@
+"""
+data_store.py on the ETL's output: the frames each of its load paths gives,
+the year range slices and the rollups handed to the figures.
+"""
+import os
+import importlib.util
+import numpy as np
+import pandas as pd
+import pytest
+import ETL
+from conftest import repo_dir
+
+#load path -> writes the ETL output it loads from into a folder
+ETL_OUTPUTS = {
+    'ipc': lambda df, out_dir: ETL.WriteArrowIPC(df, os.path.join(out_dir, 'gtd_clean_dataset.arrow')),
+    'by_group': lambda df, out_dir: ETL.WriteGroupPartitionedParquet(df, os.path.join(out_dir, 'gtd_clean_dataset_by_group')),
+    'flat': lambda df, out_dir: df.to_parquet(os.path.join(out_dir, 'gtd_clean_dataset_pqt.parquet'), index=False),
+}
+
+@pytest.fixture(scope='module')
+def stores(events_df, tmp_path_factory):
+    '''
+    {load path: (data_store loaded from only that output, its folder)}.
+    '''
+    stores = {}
+    for path, write in ETL_OUTPUTS.items():
+        out_dir = str(tmp_path_factory.mktemp(path))
+        write(events_df, out_dir)
+        spec = importlib.util.spec_from_file_location('data_store_' + path, os.path.join(repo_dir, 'DashboardCode', 'data_store.py'))
+        store = importlib.util.module_from_spec(spec)
+        cwd = os.getcwd()
+        os.chdir(out_dir)
+        try:
+            spec.loader.exec_module(store)
+        finally:
+            os.chdir(cwd)
+        stores[path] = (store, out_dir)
+    return stores
+
+@pytest.fixture(params=list(ETL_OUTPUTS))
+def store(request, stores, monkeypatch):
+    '''
+    Each load path's data_store, run in its folder (the partitioned dataset opens its files as they're read).
+    '''
+    store, out_dir = stores[request.param]
+    monkeypatch.chdir(out_dir)
+    return store
+
+def test_load_paths_give_the_flat_parquet_frames(stores, store):
+    flat = stores['flat'][0]
+    assert store.GetGroupNames() == flat.GetGroupNames()
+    for group in flat.GetGroupNames():
+        pd.testing.assert_frame_equal(store.GetGroupFrame(group), flat.GetGroupFrame(group))
+    groups = flat.GetGroupNames()[:3]
+    pd.testing.assert_frame_equal(store.GetGroupsFrame(groups), flat.GetGroupsFrame(groups))
+
+def YearWindows(years):
+    '''
+    Inclusive (first, last) windows over a group's years: all of them, just
+    the first and just the last, the middle, and windows without events.
+    '''
+    first, last = int(years.min()), int(years.max())
+    windows = [(first, last), (first, first), (last, last), (first + 1, last - 1), (first, (first + last) // 2),
+               (first - 10, first - 1), (last + 1, last + 10), (last, first)]
+    gaps = sorted(set(range(first, last + 1)) - set(years.tolist()))
+    if gaps:
+        windows.append((gaps[0], gaps[0]))
+    return windows
+
+def test_year_range_matches_year_mask(store):
+    if store.ipc_table is not None or store.raw_df is not None:
+        #the ETL's sort lets these search the years instead of masking them
+        assert store.event_years is not None
+    for group in store.GetGroupNames():
+        group_df = store.GetGroupFrame(group)
+        assert group_df['Year'].is_monotonic_increasing, group
+        for year_range in YearWindows(group_df['Year']):
+            expected = group_df[group_df['Year'].between(*year_range)]
+            got = store.GetGroupFrame(group, year_range)
+            pd.testing.assert_frame_equal(got, expected, obj='{} {}'.format(group, year_range))
+    groups = store.GetGroupNames()[:3]
+    groups_df = store.GetGroupsFrame(groups)
+    pd.testing.assert_frame_equal(store.GetGroupsFrame(groups, (1990, 2000)), groups_df[groups_df['Year'].between(1990, 2000)])
+
+#rollups the ETL can leave a kept group out of
+SPARSE_ROLLUPS = ['group_year_subregion_geo', 'group_targettype_attacktype']
+
+def test_group_without_locations_is_left_out_of_the_geo_rollup(events_df):
+    group = events_df['Group'].iloc[0]
+    df = events_df.copy()
+    df.loc[df['Group'] == group, ['Latitude', 'Longitude']] = np.nan
+    assert group not in set(ETL.BuildRollups(df)['group_year_subregion_geo']['Group'])
+
+def test_group_missing_from_a_rollup(dashboard, monkeypatch):
+    import data_store
+    group = data_store.GetGroupNames()[0]
+    for name in SPARSE_ROLLUPS:
+        by_group = {g: rows for g, rows in data_store.group_rollups[name].items() if g != group}
+        monkeypatch.setitem(data_store.group_rollups, name, by_group)
+    rollups = data_store.GetGroupRollups(group)
+    for name in SPARSE_ROLLUPS:
+        assert rollups[name].empty
+        assert list(rollups[name].columns) == list(data_store.empty_rollups[name].columns)
+    #every page and figure of the group still builds
+    for pathname in dashboard.page_builders:
+        dashboard.BuildPageLayout(pathname, group)
+    for name in dashboard.lazy_figure_names():
+        dashboard.BuildLazyFigure(name, group)
+    merged_df = dashboard.geo_map_table(group)
+    dashboard.geo_attacks_map(data_store.GetGroupFrame(group), dashboard.template, rollups)
+    dashboard.geo_attacks_map_year(merged_df, dashboard.template, data_store.GetGroupYears(group)[0])
@@ -0,0 +1,46 @@
+"""
+GeoFacts and the Geo rollups against the Geo page figures grouping each
+group's events on their own (baseline.py).
+"""
+import pandas as pd
+import pytest
+import baseline
+from geo_facts import GeoFacts, LabelWithCountry
+
+def AssertSame(got, expected, keys):
+    pd.testing.assert_frame_equal(baseline.Comparable(got, keys), baseline.Comparable(expected[got.columns], keys))
+
+def test_map_points_match(events_df, rollups):
+    rollup = rollups['group_year_subregion_geo']
+    for group in events_df['Group'].unique():
+        group_df = baseline.GroupEvents(events_df, group)
+        expected = baseline.MapPoints(group_df)
+        AssertSame(GeoFacts(group_df).YearSubRegion(), expected, ['Year', 'SubRegion'])
+        AssertSame(rollup[rollup['Group'] == group].drop(columns=['Group']), expected, ['Year', 'SubRegion'])
+
+@pytest.mark.parametrize('in_str', ['Countries', 'Regions', 'Cities'])
+def test_place_counts_match(events_df, in_str):
+    col = baseline.PLACE_COLUMNS[in_str]
+    for group in events_df['Group'].unique():
+        group_df = baseline.GroupEvents(events_df, group)
+        #the bars sum the counts per label
+        got = GeoFacts(group_df).PlaceCounts(in_str).groupby(col)['Attacks'].sum().reset_index()
+        AssertSame(got, baseline.PlaceCounts(group_df, in_str), [col])
+
+def test_subregion_counts_match(events_df, rollups):
+    rollup = rollups['group_subregion_year']
+    for group in events_df['Group'].unique():
+        group_df = baseline.GroupEvents(events_df, group)
+        expected = baseline.SubRegionCounts(group_df)
+        got = GeoFacts(group_df).SubRegionCounts().groupby('SubRegion')[['Casualties', 'EventID']].sum().reset_index()
+        AssertSame(got, expected, ['SubRegion'])
+        #geo_Treemap's rollup path
+        from_rollup = rollup[rollup['Group'] == group].groupby(['SubRegion', 'Country'], observed=True, dropna=False).agg(
+            Casualties=('Casualties', 'sum'), EventID=('Attacks', 'sum')).reset_index()
+        from_rollup = LabelWithCountry(from_rollup, 'SubRegion', True)
+        AssertSame(from_rollup.groupby('SubRegion')[['Casualties', 'EventID']].sum().reset_index(), expected, ['SubRegion'])
+
+def test_regions_per_year_match(events_df):
+    for group in events_df['Group'].unique():
+        group_df = baseline.GroupEvents(events_df, group)
+        AssertSame(GeoFacts(group_df).RegionsPerYear(), baseline.RegionsPerYear(group_df), ['Year'])
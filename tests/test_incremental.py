@@ -0,0 +1,60 @@
+"""
+Incremental builds (IncrementalEligibleRows) against building the release
+from scratch, and the top group pick both of them go through.
+"""
+import numpy as np
+import pandas as pd
+import ETL
+from conftest import EXCLUDE_GROUPS_FPATH, N_GROUPS_TO_KEEP
+
+def FullBuild(raw_df):
+    df = ETL.LongifyByGroup(ETL.BuildColumns(raw_df))
+    df = ETL.FilterToApplicableGroups(df, EXCLUDE_GROUPS_FPATH, N_GROUPS_TO_KEEP, None)
+    return ETL.SetDatatypesAndSort(df).reset_index(drop=True)
+
+def IncrementalBuild(raw_df, state_dir):
+    df = ETL.IncrementalEligibleRows(raw_df, str(state_dir), EXCLUDE_GROUPS_FPATH, None)
+    df = ETL.KeepTopGroups(df, N_GROUPS_TO_KEEP)
+    return ETL.SetDatatypesAndSort(df).reset_index(drop=True)
+
+def NextRelease(release_df, seed=1):
+    '''
+    (previous release, next release): the next one inserts events the previous
+    didn't have, changes some (their group, casualties or year) and deletes others.
+    '''
+    rng = np.random.default_rng(seed)
+    n_events = len(release_df)
+    inserted, changed, deleted = np.split(rng.permutation(n_events)[:3000], 3)
+    prev_df = release_df.drop(index=release_df.index[inserted])
+    next_df = release_df.drop(index=release_df.index[deleted]).copy()
+    changed = next_df.index.intersection(release_df.index[changed])
+    groups = release_df['Group1'].dropna().unique()
+    next_df.loc[changed[::3], 'Group1'] = rng.choice(groups, len(changed[::3]))
+    next_df.loc[changed[1::3], 'NVictimsKilled'] = next_df.loc[changed[1::3], 'NVictimsKilled'].fillna(0) + 1
+    next_df.loc[changed[2::3], 'Year'] = next_df.loc[changed[2::3], 'Year'] + 1
+    return prev_df, next_df
+
+def test_incremental_build_matches_full_build(release_df, tmp_path):
+    prev_df, next_df = NextRelease(release_df)
+    #the first build has no state yet and is a full one
+    pd.testing.assert_frame_equal(IncrementalBuild(prev_df, tmp_path), FullBuild(prev_df))
+    pd.testing.assert_frame_equal(IncrementalBuild(next_df, tmp_path), FullBuild(next_df))
+
+def test_unchanged_release_rebuilds_nothing(release_df, tmp_path, capsys):
+    IncrementalBuild(release_df, tmp_path)
+    capsys.readouterr()
+    pd.testing.assert_frame_equal(IncrementalBuild(release_df, tmp_path), FullBuild(release_df))
+    assert "0 inserted, 0 changed, 0 deleted" in capsys.readouterr().out
+
+def test_top_group_ties_broken_by_name():
+    #B and C tie for the second place, whichever comes first in the rows
+    df = pd.DataFrame({'Group': ['C', 'A', 'B', 'A', 'C', 'B', 'A']})
+    for rows in [df, df.iloc[::-1]]:
+        assert sorted(ETL.KeepTopGroups(rows, 2)['Group'].unique()) == ['A', 'B']
+
+def test_top_groups_match_nlargest_without_ties(wide_df):
+    df = ETL.FilterToEligibleRows(ETL.LongifyByGroup(wide_df), EXCLUDE_GROUPS_FPATH, None)
+    counts = df['Group'].value_counts()
+    assert counts.iloc[N_GROUPS_TO_KEEP - 1] > counts.iloc[N_GROUPS_TO_KEEP]
+    expected = set(counts.nlargest(N_GROUPS_TO_KEEP).index)
+    assert set(ETL.KeepTopGroups(df, N_GROUPS_TO_KEEP)['Group'].unique()) == expected
@@ -0,0 +1,36 @@
+"""
+ComputeKPIs against the header indicators computing their numbers one by
+one (baseline.SeparateKPIs).
+"""
+import math
+import warnings
+import baseline
+from kpi import ComputeKPIs
+
+def AssertSameKPIs(got, expected):
+    assert got.keys() == expected.keys()
+    for name, value in expected.items():
+        if isinstance(value, float) and math.isnan(value):
+            assert math.isnan(got[name]), name
+        else:
+            assert got[name] == value, name
+
+def test_kpis_match_separate_indicators(events_df):
+    for group in events_df['Group'].unique():
+        group_df = baseline.GroupEvents(events_df, group)
+        AssertSameKPIs(ComputeKPIs(group_df), baseline.SeparateKPIs(group_df))
+
+def test_kpis_match_on_a_year_range(events_df):
+    #a few years of a group, as the year slider gives them
+    group_df = baseline.GroupEvents(events_df, events_df['Group'].iloc[0])
+    years_df = group_df[group_df['Year'].between(2000, 2003)]
+    AssertSameKPIs(ComputeKPIs(years_df), baseline.SeparateKPIs(years_df))
+
+def test_kpis_match_without_claims(events_df):
+    #no event with a known claim, the claimed rate is NaN both ways, without a divide warning
+    group_df = baseline.GroupEvents(events_df, events_df['Group'].iloc[0]).copy()
+    group_df['GroupClaimed'] = -9
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        kpis = ComputeKPIs(group_df)
+    AssertSameKPIs(kpis, baseline.SeparateKPIs(group_df))
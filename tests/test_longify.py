@@ -0,0 +1,13 @@
+"""
+LongifyByGroup against LongifyByGroupLegacy, the per slot copies it replaced.
+"""
+import pandas as pd
+import ETL
+
+def test_longify_matches_legacy(wide_df):
+    pd.testing.assert_frame_equal(ETL.LongifyByGroup(wide_df), ETL.LongifyByGroupLegacy(wide_df))
+
+def test_longify_matches_legacy_without_later_groups(wide_df):
+    #no event with a second or third group, those slots are all empty
+    single_df = wide_df[wide_df['Group2'].isna()].reset_index(drop=True)
+    pd.testing.assert_frame_equal(ETL.LongifyByGroup(single_df), ETL.LongifyByGroupLegacy(single_df))
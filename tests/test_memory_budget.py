@@ -0,0 +1,40 @@
+"""
+The memory budgeted mode (ReadKeptEvents) against the full ETL path on a
+synthetic workbook: the transforms on the kept events must give the same
+output.
+"""
+import pandas as pd
+import pytest
+import ETL
+from conftest import READ_COLS_FPATH, EXCLUDE_GROUPS_FPATH, N_GROUPS_TO_KEEP
+
+def Transform(df):
+    df = ETL.LongifyByGroup(ETL.BuildColumns(df))
+    df = ETL.FilterToApplicableGroups(df, EXCLUDE_GROUPS_FPATH, N_GROUPS_TO_KEEP, None)
+    return ETL.SetDatatypesAndSort(df).reset_index(drop=True)
+
+@pytest.fixture(scope='module')
+def full_df(gtd_workbook):
+    return Transform(ETL.ReadRename(gtd_workbook, READ_COLS_FPATH, reader='stream', n_workers=2))
+
+#a budget the test process fits in whatever the other tests hold
+BUDGET_MB = 1 << 20
+
+#the first run builds the ingest cache from the workbook, the second reads it from the cache
+@pytest.mark.parametrize('runs', [1, 2])
+def test_kept_events_give_the_full_output(gtd_workbook, full_df, tmp_path, monkeypatch, runs):
+    #batches smaller than the workbook, so kept rows are gathered from several
+    monkeypatch.setattr(ETL, 'BudgetBatchRows', lambda row_bytes, memory_budget_mb: 1000)
+    for _ in range(runs):
+        kept_df = ETL.ReadKeptEvents(gtd_workbook, READ_COLS_FPATH, str(tmp_path), 'stream', EXCLUDE_GROUPS_FPATH,
+                                     N_GROUPS_TO_KEEP, None, BUDGET_MB)
+    got = Transform(kept_df)
+    pd.testing.assert_frame_equal(got, full_df)
+    #and the files written from it
+    assert got.to_parquet(index=False) == full_df.to_parquet(index=False)
+
+def test_over_budget_fails_before_reading_the_events(gtd_workbook, tmp_path):
+    ETL.ReadRename(gtd_workbook, READ_COLS_FPATH, str(tmp_path), 'stream', n_workers=2)
+    with pytest.raises(MemoryError):
+        ETL.ReadKeptEvents(gtd_workbook, READ_COLS_FPATH, str(tmp_path), 'stream', EXCLUDE_GROUPS_FPATH,
+                           N_GROUPS_TO_KEEP, None, 1)
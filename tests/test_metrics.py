@@ -0,0 +1,71 @@
+"""
+/metrics of the dashboard: a page callback answered through Flask shows up in
+the callback, page and cache metrics, and under gunicorn's multiprocess
+folder the numbers of a worker that exited are still added up.
+"""
+import os
+import sys
+import subprocess
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+
+dashboard_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DashboardCode')
+
+def Samples(text):
+    '''
+    {(sample name, sorted labels): value} of a Prometheus text exposition.
+    '''
+    return {(s.name, tuple(sorted(s.labels.items()))): s.value
+            for family in text_string_to_metric_families(text) for s in family.samples}
+
+def PageRequest(pathname, group):
+    return {'output': 'page-content.children', 'outputs': {'id': 'page-content', 'property': 'children'},
+            'inputs': [{'id': 'url', 'property': 'pathname', 'value': pathname},
+                       {'id': 'group-dropdown', 'property': 'value', 'value': group},
+                       {'id': 'year-range', 'property': 'value', 'value': None}],
+            'changedPropIds': ['group-dropdown.value'], 'state': []}
+
+def test_page_callback_is_counted(dashboard):
+    client = dashboard.app.server.test_client()
+    group = dashboard.group_names[-1]
+    before = Samples(client.get('/metrics').get_data(as_text=True))
+    for _ in range(2):
+        assert client.post('/_dash-update-component', json=PageRequest('/overview', group)).status_code == 200
+    response = client.get('/metrics')
+    assert response.content_type.startswith('text/plain')
+    after = Samples(response.get_data(as_text=True))
+
+    def gained(name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        return after.get(key, 0) - before.get(key, 0)
+    assert gained('dashboard_callback_seconds_count', callback='update_page_content') == 2
+    assert gained('dashboard_callback_response_bytes_count', callback='update_page_content') == 2
+    #the first request builds the layout or reads it from the store, the second is a layout cache hit
+    assert gained('dashboard_cache_lookups_total', cache='layouts', result='hit') >= 1
+    assert ('dashboard_startup_seconds', (('phase', 'data'),)) in after
+    assert ('dashboard_dataset_load_seconds', ()) in after
+
+MULTIPROCESS_SCRIPT = '''
+import os, sys
+sys.path.insert(0, sys.argv[1])
+import metrics
+metrics.callback_seconds.labels(callback='cb').observe(0.01)
+pid = os.fork()
+if pid == 0:
+    metrics.callback_seconds.labels(callback='cb').observe(0.02)
+    metrics.startup_seconds.labels(phase='data').set(5)
+    os._exit(0)
+os.waitpid(pid, 0)
+metrics.startup_seconds.labels(phase='data').set(1)
+metrics.MarkProcessDead(pid)
+sys.stdout.write(metrics.Render()[0].decode())
+'''
+
+def test_exited_worker_still_counted(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    out = subprocess.run([sys.executable, '-c', MULTIPROCESS_SCRIPT, dashboard_dir], env=env,
+                         capture_output=True, text=True, check=True).stdout
+    samples = Samples(out)
+    assert samples[('dashboard_callback_seconds_count', (('callback', 'cb'),))] == 2
+    assert samples[('dashboard_callback_seconds_sum', (('callback', 'cb'),))] == pytest.approx(0.03)
+    assert samples[('dashboard_startup_seconds', (('phase', 'data'),))] == 5
@@ -0,0 +1,29 @@
+"""
+BuildRollups against aggregating each group's events the way the original
+figures did (baseline.py).
+"""
+import pandas as pd
+import pytest
+import baseline
+
+@pytest.mark.parametrize('type_col', ['AttackType', 'TargetType'])
+def test_type_rollups_match_melted_slots(events_df, rollups, type_col):
+    rollup = rollups['group_' + type_col.lower()]
+    for group in events_df['Group'].unique():
+        expected = baseline.TypeCounts(baseline.GroupEvents(events_df, group), type_col)
+        got = rollup[rollup['Group'] == group].drop(columns=['Group'])
+        pd.testing.assert_frame_equal(baseline.Comparable(got, [type_col]),
+                                      baseline.Comparable(expected[got.columns], [type_col]))
+
+def test_type_rollups_have_no_zero_rows(rollups):
+    for name in ['group_attacktype', 'group_targettype', 'group_targettype_attacktype']:
+        assert (rollups[name]['Attacks'] > 0).all(), name
+
+def test_target_attack_rollup_matches_join(events_df, rollups):
+    rollup = rollups['group_targettype_attacktype']
+    keys = ['TargetType', 'AttackType']
+    for group in events_df['Group'].unique():
+        expected = baseline.TargetAttackCounts(baseline.GroupEvents(events_df, group))
+        got = rollup[rollup['Group'] == group].drop(columns=['Group'])
+        pd.testing.assert_frame_equal(baseline.Comparable(got, keys),
+                                      baseline.Comparable(expected[got.columns], keys))
@@ -0,0 +1,88 @@
+"""
+Slimmed figures (slim_responses.py) put back together the way
+assets/figure_templates.js does in the browser come out as the full figures
+plotly would draw, and the templates script is served, and linked from the
+page, under the app's path prefix.
+"""
+import os
+import sys
+import json
+import subprocess
+from dash import dcc
+from plotly.io.json import to_json_plotly
+import ETL
+from conftest import repo_dir
+from slim_responses import SlimFigure, TemplatesScript, DEFAULT_TRACE_ATTRIBUTES
+
+def Graphs(component):
+    '''
+    Every dcc.Graph with a figure in a component tree.
+    '''
+    if isinstance(component, (list, tuple)):
+        for child in component:
+            yield from Graphs(child)
+    elif component is not None and hasattr(component, 'to_plotly_json'):
+        if isinstance(component, dcc.Graph) and getattr(component, 'figure', None) is not None:
+            yield component
+        yield from Graphs(getattr(component, 'children', None))
+
+def ClientTemplates(template_names):
+    '''
+    window.dashboardFigureTemplates as the browser gets it from the templates script.
+    '''
+    script = TemplatesScript(template_names)
+    prefix, suffix = 'window.dashboardFigureTemplates = ', ';\n'
+    assert script.startswith(prefix) and script.endswith(suffix)
+    return json.loads(script[len(prefix):-len(suffix)])
+
+def WithTemplate(figure, templates):
+    '''
+    figure_templates.js's withTemplate: the named template put back into the layout.
+    '''
+    layout = figure.get('layout')
+    if layout and isinstance(layout.get('template'), str) and layout['template'] in templates:
+        figure = dict(figure, layout=dict(layout, template=templates[layout['template']]))
+    return figure
+
+def test_slim_figures_drawn_as_full_figures(dashboard, monkeypatch):
+    #every figure inline and unslimmed, as they'd go out without slim_figures
+    monkeypatch.setattr(dashboard, 'lazy_render', False)
+    monkeypatch.setattr(dashboard, 'slim_figures', False)
+    templates = ClientTemplates([dashboard.template])
+    group = dashboard.group_names[0]
+    figures = [graph.figure for pathname in dashboard.page_builders
+               for graph in Graphs(dashboard.BuildPageLayout(pathname, group))]
+    assert figures
+    for figure in figures:
+        full = json.loads(to_json_plotly(figure))
+        drawn = WithTemplate(json.loads(to_json_plotly(SlimFigure(figure, dashboard.template))), templates)
+        assert drawn['layout'] == full['layout']
+        assert len(drawn['data']) == len(full['data'])
+        for slim_trace, full_trace in zip(drawn['data'], full['data']):
+            #a dropped attribute is one plotly.js defaults to the same value
+            for key, value in full_trace.items():
+                if key in slim_trace:
+                    assert slim_trace[key] == value, key
+                else:
+                    assert DEFAULT_TRACE_ATTRIBUTES.get(key) == value, key
+            assert slim_trace.keys() <= full_trace.keys()
+
+PREFIX_SCRIPT = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+import app
+client = app.app.server.test_client()
+page = client.get('/gtd/').get_data(as_text=True)
+assert 'src="/gtd/figure-templates.js"' in page, page
+script = client.get('/gtd/figure-templates.js')
+assert script.status_code == 200 and script.get_data(as_text=True).startswith('window.dashboardFigureTemplates')
+assert client.get('/figure-templates.js').status_code == 404
+'''
+
+def test_templates_script_under_path_prefix(events_df, rollups, tmp_path):
+    #the dashboard mounted under /gtd/, loaded from its own data folder
+    ETL.WriteArrowIPC(events_df, str(tmp_path / 'gtd_clean_dataset.arrow'))
+    ETL.WriteRollups(rollups, str(tmp_path / 'gtd_rollups'))
+    env = dict(os.environ, DASH_URL_BASE_PATHNAME='/gtd/')
+    subprocess.run([sys.executable, '-c', PREFIX_SCRIPT, os.path.join(repo_dir, 'DashboardCode')],
+                   cwd=tmp_path, env=env, check=True)
@@ -0,0 +1,45 @@
+"""
+The dashboard's type figures drawn from each source type_counts takes: the
+ETL's rollups, the group's TypeFacts, and the group's events alone. All
+three are TypeFacts.Counts of the group's events (test_type_facts.py checks
+that against the original melt), so every figure has to come out the same.
+"""
+import json
+import pandas as pd
+import pytest
+import baseline
+from type_facts import TypeFacts
+
+#name -> figure from (app, events, rollups, facts)
+TYPE_FIGURES = {
+    'line_polar_attack_types': lambda app, df, rollups, facts: app.line_polar_attack_types(df, app.template, rollups, facts),
+    'ov_targetTypeBar': lambda app, df, rollups, facts: app.ov_targetTypeBar(df, app.template, rollups, facts),
+    'at_bar_polar_AttackType': lambda app, df, rollups, facts: app.at_bar_polar(df, app.template, 'AttackType', rollups, facts),
+    'at_bar_polar_TargetType': lambda app, df, rollups, facts: app.at_bar_polar(df, app.template, 'TargetType', rollups, facts),
+    'at_cas_stacked_bar_chart': lambda app, df, rollups, facts: app.at_cas_stacked_bar_chart(df, app.template, rollups, facts),
+    'at_TreeMap': lambda app, df, rollups, facts: app.at_TreeMap(df, app.template, rollups, facts),
+}
+
+def FigureJSON(fig):
+    return json.loads(fig.to_json())
+
+@pytest.mark.parametrize('type_col', ['AttackType', 'TargetType'])
+def test_type_counts_sources_agree(dashboard, events_df, type_col):
+    import data_store
+    for group in data_store.GetGroupNames():
+        df = data_store.GetGroupFrame(group)
+        canonical = TypeFacts(baseline.GroupEvents(events_df, group)).Counts(type_col)
+        for rollups, facts in [(data_store.GetGroupRollups(group), None), (None, TypeFacts(df)), (None, None)]:
+            got = dashboard.type_counts(df, type_col, rollups, facts)
+            pd.testing.assert_frame_equal(baseline.Comparable(got, [type_col]),
+                                          baseline.Comparable(canonical, [type_col]))
+
+@pytest.mark.parametrize('name', list(TYPE_FIGURES))
+def test_type_figures_same_from_every_source(dashboard, name):
+    import data_store
+    build = TYPE_FIGURES[name]
+    for group in data_store.GetGroupNames():
+        df = data_store.GetGroupFrame(group)
+        from_events = FigureJSON(build(dashboard, df, None, None))
+        assert FigureJSON(build(dashboard, df, None, TypeFacts(df))) == from_events, group
+        assert FigureJSON(build(dashboard, df, data_store.GetGroupRollups(group), None)) == from_events, group
@@ -0,0 +1,57 @@
+"""
+TypeFacts against melting each group's type slots the way the original
+figures did (baseline.py).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import baseline
+from type_facts import TypeFacts, TYPE_COLUMNS
+
+def SlotFrame(slots):
+    '''
+    Events with the fact table's id columns and every type slot, slots gives
+    the values of some of them ({column: values}), each its own categorical
+    like the ETL types them. The rest are empty.
+    '''
+    n_events = len(next(iter(slots.values())))
+    df = pd.DataFrame({'EventID': np.arange(n_events), 'Year': 2000 + np.arange(n_events),
+                       'NVictimsKilled': 1.0, 'NVictimsWounded': 2.0, 'Casualties': 3.0})
+    for type_cols in TYPE_COLUMNS.values():
+        for col in type_cols:
+            df[col] = pd.Series(slots.get(col, [None] * n_events), dtype=object).astype('category')
+    return df
+
+def test_value_only_in_a_later_slot_is_counted():
+    df = SlotFrame({'AttackType1': ['Bombing', 'Bombing', 'Armed Assault'],
+                    'AttackType2': ['Hijacking', None, None],
+                    'AttackType3': [None, 'Bombing', 'Arson']})
+    counts = TypeFacts(df).Counts('AttackType').set_index('AttackType')['Attacks']
+    assert counts.to_dict() == {'Armed Assault': 1, 'Arson': 1, 'Bombing': 3, 'Hijacking': 1}
+    assert sorted(TypeFacts(df).Rows('AttackType')['AttackType'].astype(str)) == \
+        ['Armed Assault', 'Arson', 'Bombing', 'Bombing', 'Bombing', 'Hijacking']
+
+@pytest.mark.parametrize('dimension', list(TYPE_COLUMNS))
+@pytest.mark.parametrize('by_year', [False, True])
+def test_counts_match_melted_slots(events_df, dimension, by_year):
+    keys = ['Year', dimension] if by_year else [dimension]
+    for group in events_df['Group'].unique():
+        group_df = baseline.GroupEvents(events_df, group)
+        got = TypeFacts(group_df).Counts(dimension, by_year=by_year)
+        expected = baseline.TypeCounts(group_df, dimension, by_year)
+        pd.testing.assert_frame_equal(baseline.Comparable(got, keys), baseline.Comparable(expected, keys))
+
+def test_exclude_drops_only_those_values(events_df):
+    group_df = baseline.GroupEvents(events_df, events_df['Group'].iloc[0])
+    got = TypeFacts(group_df).Counts('TargetType', exclude=['Unknown', 'Other'])
+    expected = baseline.TypeCounts(group_df, 'TargetType')
+    expected = expected[~expected['TargetType'].isin(['Unknown', 'Other'])]
+    pd.testing.assert_frame_equal(baseline.Comparable(got, ['TargetType']), baseline.Comparable(expected, ['TargetType']))
+
+def test_pair_counts_match_join(events_df):
+    keys = ['TargetType', 'AttackType']
+    for group in events_df['Group'].unique():
+        group_df = baseline.GroupEvents(events_df, group)
+        got = TypeFacts(group_df).PairCounts('TargetType', 'AttackType', exclude=['Unknown', 'Other'])
+        expected = baseline.TargetAttackCounts(group_df)
+        pd.testing.assert_frame_equal(baseline.Comparable(got, keys), baseline.Comparable(expected[got.columns], keys))
@@ -0,0 +1,39 @@
+"""
+The streaming workbook reader (xlsx_stream.py) and the ingest cache against
+pd.read_excel on a synthetic release.
+"""
+import pandas as pd
+import pytest
+import ETL
+import xlsx_stream
+from conftest import READ_COLS_FPATH
+
+@pytest.fixture(scope='module')
+def read_cols():
+    return list(ETL.ReadColsMapping(READ_COLS_FPATH))
+
+@pytest.fixture(scope='module')
+def excel_df(gtd_workbook, read_cols):
+    return pd.read_excel(gtd_workbook, usecols=read_cols)
+
+#small blocks so the sheet is cut in many, parsed over several processes
+@pytest.mark.parametrize('block_bytes', [16 << 20, 64 << 10])
+def test_stream_reader_matches_read_excel(gtd_workbook, read_cols, excel_df, block_bytes):
+    stream_df = xlsx_stream.ReadExcelStreaming(gtd_workbook, read_cols, n_workers=2, block_bytes=block_bytes)
+    pd.testing.assert_frame_equal(stream_df, excel_df)
+
+@pytest.mark.parametrize('reader', ['stream', 'excel'])
+def test_read_rename_with_and_without_cache(gtd_workbook, excel_df, reader, tmp_path):
+    expected = excel_df.rename(columns=ETL.ReadColsMapping(READ_COLS_FPATH))
+    pd.testing.assert_frame_equal(ETL.ReadRename(gtd_workbook, READ_COLS_FPATH, reader=reader, n_workers=2), expected)
+    #cold run writes the cache, warm run reads it
+    for _ in range(2):
+        pd.testing.assert_frame_equal(ETL.ReadRename(gtd_workbook, READ_COLS_FPATH, str(tmp_path), reader, n_workers=2),
+                                      expected)
+
+def test_missing_text_parser_falls_back_to_read_excel(gtd_workbook, excel_df, monkeypatch):
+    monkeypatch.setattr(xlsx_stream, 'TextParser', None)
+    with pytest.raises(ImportError):
+        xlsx_stream.ReadExcelStreaming(gtd_workbook, list(excel_df.columns))
+    pd.testing.assert_frame_equal(ETL.ReadRename(gtd_workbook, READ_COLS_FPATH, reader='stream'),
+                                  excel_df.rename(columns=ETL.ReadColsMapping(READ_COLS_FPATH)))